@@ -1,3 +1,9 @@
 from .balancerErrors import handleException
 from balpy import balpy
 
+def __getattr__(name):
+	# asyncBalpy needs aiohttp: only imported on first use of balpy.asyncBalpy
+	if name == "asyncBalpy":
+		import importlib
+		return(importlib.import_module("balpy.asyncBalpy"));
+	raise AttributeError("module 'balpy' has no attribute '" + name + "'");
@@ -0,0 +1,261 @@
+# asyncBalpy.py
+
+# python basics
+import asyncio
+import itertools
+import json
+import time
+from decimal import *
+
+# low level web3
+import aiohttp
+import eth_abi
+from web3._utils.abi import get_abi_output_types, map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+
+# balpy modules
+from .balpy import balpy
+from .multiEndpointProvider import MultiEndpointProvider
+
+class AsyncBalpy(object):
+
+	"""
+	Coroutine versions of the balpy read methods.
+
+	Calls are ABI encoded with the regular balpy contract objects and sent as
+	raw eth_call requests over a shared aiohttp session, so a single event loop
+	can keep many RPC requests in flight. maxConcurrency bounds how many are
+	outstanding at once. With several RPC endpoints, requests follow the
+	ranking and failover of the synchronous client's MultiEndpointProvider
+	and update its latency and error statistics. Transactions and everything
+	else stay on the synchronous client, available as .bal
+
+		async with AsyncBalpy("mainnet") as abal:
+			results = await asyncio.gather(*[abal.balVaultGetPoolTokens(p) for p in poolIds]);
+	"""
+
+	DEFAULT_MAX_CONCURRENCY = 64;
+
+	def __init__(self, network=None, verbose=True, customConfigFile=None, manualEnv={}, maxConcurrency=DEFAULT_MAX_CONCURRENCY, bal=None):
+		if bal is None:
+			bal = balpy(network, verbose=verbose, customConfigFile=customConfigFile, manualEnv=manualEnv);
+		self.bal = bal;
+		self.endpoint = bal.endpoint;
+		self.maxConcurrency = maxConcurrency;
+
+		# session and semaphore must be created inside the running event loop
+		self.session = None;
+		self.semaphore = None;
+		self.requestIds = itertools.count();
+		self.encoders = {};			# function ABI -> single function contract factory
+		self.pendingDecimals = {};	# tokenAddress -> task, shared by concurrent callers
+
+	async def __aenter__(self):
+		return(self);
+
+	async def __aexit__(self, type, value, traceback):
+		await self.close();
+
+	async def close(self):
+		if not self.session is None:
+			await self.session.close();
+			self.session = None;
+
+	def getSession(self):
+		if self.session is None:
+			connector = aiohttp.TCPConnector(limit=self.maxConcurrency);
+			self.session = aiohttp.ClientSession(connector=connector);
+			self.semaphore = asyncio.Semaphore(self.maxConcurrency);
+		return(self.session);
+
+	# =====================
+	# ======Transport======
+	# =====================
+	async def post(self, uri, method, params):
+		payload = {"jsonrpc":"2.0", "id":next(self.requestIds), "method":method, "params":params};
+		async with self.getSession().post(uri, json=payload) as response:
+			response.raise_for_status();
+			return(await response.json());
+
+	async def postEndpoints(self, provider, method, params):
+		# same order as the synchronous provider: nodes with the block, then fastest healthy first
+		blockNumber = provider.getRequestBlock(method, params);
+		if blockNumber is None:
+			endpoints = provider.rankEndpoints();
+		else:
+			endpoints = provider.blockEndpoints(blockNumber);
+
+		lastError = None;
+		for endpoint in endpoints:
+			tStart = time.time();
+			try:
+				response = await self.post(endpoint.uri, method, params);
+			except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+				endpoint.recordFailure(provider.cooldownSec);
+				lastError = error;
+				continue;
+			error = response.get("error");
+			if isinstance(error, dict) and error.get("code") in provider.ENDPOINT_ERROR_CODES:
+				endpoint.recordFailure(provider.cooldownSec);
+				lastError = ConnectionError(endpoint.uri + ": " + str(error));
+				continue;
+			endpoint.recordSuccess(time.time() - tStart);
+			provider.recordServedBlocks(endpoint, method, params, response);
+			return(response);
+		raise lastError;
+
+	async def rpc(self, method, params):
+		self.getSession();
+		provider = self.bal.web3.provider;
+		async with self.semaphore:
+			if isinstance(provider, MultiEndpointProvider):
+				result = await self.postEndpoints(provider, method, params);
+			else:
+				result = await self.post(self.endpoint, method, params);
+		if "error" in result.keys():
+			raise ValueError(result["error"]);
+		return(result["result"]);
+
+	def encodeCall(self, fn):
+		# calldata through the public Contract.encodeABI, on a factory holding only this function's ABI
+		key = json.dumps(fn.abi, sort_keys=True);
+		encoder = self.encoders.get(key);
+		if encoder is None:
+			encoder = self.bal.web3.eth.contract(abi=[fn.abi]);
+			self.encoders[key] = encoder;
+		return(encoder.encodeABI(fn_name=fn.fn_name, args=fn.args, kwargs=fn.kwargs));
+
+	async def call(self, fn, block_identifier="latest"):
+		# async equivalent of ContractFunction.call()
+		if isinstance(block_identifier, int):
+			block_identifier = hex(block_identifier);
+		tx = {"to":fn.address, "data":self.encodeCall(fn)};
+		rawOutput = await self.rpc("eth_call", [tx, block_identifier]);
+
+		outputTypes = get_abi_output_types(fn.abi);
+		output = eth_abi.decode_abi(outputTypes, bytes.fromhex(rawOutput[2:]));
+		normalized = map_abi_data(BASE_RETURN_NORMALIZERS, outputTypes, output);
+		if len(normalized) == 1:
+			return(normalized[0]);
+		return(normalized);
+
+	async def getBlockNumber(self):
+		blockNumber = await self.rpc("eth_blockNumber", []);
+		return(int(blockNumber, 16));
+
+	# =====================
+	# ======ERC20 Fns======
+	# =====================
+	async def erc20GetDecimals(self, tokenAddress):
+		# shares the decimals cache with the synchronous client
+		if tokenAddress in self.bal.decimals.keys():
+			return(self.bal.decimals[tokenAddress]);
+
+		if tokenAddress == self.bal.ZERO_ADDRESS:
+			self.bal.decimals[tokenAddress] = 18;
+			return(18);
+
+		# concurrent callers wait for the same request; shielded so one cancelled caller doesn't cancel it for the others
+		task = self.pendingDecimals.get(tokenAddress);
+		if task is None:
+			task = asyncio.ensure_future(self.fetchDecimals(tokenAddress));
+			self.pendingDecimals[tokenAddress] = task;
+			task.add_done_callback(lambda t: self.pendingDecimals.pop(tokenAddress, None));
+		return(await asyncio.shield(task));
+
+	async def fetchDecimals(self, tokenAddress):
+		token = self.bal.erc20GetContract(tokenAddress);
+		decimals = await self.call(token.functions.decimals());
+		self.bal.decimals[tokenAddress] = decimals;
+		return(decimals);
+
+	async def erc20GetBalanceStandard(self, tokenAddress, address=None):
+		if address is None:
+			address = self.bal.address;
+		token = self.bal.erc20GetContract(tokenAddress);
+		(decimals, balance) = await asyncio.gather(	self.erc20GetDecimals(tokenAddress),
+													self.call(token.functions.balanceOf(address)));
+		standardBalance = Decimal(balance) * Decimal(10**(-decimals));
+		return(standardBalance);
+
+	async def erc20GetAllowanceStandard(self, tokenAddress, allowedAddress):
+		token = self.bal.erc20GetContract(tokenAddress);
+		(decimals, allowance) = await asyncio.gather(	self.erc20GetDecimals(tokenAddress),
+														self.call(token.functions.allowance(self.bal.address, allowedAddress)));
+		standardAllowance = Decimal(allowance) * Decimal(10**(-decimals));
+		return(standardAllowance);
+
+	# =====================
+	# ======Vault Fns======
+	# =====================
+	async def balVaultWeth(self):
+		vault = self.bal.balLoadContract("Vault");
+		wethAddress = await self.call(vault.functions.WETH());
+		return(wethAddress);
+
+	async def balVaultGetAuthorizer(self):
+		vault = self.bal.balLoadContract("Vault");
+		authorizerAddress = await self.call(vault.functions.getAuthorizer());
+		return(authorizerAddress);
+
+	async def balBalancerHelpersGetVault(self):
+		bh = self.bal.balLoadContract("BalancerHelpers");
+		vaultAddress = await self.call(bh.functions.vault());
+		return(vaultAddress);
+
+	async def balVaultGetPoolTokens(self, poolId):
+		vault = self.bal.balLoadContract("Vault");
+		output = await self.call(vault.functions.getPoolTokens(poolId));
+		tokens = output[0];
+		balances = output[1];
+		lastChangeBlock = output[2];
+		return(tokens, balances, lastChangeBlock);
+
+	async def balVaultGetInternalBalance(self, tokens, address=None):
+		if address is None:
+			address = self.bal.address;
+
+		vault = self.bal.balLoadContract("Vault");
+		(sortedTokens, checksumTokens) = self.bal.balSortTokens(tokens);
+		balances = await self.call(vault.functions.getInternalBalance(address, checksumTokens));
+		decimals = await asyncio.gather(*[self.erc20GetDecimals(token) for token in checksumTokens]);
+		internalBalances = {};
+		for token, balance, tokenDecimals in zip(checksumTokens, balances, decimals):
+			internalBalances[token] = Decimal(balance) * Decimal(10**(-tokenDecimals));
+		return(internalBalances);
+
+	async def balVaultGetPool(self, poolId):
+		vault = self.bal.balLoadContract("Vault");
+		(address, specialization) = await self.call(vault.functions.getPool(poolId));
+		return(address, specialization);
+
+	async def balVaultGetPoolTokenInfo(self, poolId, tokenAddress):
+		vault = self.bal.balLoadContract("Vault");
+		tokenAddress = self.bal.web3.toChecksumAddress(tokenAddress);
+		(cash, managed, lastChangeBlock, assetManager) = await self.call(vault.functions.getPoolTokenInfo(poolId, tokenAddress));
+		return(cash, managed, lastChangeBlock, assetManager);
+
+	async def balVaultGetProtocolFeesCollector(self):
+		vault = self.bal.balLoadContract("Vault");
+		address = await self.call(vault.functions.getProtocolFeesCollector());
+		return(address);
+
+	async def balVaultHasApprovedRelayer(self, userAddress, relayerAddress):
+		vault = self.bal.balLoadContract("Vault");
+		hasApprovedRelayer = await self.call(vault.functions.hasApprovedRelayer(userAddress, relayerAddress));
+		return(hasApprovedRelayer);
+
+	# =====================
+	# ======Pool Fns=======
+	# =====================
+	async def balStablePoolGetAmplificationParameter(self, poolId):
+		poolAddress = self.bal.web3.toChecksumAddress(poolId[:42]);
+		pool = self.bal.web3.eth.contract(address=poolAddress, abi=self.bal.balPoolGetAbi("StablePool"));
+		(value, isUpdating, precision) = await self.call(pool.functions.getAmplificationParameter());
+		return(value, isUpdating, precision);
+
+	async def balOraclePoolGetTimeWeightedAverage(self, poolId, queries):
+		poolAddress = self.bal.web3.toChecksumAddress(poolId[:42]);
+		pool = self.bal.web3.eth.contract(address=poolAddress, abi=self.bal.balPoolGetAbi("WeightedPool2Tokens"));
+		results = await self.call(pool.functions.getTimeWeightedAverage(queries));
+		return(results);
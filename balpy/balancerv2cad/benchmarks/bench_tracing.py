@@ -0,0 +1,49 @@
+"""
+Quoting throughput with tracing disabled (the default) versus the old
+print-on-every-call behaviour, reproduced with tracing.print_tracer.
+
+    PYTHONPATH=src python benchmarks/bench_tracing.py
+"""
+import contextlib
+import os
+import timeit
+from decimal import Decimal
+from balancerv2cad import tracing
+from balancerv2cad.StableMath import StableMath
+from balancerv2cad.WeightedMath import WeightedMath
+
+NUMBER = 200
+
+
+def stable_quote():
+    StableMath.calcOutGivenIn(Decimal(200), [Decimal(1000), Decimal(1100), Decimal(900)], 0, 1, Decimal(10))
+
+
+def weighted_join_quote():
+    WeightedMath.calc_token_in_given_exact_bpt_out(Decimal(1000), Decimal("0.4"), Decimal(5), Decimal(2000), Decimal("0.003"))
+
+
+def weighted_exit_quote():
+    WeightedMath.calc_bpt_in_given_exact_tokens_out([Decimal(1000), Decimal(2000)], [Decimal("0.4"), Decimal("0.6")],
+                                                    [Decimal(5), Decimal(7)], Decimal(2000), Decimal("0.003"))
+
+
+def quotes_per_second(fn):
+    return NUMBER / min(timeit.repeat(fn, number=NUMBER, repeat=5))
+
+
+def main():
+    with open(os.devnull, "w") as devnull:
+        for fn in (stable_quote, weighted_join_quote, weighted_exit_quote):
+            disabled = quotes_per_second(fn)
+            with contextlib.redirect_stdout(devnull):
+                previous = tracing.set_tracer(tracing.print_tracer)
+                try:
+                    printing = quotes_per_second(fn)
+                finally:
+                    tracing.set_tracer(previous)
+            print(f"{fn.__name__:20} disabled {disabled:10.0f}/s  printing {printing:10.0f}/s  speedup {disabled / printing:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from decimal import *
+import pytest
+from balancerv2cad.StableMath import StableMath
+from balancerv2cad.StableMathInt import StableMathInt, AMP_PRECISION
+from balancerv2cad.FixedPoint import toFixed
+
+pytest.importorskip("pytest_benchmark")
+
+getcontext().prec = 28
+
+AMP = 200
+
+# balances per token count, from balanced pools down to a 1e-6 imbalance
+BALANCES = {
+    "balanced": lambda n: [1000000] * n,
+    "imbalanced": lambda n: [1000000] + [10000] * (n - 1),
+    "extreme": lambda n: [1000000000] + [1000] * (n - 1),
+}
+
+
+@pytest.mark.parametrize("num_tokens", [2, 3, 4, 5])
+@pytest.mark.parametrize("shape", list(BALANCES))
+def test_calculateInvariant(benchmark, num_tokens, shape):
+    balances = [Decimal(b) for b in BALANCES[shape](num_tokens)]
+    benchmark.group = "StableMath.calculateInvariant"
+    benchmark(StableMath.calculateInvariant, Decimal(AMP), balances)
+
+
+# like the contract, the fixed point solver reverts for some extreme imbalances
+@pytest.mark.parametrize("num_tokens", [2, 3, 4, 5])
+@pytest.mark.parametrize("shape", ["balanced", "imbalanced"])
+def test_calculateInvariantInt(benchmark, num_tokens, shape):
+    balances = [toFixed(b) for b in BALANCES[shape](num_tokens)]
+    benchmark.group = "StableMathInt.calculateInvariant"
+    benchmark(StableMathInt.calculateInvariant, AMP * AMP_PRECISION, balances)
+
+
+@pytest.mark.parametrize("num_tokens", [2, 3, 5])
+def test_calcOutGivenIn(benchmark, num_tokens):
+    balances = [Decimal(b) for b in BALANCES["imbalanced"](num_tokens)]
+    benchmark.group = "StableMath.swap"
+    benchmark(StableMath.calcOutGivenIn, Decimal(AMP), balances, 0, 1, Decimal(100))
+
+
+@pytest.mark.parametrize("num_tokens", [2, 3, 5])
+def test_calcInGivenOut(benchmark, num_tokens):
+    balances = [Decimal(b) for b in BALANCES["imbalanced"](num_tokens)]
+    benchmark.group = "StableMath.swap"
+    benchmark(StableMath.calcInGivenOut, Decimal(AMP), balances, 0, 1, Decimal(100))
@@ -0,0 +1,77 @@
+from decimal import *
+import pytest
+from balancerv2cad.WeightedMath import WeightedMath
+from balancerv2cad.WeightedMathInt import WeightedMathInt
+from balancerv2cad.FixedPoint import toFixed
+
+pytest.importorskip("pytest_benchmark")
+
+getcontext().prec = 28
+
+BALANCES = [Decimal(1000000), Decimal(2500), Decimal(40000000)]
+WEIGHTS = [Decimal("0.5"), Decimal("0.3"), Decimal("0.2")]
+SWAP_FEE = Decimal("0.003")
+TOTAL_SUPPLY = Decimal(1000000)
+
+
+@pytest.mark.parametrize("math", [WeightedMath, WeightedMathInt], ids=lambda math: math.__name__)
+def test_calc_out_given_in(benchmark, math):
+    args = [BALANCES[0], WEIGHTS[0], BALANCES[1], WEIGHTS[1], Decimal(1000)]
+    if getattr(math, "FIXED_POINT", False):
+        args = [toFixed(arg) for arg in args]
+    benchmark.group = "WeightedMath.swap"
+    benchmark(math.calc_out_given_in, *args)
+
+
+@pytest.mark.parametrize("math", [WeightedMath, WeightedMathInt], ids=lambda math: math.__name__)
+def test_calc_in_given_out(benchmark, math):
+    args = [BALANCES[0], WEIGHTS[0], BALANCES[1], WEIGHTS[1], Decimal(10)]
+    if getattr(math, "FIXED_POINT", False):
+        args = [toFixed(arg) for arg in args]
+    benchmark.group = "WeightedMath.swap"
+    benchmark(math.calc_in_given_out, *args)
+
+
+@pytest.mark.parametrize("math", [WeightedMath, WeightedMathInt], ids=lambda math: math.__name__)
+def test_calc_bpt_out_given_exact_tokens_in(benchmark, math):
+    args = [BALANCES, WEIGHTS, [Decimal(100), Decimal(1), Decimal(4000)], TOTAL_SUPPLY, SWAP_FEE]
+    if getattr(math, "FIXED_POINT", False):
+        args = [[toFixed(a) for a in arg] if isinstance(arg, list) else toFixed(arg) for arg in args]
+    benchmark.group = "WeightedMath.join"
+    benchmark(math.calc_bpt_out_given_exact_tokens_in, *args)
+
+
+@pytest.mark.parametrize("math", [WeightedMath, WeightedMathInt], ids=lambda math: math.__name__)
+def test_calc_token_in_given_exact_bpt_out(benchmark, math):
+    args = [BALANCES[0], WEIGHTS[0], Decimal(100), TOTAL_SUPPLY, SWAP_FEE]
+    if getattr(math, "FIXED_POINT", False):
+        args = [toFixed(arg) for arg in args]
+    benchmark.group = "WeightedMath.join"
+    benchmark(math.calc_token_in_given_exact_bpt_out, *args)
+
+
+@pytest.mark.parametrize("math", [WeightedMath, WeightedMathInt], ids=lambda math: math.__name__)
+def test_calc_bpt_in_given_exact_tokens_out(benchmark, math):
+    args = [BALANCES, WEIGHTS, [Decimal(100), Decimal(1), Decimal(4000)], TOTAL_SUPPLY, SWAP_FEE]
+    if getattr(math, "FIXED_POINT", False):
+        args = [[toFixed(a) for a in arg] if isinstance(arg, list) else toFixed(arg) for arg in args]
+    benchmark.group = "WeightedMath.exit"
+    benchmark(math.calc_bpt_in_given_exact_tokens_out, *args)
+
+
+@pytest.mark.parametrize("math", [WeightedMath, WeightedMathInt], ids=lambda math: math.__name__)
+def test_calc_token_out_given_exact_bpt_in(benchmark, math):
+    args = [BALANCES[0], WEIGHTS[0], Decimal(100), TOTAL_SUPPLY, SWAP_FEE]
+    if getattr(math, "FIXED_POINT", False):
+        args = [toFixed(arg) for arg in args]
+    benchmark.group = "WeightedMath.exit"
+    benchmark(math.calc_token_out_given_exact_bpt_in, *args)
+
+
+@pytest.mark.parametrize("math", [WeightedMath, WeightedMathInt], ids=lambda math: math.__name__)
+def test_calc_tokens_out_given_exact_bpt_in(benchmark, math):
+    args = [BALANCES, Decimal(100), TOTAL_SUPPLY]
+    if getattr(math, "FIXED_POINT", False):
+        args = [[toFixed(a) for a in arg] if isinstance(arg, list) else toFixed(arg) for arg in args]
+    benchmark.group = "WeightedMath.exit"
+    benchmark(math.calc_tokens_out_given_exact_bpt_in, *args)
@@ -0,0 +1,106 @@
+"""
+Integer port of Balancer's FixedPoint.sol
+
+Values are unsigned 18 decimal fixed point Python ints, so results are
+bit-exact with the on-chain library and no decimal context is touched.
+"""
+from decimal import Context, Decimal
+from balancerv2cad import LogExpMath
+
+ONE = 10**18
+TWO = 2 * ONE
+FOUR = 4 * ONE
+MAX_POW_RELATIVE_ERROR = 10000  # 10^(-14)
+
+# Minimum base for the power function when the exponent is 'free' (larger than ONE).
+MIN_POW_BASE_FREE_EXPONENT = 7 * 10**17
+
+# private context wide enough for any uint256, so conversions never touch getcontext()
+_CONVERSION_CONTEXT = Context(prec=80)
+
+
+def toFixed(a) -> int:
+    # scale a Decimal (or anything Decimal accepts) to an 18 decimal int, rounding down
+    return int(_CONVERSION_CONTEXT.scaleb(Decimal(a), 18))
+
+
+def fromFixed(a: int) -> Decimal:
+    return _CONVERSION_CONTEXT.scaleb(Decimal(a), -18)
+
+
+def sub(a: int, b: int) -> int:
+    if b > a:
+        raise Exception("SUB_OVERFLOW")
+    return a - b
+
+
+def mulDown(a: int, b: int) -> int:
+    return (a * b) // ONE
+
+
+def mulUp(a: int, b: int) -> int:
+    product = a * b
+    if product == 0:
+        return 0
+    return ((product - 1) // ONE) + 1
+
+
+def divDown(a: int, b: int) -> int:
+    if b == 0:
+        raise Exception("ZERO_DIVISION")
+    if a == 0:
+        return 0
+    return (a * ONE) // b
+
+
+def divUp(a: int, b: int) -> int:
+    if b == 0:
+        raise Exception("ZERO_DIVISION")
+    if a == 0:
+        return 0
+    return ((a * ONE - 1) // b) + 1
+
+
+def powDown(x: int, y: int) -> int:
+    # result is guaranteed to be at most the exact value of x^y
+    if y == ONE:
+        return x
+    if y == TWO:
+        return mulDown(x, x)
+    if y == FOUR:
+        square = mulDown(x, x)
+        return mulDown(square, square)
+
+    raw = LogExpMath.pow(x, y)
+    maxError = mulUp(raw, MAX_POW_RELATIVE_ERROR) + 1
+    if raw < maxError:
+        return 0
+    return raw - maxError
+
+
+def powUp(x: int, y: int) -> int:
+    # result is guaranteed to be at least the exact value of x^y
+    if y == ONE:
+        return x
+    if y == TWO:
+        return mulUp(x, x)
+    if y == FOUR:
+        square = mulUp(x, x)
+        return mulUp(square, square)
+
+    raw = LogExpMath.pow(x, y)
+    maxError = mulUp(raw, MAX_POW_RELATIVE_ERROR) + 1
+    return raw + maxError
+
+
+def complement(x: int) -> int:
+    return ONE - x if x < ONE else 0
+
+
+def mathDivUp(a: int, b: int) -> int:
+    # Math.divUp: plain (non fixed point) division rounding up
+    if b == 0:
+        raise Exception("ZERO_DIVISION")
+    if a == 0:
+        return 0
+    return 1 + (a - 1) // b
@@ -0,0 +1,198 @@
+"""
+Integer port of Balancer's LogExpMath.sol
+
+All values are signed 18 decimal fixed point integers unless noted otherwise.
+Solidity's signed division truncates towards zero, so every division of a
+possibly negative value goes through _sdiv/_smod instead of // and %.
+"""
+
+ONE_18 = 10**18
+ONE_20 = 10**20
+ONE_36 = 10**36
+
+MAX_NATURAL_EXPONENT = 130 * ONE_18
+MIN_NATURAL_EXPONENT = -41 * ONE_18
+
+LN_36_LOWER_BOUND = ONE_18 - 10**17
+LN_36_UPPER_BOUND = ONE_18 + 10**17
+
+MILD_EXPONENT_BOUND = 2**254 // ONE_20
+
+# 18 decimal constants
+x0 = 128000000000000000000  # 2^7
+a0 = 38877084059945950922200000000000000000000000000000000000  # e^(x0) (no decimals)
+x1 = 64000000000000000000  # 2^6
+a1 = 6235149080811616882910000000  # e^(x1) (no decimals)
+
+# 20 decimal constants
+x2 = 3200000000000000000000  # 2^5
+a2 = 7896296018268069516100000000000000  # e^(x2)
+x3 = 1600000000000000000000  # 2^4
+a3 = 888611052050787263676000000  # e^(x3)
+x4 = 800000000000000000000  # 2^3
+a4 = 298095798704172827474000  # e^(x4)
+x5 = 400000000000000000000  # 2^2
+a5 = 5459815003314423907810  # e^(x5)
+x6 = 200000000000000000000  # 2^1
+a6 = 738905609893065022723  # e^(x6)
+x7 = 100000000000000000000  # 2^0
+a7 = 271828182845904523536  # e^(x7)
+x8 = 50000000000000000000  # 2^-1
+a8 = 164872127070012814685  # e^(x8)
+x9 = 25000000000000000000  # 2^-2
+a9 = 128402541668774148407  # e^(x9)
+x10 = 12500000000000000000  # 2^-3
+a10 = 113314845306682631683  # e^(x10)
+x11 = 6250000000000000000  # 2^-4
+a11 = 106449445891785942956  # e^(x11)
+
+_EXP_TERMS = [(x2, a2), (x3, a3), (x4, a4), (x5, a5), (x6, a6), (x7, a7), (x8, a8), (x9, a9)]
+_LN_TERMS = _EXP_TERMS + [(x10, a10), (x11, a11)]
+
+
+def _sdiv(a: int, b: int) -> int:
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def _smod(a: int, b: int) -> int:
+    return a - _sdiv(a, b) * b
+
+
+def pow(x: int, y: int) -> int:
+    # x^y for unsigned 18 decimal fixed point x and y
+    if y == 0:
+        return ONE_18
+    if x == 0:
+        return 0
+
+    if x >> 255 != 0:
+        raise Exception("X_OUT_OF_BOUNDS")
+    if y >= MILD_EXPONENT_BOUND:
+        raise Exception("Y_OUT_OF_BOUNDS")
+
+    if LN_36_LOWER_BOUND < x < LN_36_UPPER_BOUND:
+        ln_36_x = _ln_36(x)
+        logx_times_y = _sdiv(ln_36_x, ONE_18) * y + _sdiv(_smod(ln_36_x, ONE_18) * y, ONE_18)
+    else:
+        logx_times_y = _ln(x) * y
+    logx_times_y = _sdiv(logx_times_y, ONE_18)
+
+    if not MIN_NATURAL_EXPONENT <= logx_times_y <= MAX_NATURAL_EXPONENT:
+        raise Exception("PRODUCT_OUT_OF_BOUNDS")
+
+    return exp(logx_times_y)
+
+
+def exp(x: int) -> int:
+    # e^x for signed 18 decimal fixed point x
+    if not MIN_NATURAL_EXPONENT <= x <= MAX_NATURAL_EXPONENT:
+        raise Exception("INVALID_EXPONENT")
+
+    if x < 0:
+        return (ONE_18 * ONE_18) // exp(-x)
+
+    if x >= x0:
+        x -= x0
+        firstAN = a0
+    elif x >= x1:
+        x -= x1
+        firstAN = a1
+    else:
+        firstAN = 1  # one with no decimal places
+
+    # switch to 20 decimals for higher precision
+    x *= 100
+
+    product = ONE_20
+    for x_n, a_n in _EXP_TERMS:
+        if x >= x_n:
+            x -= x_n
+            product = (product * a_n) // ONE_20
+
+    # taylor series, the nth term is x^n / n!
+    seriesSum = ONE_20
+    term = x
+    seriesSum += term
+    for n in range(2, 13):
+        term = ((term * x) // ONE_20) // n
+        seriesSum += term
+
+    return (((product * seriesSum) // ONE_20) * firstAN) // 100
+
+
+def log(arg: int, base: int) -> int:
+    # logarithm of arg in the given base, both 18 decimal fixed point
+    if LN_36_LOWER_BOUND < base < LN_36_UPPER_BOUND:
+        logBase = _ln_36(base)
+    else:
+        logBase = _ln(base) * ONE_18
+
+    if LN_36_LOWER_BOUND < arg < LN_36_UPPER_BOUND:
+        logArg = _ln_36(arg)
+    else:
+        logArg = _ln(arg) * ONE_18
+
+    return _sdiv(logArg * ONE_18, logBase)
+
+
+def ln(a: int) -> int:
+    # natural logarithm of a, 18 decimal fixed point
+    if a <= 0:
+        raise Exception("OUT_OF_BOUNDS")
+    if LN_36_LOWER_BOUND < a < LN_36_UPPER_BOUND:
+        return _sdiv(_ln_36(a), ONE_18)
+    return _ln(a)
+
+
+def _ln(a: int) -> int:
+    if a < ONE_18:
+        return -_ln((ONE_18 * ONE_18) // a)
+
+    total = 0
+    if a >= a0 * ONE_18:
+        a //= a0  # integer, not fixed point division
+        total += x0
+
+    if a >= a1 * ONE_18:
+        a //= a1  # integer, not fixed point division
+        total += x1
+
+    # all other a_n and x_n are 20 decimal fixed point numbers
+    total *= 100
+    a *= 100
+
+    for x_n, a_n in _LN_TERMS:
+        if a >= a_n:
+            a = (a * ONE_20) // a_n
+            total += x_n
+
+    # a is now smaller than a_11 (~1.06), so use the taylor series for 2 * atanh(z)
+    z = _sdiv((a - ONE_20) * ONE_20, a + ONE_20)
+    z_squared = _sdiv(z * z, ONE_20)
+
+    num = z
+    seriesSum = num
+    for n in (3, 5, 7, 9, 11):
+        num = _sdiv(num * z_squared, ONE_20)
+        seriesSum += _sdiv(num, n)
+
+    seriesSum *= 2
+
+    return _sdiv(total + seriesSum, 100)
+
+
+def _ln_36(x: int) -> int:
+    # high precision ln for x close to one, returns a 36 decimal fixed point value
+    x *= ONE_18
+
+    z = _sdiv((x - ONE_36) * ONE_36, x + ONE_36)
+    z_squared = _sdiv(z * z, ONE_36)
+
+    num = z
+    seriesSum = num
+    for n in (3, 5, 7, 9, 11, 13, 15):
+        num = _sdiv(num * z_squared, ONE_36)
+        seriesSum += _sdiv(num, n)
+
+    return seriesSum * 2
@@ -3,6 +3,7 @@ from typing import List
 from attr import dataclass
 from math import ceil, floor
 from balancerv2cad.util import *
+from balancerv2cad import tracing
 
 getcontext().prec = 28
 @dataclass
@@ -15,7 +16,7 @@ class StableMath:
 
 # -------------------------------------
     @staticmethod
-    def calculateInvariant(amplificationParameter: Decimal, balances: list) -> Decimal:
+    def calculateInvariant(amplificationParameter: Decimal, balances: list, initialInvariant: Decimal = None) -> Decimal:
 
         # /**********************************************************************************************
         # // invariant                                                                                 //
@@ -33,7 +34,8 @@ class StableMath:
         if(bal_sum==0):
             return 0
         prevInvariant = 0
-        invariant = bal_sum
+        # a previous invariant for nearby balances is a much closer starting point than the sum
+        invariant = bal_sum if initialInvariant is None else initialInvariant
         ampTimesTotal = amplificationParameter*num_tokens
         for i in range(255):
             P_D = num_tokens*balances[0]
@@ -47,6 +49,8 @@ class StableMath:
                     break
             elif(prevInvariant - invariant <= 1):
                 break
+        if tracing.tracer is not None:
+            tracing.tracer("StableMath.calculateInvariant", iterations=i + 1, invariant=invariant)
         return Decimal(invariant)
 
 
@@ -154,7 +158,7 @@ class StableMath:
         return divDown(mulDown(accumulatedTokenSwapFees, Decimal(protocolSwapFeePercentage)))
 
     @staticmethod
-    def calcInGivenOut(amplificationParameter: Decimal, balances: list, tokenIndexIn: int, tokenIndexOut: int, tokenAmountOut: Decimal) -> Decimal:
+    def calcInGivenOut(amplificationParameter: Decimal, balances: list, tokenIndexIn: int, tokenIndexOut: int, tokenAmountOut: Decimal, invariant: Decimal = None, initialGuess: Decimal = None) -> Decimal:
 
         # /**************************************************************************************************************
         # // inGivenOut token x for y - polynomial equation to solve                                                   //
@@ -168,14 +172,16 @@ class StableMath:
         # // P = product of final balances but x                                                                       //
         # **************************************************************************************************************/
         getcontext().prec = 28
-        invariant = StableMath.calculateInvariant(amplificationParameter, balances)
+        if invariant is None:
+            invariant = StableMath.calculateInvariant(amplificationParameter, balances)
         balances[tokenIndexOut] = balances[tokenIndexOut] - tokenAmountOut
 
         finalBalanceIn = StableMath.getTokenBalanceGivenInvariantAndAllOtherBalances(
             amplificationParameter,
             balances,
             invariant,
-            tokenIndexIn
+            tokenIndexIn,
+            initialGuess
         )
 
         balances[tokenIndexOut] = balances[tokenIndexOut]+ tokenAmountOut
@@ -185,7 +191,7 @@ class StableMath:
     @staticmethod
 
 
-    def calcOutGivenIn(amplificationParameter: Decimal, balances: list, tokenIndexIn: int, tokenIndexOut: int, tokenAmountIn: Decimal) -> Decimal:
+    def calcOutGivenIn(amplificationParameter: Decimal, balances: list, tokenIndexIn: int, tokenIndexOut: int, tokenAmountIn: Decimal, invariant: Decimal = None, initialGuess: Decimal = None) -> Decimal:
 
         # /**************************************************************************************************************
         # // outGivenIn token x for y - polynomial equation to solve                                                   //
@@ -198,20 +204,17 @@ class StableMath:
         # // S = sum of final balances but y                                                                           //
         # // P = product of final balances but y                                                                       //
         # **************************************************************************************************************/
-        print("Context", "OUTGIVENIN" )
-        invariant = StableMath.calculateInvariant(amplificationParameter, balances)
-        print("Invariant", invariant)
+        if invariant is None:
+            invariant = StableMath.calculateInvariant(amplificationParameter, balances)
         balances[tokenIndexIn] = balances[tokenIndexIn] + tokenAmountIn
-        finalBalanceOut = StableMath.getTokenBalanceGivenInvariantAndAllOtherBalances(amplificationParameter, balances, invariant, tokenIndexOut)
-
-        print("FinalBalance Out", finalBalanceOut)
+        finalBalanceOut = StableMath.getTokenBalanceGivenInvariantAndAllOtherBalances(amplificationParameter, balances, invariant, tokenIndexOut, initialGuess)
 
         balances[tokenIndexIn] = balances[tokenIndexIn] - tokenAmountIn
 
         result = balances [tokenIndexOut] - finalBalanceOut  # TODO took out .sub(1) at the end of this statement
 
-        print(result)
-        print("END-CONTEXT", "OUTGIVENIN" )
+        if tracing.tracer is not None:
+            tracing.tracer("StableMath.calcOutGivenIn", invariant=invariant, finalBalanceOut=finalBalanceOut, result=result)
 
         return result
         # Flow of calculations:
@@ -305,7 +308,7 @@ class StableMath:
     @staticmethod
 
 
-    def getTokenBalanceGivenInvariantAndAllOtherBalances(amplificationParameter: Decimal, balances: List[Decimal], invariant: Decimal, tokenIndex: int) -> Decimal:
+    def getTokenBalanceGivenInvariantAndAllOtherBalances(amplificationParameter: Decimal, balances: List[Decimal], invariant: Decimal, tokenIndex: int, initialGuess: Decimal = None) -> Decimal:
         getcontext().prec = 28
         ampTimesTotal = amplificationParameter * len(balances)
         bal_sum = Decimal(sum(balances))
@@ -320,6 +323,10 @@ class StableMath:
         b = bal_sum + divDown(invariant, ampTimesTotal)
         prevTokenbalance = 0
         tokenBalance = divUp((invariant*invariant+c), (invariant+b))
+        # warm start from a previous solution (e.g. the last point of an amount sweep);
+        # newton only converges to the positive root from the right of the parabola's vertex
+        if initialGuess is not None and initialGuess > 0 and (Decimal(initialGuess)*Decimal(2)+b-invariant) > 0:
+            tokenBalance = Decimal(initialGuess)
         for i in range(255):
             prevTokenbalance = tokenBalance
             tokenBalance = divUp((mulUp(tokenBalance,tokenBalance) + c),((tokenBalance*Decimal(2))+b-invariant))
@@ -0,0 +1,212 @@
+from typing import List
+from balancerv2cad.FixedPoint import *
+
+
+# amplification parameters are scaled by this precision on-chain
+AMP_PRECISION = 10**3
+
+
+class StableMathInt:
+    """
+    Drop-in replacement for StableMath operating on 18 decimal fixed point
+    ints, matching StableMath.sol bit for bit (including its reverts).
+
+    amplificationParameter is the raw on-chain value, i.e. A * AMP_PRECISION.
+    """
+
+    FIXED_POINT = True
+
+    @staticmethod
+    def calculateInvariant(amplificationParameter: int, balances: List[int]) -> int:
+        bal_sum = sum(balances)
+        num_tokens = len(balances)
+        if bal_sum == 0:
+            return 0
+
+        invariant = bal_sum
+        ampTimesTotal = amplificationParameter * num_tokens
+
+        for i in range(255):
+            D_P = invariant
+            for j in range(num_tokens):
+                D_P = (D_P * invariant) // (balances[j] * num_tokens)
+
+            prevInvariant = invariant
+            invariant = ((((ampTimesTotal * bal_sum) // AMP_PRECISION) + D_P * num_tokens) * invariant) // \
+                ((((ampTimesTotal - AMP_PRECISION) * invariant) // AMP_PRECISION) + (num_tokens + 1) * D_P)
+
+            if invariant > prevInvariant:
+                if invariant - prevInvariant <= 1:
+                    return invariant
+            elif prevInvariant - invariant <= 1:
+                return invariant
+
+        raise Exception("STABLE_INVARIANT_DIDNT_CONVERGE")
+
+    @staticmethod
+    def calcBptInGivenExactTokensOut(amplificationParameter: int, balances: List[int], amountsOut: List[int], bptTotalSupply: int, swapFee: int) -> int:
+        currentInvariant = StableMathInt.calculateInvariant(amplificationParameter, balances)
+        sumBalances = sum(balances)
+
+        balanceRatiosWithoutFee = [0] * len(balances)
+        invariantRatioWithoutFees = 0
+        for i in range(len(balances)):
+            currentWeight = divUp(balances[i], sumBalances)
+            balanceRatiosWithoutFee[i] = divUp(sub(balances[i], amountsOut[i]), balances[i])
+            invariantRatioWithoutFees += mulUp(balanceRatiosWithoutFee[i], currentWeight)
+
+        newBalances = []
+        for i in range(len(balances)):
+            if invariantRatioWithoutFees > balanceRatiosWithoutFee[i]:
+                nonTaxableAmount = mulDown(balances[i], complement(invariantRatioWithoutFees))
+                taxableAmount = sub(amountsOut[i], nonTaxableAmount)
+                amountOutWithFee = nonTaxableAmount + divUp(taxableAmount, ONE - swapFee)
+            else:
+                amountOutWithFee = amountsOut[i]
+            newBalances.append(sub(balances[i], amountOutWithFee))
+
+        newInvariant = StableMathInt.calculateInvariant(amplificationParameter, newBalances)
+        invariantRatio = divDown(newInvariant, currentInvariant)
+        return mulUp(bptTotalSupply, complement(invariantRatio))
+
+    @staticmethod
+    def calcBptOutGivenExactTokensIn(amplificationParameter: int, balances: List[int], amountsIn: List[int], bptTotalSupply: int, swapFee: int, swapFeePercentage: int) -> int:
+        # swapFee is unused, the signature mirrors StableMath.calcBptOutGivenExactTokensIn
+        currentInvariant = StableMathInt.calculateInvariant(amplificationParameter, balances)
+        sumBalances = sum(balances)
+
+        balanceRatiosWithFee = [0] * len(balances)
+        invariantRatioWithFees = 0
+        for i in range(len(balances)):
+            currentWeight = divDown(balances[i], sumBalances)
+            balanceRatiosWithFee[i] = divDown(balances[i] + amountsIn[i], balances[i])
+            invariantRatioWithFees += mulDown(balanceRatiosWithFee[i], currentWeight)
+
+        newBalances = []
+        for i in range(len(balances)):
+            if balanceRatiosWithFee[i] > invariantRatioWithFees:
+                nonTaxableAmount = mulDown(balances[i], sub(invariantRatioWithFees, ONE))
+                taxableAmount = sub(amountsIn[i], nonTaxableAmount)
+                amountInWithoutFee = nonTaxableAmount + mulDown(taxableAmount, ONE - swapFeePercentage)
+            else:
+                amountInWithoutFee = amountsIn[i]
+            newBalances.append(balances[i] + amountInWithoutFee)
+
+        newInvariant = StableMathInt.calculateInvariant(amplificationParameter, newBalances)
+        invariantRatio = divDown(newInvariant, currentInvariant)
+        if invariantRatio > ONE:
+            return mulDown(bptTotalSupply, sub(invariantRatio, ONE))
+        return 0
+
+    @staticmethod
+    def calcDueTokenProtocolSwapFeeAmount(amplificationParameter: int, balances: List[int], lastInvariant: int, tokenIndex: int, protocolSwapFeePercentage: int) -> int:
+        finalBalanceFeeToken = StableMathInt.getTokenBalanceGivenInvariantAndAllOtherBalances(
+            amplificationParameter,
+            balances,
+            lastInvariant,
+            tokenIndex)
+
+        if balances[tokenIndex] <= finalBalanceFeeToken:
+            return 0
+        accumulatedTokenSwapFees = sub(balances[tokenIndex], finalBalanceFeeToken)
+        return mulDown(accumulatedTokenSwapFees, protocolSwapFeePercentage)
+
+    @staticmethod
+    def calcInGivenOut(amplificationParameter: int, balances: List[int], tokenIndexIn: int, tokenIndexOut: int, tokenAmountOut: int, invariant: int = None, initialGuess: int = None) -> int:
+        # initialGuess is accepted for StableMath compatibility but ignored: the on-chain
+        # solver always starts from the same point, and a warm start may land 1 wei apart
+        if invariant is None:
+            invariant = StableMathInt.calculateInvariant(amplificationParameter, balances)
+
+        balances = list(balances)
+        balances[tokenIndexOut] = sub(balances[tokenIndexOut], tokenAmountOut)
+        finalBalanceIn = StableMathInt.getTokenBalanceGivenInvariantAndAllOtherBalances(
+            amplificationParameter,
+            balances,
+            invariant,
+            tokenIndexIn)
+
+        return sub(finalBalanceIn, balances[tokenIndexIn]) + 1
+
+    @staticmethod
+    def calcOutGivenIn(amplificationParameter: int, balances: List[int], tokenIndexIn: int, tokenIndexOut: int, tokenAmountIn: int, invariant: int = None, initialGuess: int = None) -> int:
+        # see calcInGivenOut for why initialGuess is ignored
+        if invariant is None:
+            invariant = StableMathInt.calculateInvariant(amplificationParameter, balances)
+
+        balances = list(balances)
+        balances[tokenIndexIn] = balances[tokenIndexIn] + tokenAmountIn
+        finalBalanceOut = StableMathInt.getTokenBalanceGivenInvariantAndAllOtherBalances(
+            amplificationParameter,
+            balances,
+            invariant,
+            tokenIndexOut)
+
+        return sub(sub(balances[tokenIndexOut], finalBalanceOut), 1)
+
+    @staticmethod
+    def calcTokenInGivenExactBptOut(amplificationParameter: int, balances: List[int], tokenIndex: int, bptAmountOut: int, bptTotalSupply: int, swapFeePercentage: int) -> int:
+        # token in, so we round up overall
+        currentInvariant = StableMathInt.calculateInvariant(amplificationParameter, balances)
+        newInvariant = mulUp(divUp(bptTotalSupply + bptAmountOut, bptTotalSupply), currentInvariant)
+
+        newBalanceTokenIndex = StableMathInt.getTokenBalanceGivenInvariantAndAllOtherBalances(amplificationParameter, balances, newInvariant, tokenIndex)
+        amountInWithoutFee = sub(newBalanceTokenIndex, balances[tokenIndex])
+
+        currentWeight = divDown(balances[tokenIndex], sum(balances))
+        taxablePercentage = complement(currentWeight)
+        taxableAmount = mulUp(amountInWithoutFee, taxablePercentage)
+        nonTaxableAmount = sub(amountInWithoutFee, taxableAmount)
+
+        return nonTaxableAmount + divUp(taxableAmount, ONE - swapFeePercentage)
+
+    @staticmethod
+    def calcTokensOutGivenExactBptIn(balances: List[int], bptAmountIn: int, bptTotalSupply: int) -> List[int]:
+        bptRatio = divDown(bptAmountIn, bptTotalSupply)
+        return [mulDown(balance, bptRatio) for balance in balances]
+
+    @staticmethod
+    def calcTokenOutGivenExactBptIn(amplificationParameter: int, balances: List[int], tokenIndex: int, bptAmountIn: int, bptTotalSupply: int, swapFeePercentage: int) -> int:
+        # token out, so we round down overall
+        currentInvariant = StableMathInt.calculateInvariant(amplificationParameter, balances)
+        newInvariant = mulUp(divUp(sub(bptTotalSupply, bptAmountIn), bptTotalSupply), currentInvariant)
+
+        newBalanceTokenIndex = StableMathInt.getTokenBalanceGivenInvariantAndAllOtherBalances(amplificationParameter, balances, newInvariant, tokenIndex)
+        amountOutWithoutFee = sub(balances[tokenIndex], newBalanceTokenIndex)
+
+        currentWeight = divDown(balances[tokenIndex], sum(balances))
+        taxablePercentage = complement(currentWeight)
+        taxableAmount = mulUp(amountOutWithoutFee, taxablePercentage)
+        nonTaxableAmount = sub(amountOutWithoutFee, taxableAmount)
+
+        return nonTaxableAmount + mulDown(taxableAmount, ONE - swapFeePercentage)
+
+    @staticmethod
+    def getTokenBalanceGivenInvariantAndAllOtherBalances(amplificationParameter: int, balances: List[int], invariant: int, tokenIndex: int) -> int:
+        # rounds result up overall
+        num_tokens = len(balances)
+        ampTimesTotal = amplificationParameter * num_tokens
+        bal_sum = balances[0]
+        P_D = balances[0] * num_tokens
+        for j in range(1, num_tokens):
+            P_D = (P_D * balances[j] * num_tokens) // invariant
+            bal_sum += balances[j]
+        bal_sum -= balances[tokenIndex]
+
+        inv2 = invariant * invariant
+        # we remove the balance from c by multiplying it
+        c = mathDivUp(inv2, ampTimesTotal * P_D) * AMP_PRECISION * balances[tokenIndex]
+        b = bal_sum + (invariant // ampTimesTotal) * AMP_PRECISION
+
+        tokenBalance = mathDivUp(inv2 + c, invariant + b)
+        for i in range(255):
+            prevTokenBalance = tokenBalance
+            tokenBalance = mathDivUp(tokenBalance * tokenBalance + c, sub(tokenBalance * 2 + b, invariant))
+
+            if tokenBalance > prevTokenBalance:
+                if tokenBalance - prevTokenBalance <= 1:
+                    return tokenBalance
+            elif prevTokenBalance - tokenBalance <= 1:
+                return tokenBalance
+
+        raise Exception("STABLE_GET_BALANCE_DIDNT_CONVERGE")
@@ -1,17 +1,28 @@
 from decimal import *
 from typing import List
 from balancerv2cad.StableMath import StableMath
+from balancerv2cad.StableMathInt import AMP_PRECISION
+from balancerv2cad.FixedPoint import toFixed, fromFixed
 from balancerv2cad.WeightedPool import WeightedPool
 from balancerv2cad.BalancerConstants import *
 
 
 class StablePool(StableMath):
 
+    # math backend used to quote swaps; set to StableMathInt (on a subclass
+    # or an instance) for integer math matching the on-chain libraries
+    math = StableMath
+
+    # bound on the number of (amp, balances) -> invariant entries kept per pool
+    INVARIANT_CACHE_SIZE = 1024
+
     def __init__(self, initial_pool_supply: Decimal = INIT_POOL_SUPPLY):
         self._swap_fee = MIN_FEE
         self._pool_token_supply = initial_pool_supply
         self.factory_fees = Decimal('0')
         self._balances = {}
+        self._invariant_cache = {}
+        self._last_invariant = None
 
     def swap(self, token_in: str, token_out: str, amount: Decimal, given_in: bool = True):
         if(isinstance(amount,int) or isinstance(amount,float)):
@@ -23,13 +34,80 @@ class StablePool(StableMath):
         self.factory_fees += factory_fee
         balances = [self._balances[token_in], self._balances[token_out]]
 
-        if(given_in): amount_out = StableMath.calcOutGivenIn(AMPLIFICATION_PARAMETER, balances, 0, 1, swap_amount)
-        else: amount_out = StableMath.calcInGivenOut(AMPLIFICATION_PARAMETER, balances, 0, 1, swap_amount)
+        amp = self._amp_to_math(AMPLIFICATION_PARAMETER)
+        balances_math = self._to_math(*balances)
+        swap_amount_math = self._to_math(swap_amount)[0]
+
+        invariant = self._get_invariant(amp, balances_math)
+
+        if(given_in): amount_out = self._from_math(self.math.calcOutGivenIn(amp, balances_math, 0, 1, swap_amount_math, invariant))
+        else: amount_out = self._from_math(self.math.calcInGivenOut(amp, balances_math, 0, 1, swap_amount_math, invariant))
 
         self._balances[token_out] -= amount_out
         self._balances[token_in] += swap_amount
         return amount_out
 
+    def quote_sweep(self, token_in: str, token_out: str, amounts: List[Decimal], given_in: bool = True) -> List[Decimal]:
+        """
+        Quote a sweep of amounts against the current balances without changing
+        pool state. The invariant is solved once and each point warm starts the
+        balance solver from the previous point's solution, so amounts should be
+        sorted for the best effect.
+        """
+        amp = self._amp_to_math(AMPLIFICATION_PARAMETER)
+        balances_math = self._to_math(self._balances[token_in], self._balances[token_out])
+        invariant = self._get_invariant(amp, balances_math)
+
+        results = []
+        initial_guess = None
+        for amount in amounts:
+            amount = Decimal(amount)
+            swap_amount_math = self._to_math(amount - amount*self._swap_fee)[0]
+            if(given_in):
+                result = self.math.calcOutGivenIn(amp, balances_math, 0, 1, swap_amount_math, invariant, initial_guess)
+                initial_guess = balances_math[1] - result
+            else:
+                result = self.math.calcInGivenOut(amp, balances_math, 0, 1, swap_amount_math, invariant, initial_guess)
+                initial_guess = balances_math[0] + result
+            results.append(self._from_math(result))
+        return results
+
+    def _get_invariant(self, amp, balances: list):
+        key = (amp, tuple(balances))
+        invariant = self._invariant_cache.get(key)
+        if invariant is None:
+            if len(self._invariant_cache) >= self.INVARIANT_CACHE_SIZE:
+                self._invariant_cache.clear()
+            # swaps move balances a little at a time, so the last invariant
+            # is a much closer Newton starting point than the balance sum.
+            # Fixed point math always starts from the sum, like the contracts
+            seed = None
+            if not getattr(self.math, 'FIXED_POINT', False) and self._last_invariant is not None \
+                    and self._last_invariant[0] == amp and self._last_invariant[1] == len(balances):
+                seed = self._last_invariant[2]
+            if seed is None:
+                invariant = self.math.calculateInvariant(amp, list(balances))
+            else:
+                invariant = self.math.calculateInvariant(amp, list(balances), seed)
+            self._invariant_cache[key] = invariant
+        self._last_invariant = (amp, len(balances), invariant)
+        return invariant
+
+    def _amp_to_math(self, amp: Decimal):
+        if getattr(self.math, 'FIXED_POINT', False):
+            return int(amp * AMP_PRECISION)
+        return amp
+
+    def _to_math(self, *values):
+        if getattr(self.math, 'FIXED_POINT', False):
+            return [toFixed(value) for value in values]
+        return list(values)
+
+    def _from_math(self, value):
+        if getattr(self.math, 'FIXED_POINT', False):
+            return fromFixed(value)
+        return value
+
     def join_pool(self, balances: dict):
         if len(balances) != 2:
             raise Exception("50/50 2-token pool only")
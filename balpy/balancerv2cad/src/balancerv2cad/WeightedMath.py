@@ -2,7 +2,7 @@ from decimal import Decimal
 from balancerv2cad.util import *
 from balancerv2cad.BalancerConstants import *
 from typing import List
-import sys  # todo delete later
+from balancerv2cad import tracing
 
 
 class WeightedMath:
@@ -121,14 +121,14 @@ class WeightedMath:
         # ******************************************************************************************/
 
         invariant_ratio = divUp((bpt_total_supply + bpt_amount_out), bpt_total_supply)
-        sys.stdout.write(f"invariant ratio {invariant_ratio}")
         balance_ratio = powUp(invariant_ratio, (divUp(Decimal(1), normalized_weight)))
-        sys.stdout.write(f"normalized weight {normalized_weight}")
         amount_in_without_fee = mulUp(balance, (balance_ratio - Decimal(1)))
         taxable_percentage = complement(normalized_weight)
         taxable_amount = mulUp(amount_in_without_fee, taxable_percentage)
         non_taxable_amount = amount_in_without_fee - taxable_amount
-        sys.stdout.write(f" swap fee {swap_fee}")
+        if tracing.tracer is not None:
+            tracing.tracer("WeightedMath.calc_token_in_given_exact_bpt_out", invariant_ratio=invariant_ratio,
+                           normalized_weight=normalized_weight, swap_fee=swap_fee)
         return non_taxable_amount + (divUp(taxable_amount, complement(swap_fee)))
 
     @staticmethod
@@ -145,7 +145,6 @@ class WeightedMath:
         invariant_ratio_without_fees = Decimal(0)
         for i in range(len(balances)):
             balance_ratios_without_fee[i] = divUp((balances[i] - amounts_out[i]), balances[i])
-            sys.stdout.write(f"{balances[i]}{amounts_out[i]}{balances[i]}{balance_ratios_without_fee} balance ratio")
             invariant_ratio_without_fees = invariant_ratio_without_fees + (mulUp(balance_ratios_without_fee[i], normalized_weights[i]))
 
         invariant_ratio = Decimal(1)
@@ -159,6 +158,9 @@ class WeightedMath:
                 amount_out_with_fee = amounts_out[i]
             balance_ratio = divUp((balances[i] - amount_out_with_fee), balances[i])
             invariant_ratio = mulDown(invariant_ratio, (powDown(balance_ratio, normalized_weights[i])))
+        if tracing.tracer is not None:
+            tracing.tracer("WeightedMath.calc_bpt_in_given_exact_tokens_out", balances=balances, amounts_out=amounts_out,
+                           balance_ratios_without_fee=balance_ratios_without_fee, invariant_ratio=invariant_ratio)
         return mulUp(bpt_total_supply, complement(invariant_ratio))
 
     @staticmethod
@@ -0,0 +1,69 @@
+import numpy as np
+from balancerv2cad.FixedPoint import ONE, toFixed
+from balancerv2cad.WeightedMathInt import WeightedMathInt, _MAX_IN_RATIO, _MAX_OUT_RATIO
+
+
+class WeightedMathBatch:
+    """
+    Vectorized counterparts of WeightedMath.calc_out_given_in/calc_in_given_out.
+
+    Inputs use a pool-major layout: balances and weights are arrays of shape
+    (pools,) and amounts are of shape (pools, amounts), one row of trade sizes
+    per pool. Scalars and 1-D amounts for a single pool broadcast as usual.
+
+    The default float64 path is meant for curves and route search. Trades the
+    pool would reject (above the max in/out ratio) come back as nan.
+
+    exact=True runs every point through WeightedMathInt instead and returns an
+    object array of 18 decimal ints identical to the on-chain result, with None
+    where the pool would revert. Use it to verify the points you act on.
+    """
+
+    MAX_IN_RATIO = _MAX_IN_RATIO / ONE
+    MAX_OUT_RATIO = _MAX_OUT_RATIO / ONE
+
+    @staticmethod
+    def _pool_major(amounts, *params):
+        amounts = np.asarray(amounts, dtype=np.float64)
+        params = [np.asarray(param, dtype=np.float64) for param in params]
+        if amounts.ndim == 2:
+            params = [param.reshape(-1, 1) if param.ndim == 1 else param for param in params]
+        return amounts, params
+
+    @staticmethod
+    def _exact(fn, amounts, params):
+        amounts, params = WeightedMathBatch._pool_major(amounts, *params)
+        broadcast = np.broadcast(*params, amounts)
+        result = np.empty(broadcast.shape, dtype=object)
+        for index, values in zip(np.ndindex(broadcast.shape), broadcast):
+            try:
+                result[index] = fn(*[toFixed(repr(float(value))) for value in values])
+            except Exception:
+                result[index] = None
+        return result
+
+    @staticmethod
+    def calc_out_given_in(balance_in, weight_in, balance_out, weight_out, amount_in, exact: bool = False):
+        if exact:
+            return WeightedMathBatch._exact(WeightedMathInt.calc_out_given_in, amount_in, (balance_in, weight_in, balance_out, weight_out))
+
+        amount_in, (balance_in, weight_in, balance_out, weight_out) = WeightedMathBatch._pool_major(
+            amount_in, balance_in, weight_in, balance_out, weight_out)
+
+        base = balance_in / (balance_in + amount_in)
+        result = balance_out * (1.0 - np.power(base, weight_in / weight_out))
+        return np.where(amount_in <= balance_in * WeightedMathBatch.MAX_IN_RATIO, result, np.nan)
+
+    @staticmethod
+    def calc_in_given_out(balance_in, weight_in, balance_out, weight_out, amount_out, exact: bool = False):
+        if exact:
+            return WeightedMathBatch._exact(WeightedMathInt.calc_in_given_out, amount_out, (balance_in, weight_in, balance_out, weight_out))
+
+        amount_out, (balance_in, weight_in, balance_out, weight_out) = WeightedMathBatch._pool_major(
+            amount_out, balance_in, weight_in, balance_out, weight_out)
+
+        valid = amount_out <= balance_out * WeightedMathBatch.MAX_OUT_RATIO
+        with np.errstate(divide='ignore', invalid='ignore'):
+            base = balance_out / (balance_out - amount_out)
+            result = balance_in * (np.power(base, weight_out / weight_in) - 1.0)
+        return np.where(valid, result, np.nan)
@@ -0,0 +1,168 @@
+from typing import List
+from balancerv2cad.FixedPoint import *
+
+
+# limits enforced by WeightedMath.sol, as 18 decimal fixed point
+_MAX_IN_RATIO = 3 * 10**17
+_MAX_OUT_RATIO = 3 * 10**17
+_MAX_INVARIANT_RATIO = 3 * ONE
+_MIN_INVARIANT_RATIO = 7 * 10**17
+
+
+class WeightedMathInt:
+    """
+    Drop-in replacement for WeightedMath operating on 18 decimal fixed point
+    ints, matching WeightedMath.sol bit for bit (including its reverts).
+    """
+
+    FIXED_POINT = True
+
+    @staticmethod
+    def calculate_invariant(normalized_weights: List[int], balances: List[int]) -> int:
+        invariant = ONE
+        for i in range(len(normalized_weights)):
+            invariant = mulDown(invariant, powDown(balances[i], normalized_weights[i]))
+        if invariant == 0:
+            raise Exception("ZERO_INVARIANT")
+        return invariant
+
+    @staticmethod
+    def calc_out_given_in(balance_in: int,
+                          weight_in: int,
+                          balance_out: int,
+                          weight_out: int,
+                          amount_in: int) -> int:
+        if amount_in > mulDown(balance_in, _MAX_IN_RATIO):
+            raise Exception("MAX_IN_RATIO")
+
+        denominator = balance_in + amount_in
+        base = divUp(balance_in, denominator)
+        exponent = divDown(weight_in, weight_out)
+        power = powUp(base, exponent)
+
+        return mulDown(balance_out, complement(power))
+
+    @staticmethod
+    def calc_in_given_out(balance_in: int,
+                          weight_in: int,
+                          balance_out: int,
+                          weight_out: int,
+                          amount_out: int) -> int:
+        if amount_out > mulDown(balance_out, _MAX_OUT_RATIO):
+            raise Exception("MAX_OUT_RATIO")
+
+        base = divUp(balance_out, sub(balance_out, amount_out))
+        exponent = divUp(weight_out, weight_in)
+        power = powUp(base, exponent)
+        ratio = sub(power, ONE)
+        return mulUp(balance_in, ratio)
+
+    @staticmethod
+    def calc_bpt_out_given_exact_tokens_in(balances: List[int], normalized_weights: List[int], amounts_in: List[int],
+                                           bptTotalSupply: int,
+                                           swap_fee: int) -> int:
+
+        balance_ratios_with_fee = [0] * len(amounts_in)
+        invariant_ratio_with_fees = 0
+        for i in range(len(balances)):
+            balance_ratios_with_fee[i] = divDown(balances[i] + amounts_in[i], balances[i])
+            invariant_ratio_with_fees += mulDown(balance_ratios_with_fee[i], normalized_weights[i])
+
+        invariant_ratio = ONE
+        for i in range(len(balances)):
+            if balance_ratios_with_fee[i] > invariant_ratio_with_fees:
+                non_taxable_amount = mulDown(balances[i], sub(invariant_ratio_with_fees, ONE))
+                taxable_amount = sub(amounts_in[i], non_taxable_amount)
+                swap_fee_amount = mulUp(taxable_amount, swap_fee)
+                amount_in_without_fee = non_taxable_amount + sub(taxable_amount, swap_fee_amount)
+            else:
+                amount_in_without_fee = amounts_in[i]
+
+            balance_ratio = divDown(balances[i] + amount_in_without_fee, balances[i])
+            invariant_ratio = mulDown(invariant_ratio, powDown(balance_ratio, normalized_weights[i]))
+
+        if invariant_ratio > ONE:
+            return mulDown(bptTotalSupply, sub(invariant_ratio, ONE))
+        return 0
+
+    @staticmethod
+    def calc_token_in_given_exact_bpt_out(balance: int,
+                                          normalized_weight: int,
+                                          bpt_amount_out: int,
+                                          bpt_total_supply: int,
+                                          swap_fee: int) -> int:
+        invariant_ratio = divUp(bpt_total_supply + bpt_amount_out, bpt_total_supply)
+        if invariant_ratio > _MAX_INVARIANT_RATIO:
+            raise Exception("MAX_OUT_BPT_FOR_TOKEN_IN")
+
+        balance_ratio = powUp(invariant_ratio, divUp(ONE, normalized_weight))
+        amount_in_without_fee = mulUp(balance, sub(balance_ratio, ONE))
+
+        taxable_percentage = complement(normalized_weight)
+        taxable_amount = mulUp(amount_in_without_fee, taxable_percentage)
+        non_taxable_amount = sub(amount_in_without_fee, taxable_amount)
+        return non_taxable_amount + divUp(taxable_amount, complement(swap_fee))
+
+    @staticmethod
+    def calc_bpt_in_given_exact_tokens_out(balances: List[int],
+                                           normalized_weights: List[int],
+                                           amounts_out: List[int],
+                                           bpt_total_supply: int,
+                                           swap_fee: int) -> int:
+        balance_ratios_without_fee = [0] * len(amounts_out)
+        invariant_ratio_without_fees = 0
+        for i in range(len(balances)):
+            balance_ratios_without_fee[i] = divUp(sub(balances[i], amounts_out[i]), balances[i])
+            invariant_ratio_without_fees += mulUp(balance_ratios_without_fee[i], normalized_weights[i])
+
+        invariant_ratio = ONE
+        for i in range(len(balances)):
+            if invariant_ratio_without_fees > balance_ratios_without_fee[i]:
+                non_taxable_amount = mulDown(balances[i], complement(invariant_ratio_without_fees))
+                taxable_amount = sub(amounts_out[i], non_taxable_amount)
+                amount_out_with_fee = non_taxable_amount + divUp(taxable_amount, complement(swap_fee))
+            else:
+                amount_out_with_fee = amounts_out[i]
+
+            balance_ratio = divDown(sub(balances[i], amount_out_with_fee), balances[i])
+            invariant_ratio = mulDown(invariant_ratio, powDown(balance_ratio, normalized_weights[i]))
+        return mulUp(bpt_total_supply, complement(invariant_ratio))
+
+    @staticmethod
+    def calc_token_out_given_exact_bpt_in(balance: int,
+                                          normalized_weight: int,
+                                          bpt_amount_in: int,
+                                          bpt_total_supply: int,
+                                          swap_fee: int) -> int:
+        invariant_ratio = divUp(sub(bpt_total_supply, bpt_amount_in), bpt_total_supply)
+        if invariant_ratio < _MIN_INVARIANT_RATIO:
+            raise Exception("MIN_BPT_IN_FOR_TOKEN_OUT")
+
+        balance_ratio = powUp(invariant_ratio, divDown(ONE, normalized_weight))
+        amount_out_without_fee = mulDown(balance, complement(balance_ratio))
+
+        taxable_percentage = complement(normalized_weight)
+        taxable_amount = mulUp(amount_out_without_fee, taxable_percentage)
+        non_taxable_amount = sub(amount_out_without_fee, taxable_amount)
+        return non_taxable_amount + mulDown(taxable_amount, complement(swap_fee))
+
+    @staticmethod
+    def calc_tokens_out_given_exact_bpt_in(balances: List[int], bpt_amount_in: int, total_bpt: int) -> List[int]:
+        bpt_ratio = divDown(bpt_amount_in, total_bpt)
+        return [mulDown(balance, bpt_ratio) for balance in balances]
+
+    @staticmethod
+    def calc_due_token_protocol_swap_fee_amount(balance: int,
+                                                normalized_weight: int,
+                                                previous_invariant: int,
+                                                current_invariant: int,
+                                                protocol_swap_fee_percentage: int) -> int:
+        if current_invariant <= previous_invariant:
+            return 0
+
+        base = divUp(previous_invariant, current_invariant)
+        exponent = divDown(ONE, normalized_weight)
+        base = max(base, MIN_POW_BASE_FREE_EXPONENT)
+        power = powUp(base, exponent)
+        token_accrued_fees = mulDown(balance, complement(power))
+        return mulDown(token_accrued_fees, protocol_swap_fee_percentage)
@@ -1,10 +1,15 @@
 from decimal import Decimal
 from balancerv2cad.WeightedMath import WeightedMath
+from balancerv2cad.FixedPoint import toFixed, fromFixed
 from balancerv2cad.BalancerConstants import *
 
 
 class WeightedPool(WeightedMath):
 
+    # math backend used to quote swaps; set to WeightedMathInt (on a subclass
+    # or an instance) for integer math matching the on-chain libraries
+    math = WeightedMath
+
     def __init__(self, initial_pool_supply: Decimal = INIT_POOL_SUPPLY):
         self._swap_fee = MIN_FEE
         self.total_weight = Decimal('0')
@@ -26,17 +31,27 @@ class WeightedPool(WeightedMath):
         weights = [self._weights[token_in], self._weights[token_out]]
         
         if(given_in):
-            amount_out = WeightedMath.calc_out_given_in(balances[0], weights[0], balances[1], weights[1], swap_amount)
+            amount_out = self._from_math(self.math.calc_out_given_in(*self._to_math(balances[0], weights[0], balances[1], weights[1], swap_amount)))
             self._balances[token_out] -= amount_out
             self._balances[token_in] += swap_amount
             
         else:
-            amount_in = WeightedMath.calc_in_given_out(balances[0], weights[0], balances[1], weights[1], swap_amount)            
+            amount_in = self._from_math(self.math.calc_in_given_out(*self._to_math(balances[0], weights[0], balances[1], weights[1], swap_amount)))
             self._balances[token_out] -= swap_amount
             self._balances[token_in] += amount_in
 
         return amount_out if given_in else amount_in
     
+    def _to_math(self, *values):
+        if getattr(self.math, 'FIXED_POINT', False):
+            return [toFixed(value) for value in values]
+        return values
+
+    def _from_math(self, value):
+        if getattr(self.math, 'FIXED_POINT', False):
+            return fromFixed(value)
+        return value
+
     def join_pool(self, balances: dict, weights={}):
         if(not balances.keys()==weights.keys()): raise Exception('KEYS NOT EQUAL')
         for key in weights:
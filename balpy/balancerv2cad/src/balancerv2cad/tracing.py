@@ -0,0 +1,52 @@
+"""
+Opt-in tracing of intermediate values in the math hot paths.
+
+Tracing is off by default. Call sites only check `tracing.tracer is not None`
+before building any trace data, so disabled tracing costs a single attribute
+lookup per call. A tracer is any callable taking an event name and keyword
+values, e.g. a TraceRecorder or print_tracer.
+"""
+
+tracer = None
+
+
+def set_tracer(new_tracer):
+    """
+    Install a tracer (or None to disable tracing) and return the previous one
+    """
+    global tracer
+    previous = tracer
+    tracer = new_tracer
+    return previous
+
+
+class TraceRecorder:
+    """
+    Tracer that records (event, values) tuples. Use as a context manager to
+    trace a block of code:
+
+        with TraceRecorder() as recorder:
+            StableMath.calcOutGivenIn(...)
+        recorder.events
+    """
+
+    def __init__(self):
+        self.events = []
+        self._previous = None
+
+    def __call__(self, event: str, **values):
+        self.events.append((event, values))
+
+    def __enter__(self):
+        self._previous = set_tracer(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        set_tracer(self._previous)
+
+
+def print_tracer(event: str, **values):
+    """
+    Tracer reproducing the old print-debugging output on stdout
+    """
+    print(event, " ".join(f"{key}={value}" for key, value in values.items()))
@@ -0,0 +1,66 @@
+from decimal import Context, Decimal
+from balancerv2cad import LogExpMath
+from balancerv2cad.FixedPoint import *
+
+ctx = Context(prec=60)
+MAX_RELATIVE_ERROR = Decimal('1e-14')
+
+def expectRelativeError(result: int, expected: Decimal):
+    return abs(ctx.divide(ctx.subtract(Decimal(result), expected), expected)) <= MAX_RELATIVE_ERROR
+
+def exact_pow(x: int, y: int) -> Decimal:
+    base = ctx.divide(Decimal(x), Decimal(ONE))
+    exponent = ctx.divide(Decimal(y), Decimal(ONE))
+    return ctx.multiply(ctx.power(base, exponent), Decimal(ONE))
+
+
+class TestFixedPoint:
+
+    def test_mul_rounding(self):
+        assert mulDown(1, 1) == 0
+        assert mulUp(1, 1) == 1
+        assert mulDown(3 * ONE, ONE // 2) == 15 * 10**17
+        assert mulUp(0, ONE) == 0
+
+    def test_div_rounding(self):
+        assert divDown(ONE, 3 * ONE) == 333333333333333333
+        assert divUp(ONE, 3 * ONE) == 333333333333333334
+        assert divUp(0, 3) == 0
+
+    def test_div_by_zero(self):
+        try:
+            divDown(ONE, 0)
+            assert False
+        except Exception as error:
+            assert str(error) == "ZERO_DIVISION"
+
+    def test_complement(self):
+        assert complement(3 * 10**17) == 7 * 10**17
+        assert complement(2 * ONE) == 0
+
+    def test_conversions(self):
+        assert toFixed(Decimal('1.5')) == 15 * 10**17
+        assert toFixed(Decimal('123456789012.123456789012345678')) == 123456789012123456789012345678
+        assert fromFixed(15 * 10**17) == Decimal('1.5')
+
+    def test_exp_ln(self):
+        assert expectRelativeError(LogExpMath.exp(ONE), ctx.multiply(ctx.exp(Decimal(1)), Decimal(ONE)))
+        assert expectRelativeError(LogExpMath.ln(10 * ONE), ctx.multiply(ctx.ln(Decimal(10)), Decimal(ONE)))
+        assert expectRelativeError(-LogExpMath.ln(ONE // 10), ctx.multiply(ctx.ln(Decimal(10)), Decimal(ONE)))
+        assert LogExpMath.exp(0) == ONE
+
+    def test_pow(self):
+        for x, y in [(2 * ONE, ONE // 2), (ONE + 10**15, 3 * ONE), (5 * 10**17, 1234 * 10**15), (10**24, 7 * 10**17)]:
+            assert expectRelativeError(LogExpMath.pow(x, y), exact_pow(x, y))
+
+    def test_pow_bounds(self):
+        # powDown and powUp must bracket the exact result
+        for x, y in [(2 * ONE, ONE // 2), (9 * 10**17, 3 * ONE + 1), (5 * 10**17, 1234 * 10**15)]:
+            exact = exact_pow(x, y)
+            assert Decimal(powDown(x, y)) <= exact <= Decimal(powUp(x, y))
+
+    def test_pow_shortcuts(self):
+        x = 1234567890123456789
+        assert powDown(x, ONE) == x
+        assert powUp(x, TWO) == mulUp(x, x)
+        assert powDown(x, FOUR) == mulDown(mulDown(x, x), mulDown(x, x))
@@ -1,5 +1,7 @@
 from typing import List
 from balancerv2cad.StableMath import StableMath
+from balancerv2cad.StablePool import StablePool
+from balancerv2cad.tracing import TraceRecorder
 from decimal import *
 import unittest
 
@@ -210,3 +212,74 @@ class TestStableMath(unittest.TestCase):
 
         result = StableMath.getTokenBalanceGivenInvariantAndAllOtherBalances(amp, balances, invariant, tokenIndex)
         assert expectEqualWithError(result, Decimal(0.00071756564425404818025))
+
+    def test_getTokenBalanceWarmStart(self):
+        '''
+        Warm starting from a nearby solution converges to the same balance
+        '''
+        amp = Decimal(100)
+        balances = [Decimal(10), Decimal(11), Decimal(12)]
+        invariant = StableMath.calculateInvariant(amp, balances)
+        cold = StableMath.getTokenBalanceGivenInvariantAndAllOtherBalances(amp, balances, invariant, 1)
+        warm = StableMath.getTokenBalanceGivenInvariantAndAllOtherBalances(amp, balances, invariant, 1, cold + Decimal('0.01'))
+        assert expectEqualWithError(warm, cold)
+        '''
+        An unusable guess (left of the parabola's vertex) falls back to the cold start
+        '''
+        fallback = StableMath.getTokenBalanceGivenInvariantAndAllOtherBalances(amp, balances, invariant, 1, Decimal('1e-9'))
+        assert expectEqualWithError(fallback, cold)
+
+    def test_calculateInvariantWarmStart(self):
+        amp = Decimal(100)
+        balances = [Decimal(300), Decimal(2000), Decimal(900)]
+        nearby = StableMath.calculateInvariant(amp, [Decimal(301), Decimal(1999), Decimal(900)])
+        with TraceRecorder() as recorder:
+            cold = StableMath.calculateInvariant(amp, balances)
+            warm = StableMath.calculateInvariant(amp, balances, nearby)
+        (coldTrace, warmTrace) = [values for event, values in recorder.events]
+        assert warm == cold
+        assert warmTrace['iterations'] < coldTrace['iterations']
+
+    def test_poolSwapsWarmStartInvariant(self):
+        def run(warm):
+            pool = StablePool()
+            pool.join_pool({'a': Decimal(300), 'b': Decimal(2000)})
+            outs = []
+            with TraceRecorder() as recorder:
+                for i in range(10):
+                    if not warm:
+                        pool._last_invariant = None
+                    outs.append(pool.swap('a', 'b', Decimal('1.5')) if i % 2 == 0 else pool.swap('b', 'a', Decimal('0.7')))
+            iterations = sum(values['iterations'] for event, values in recorder.events if event == 'StableMath.calculateInvariant')
+            return outs, iterations
+        '''
+        Each swap's invariant is seeded with the previous one: same quotes, fewer Newton steps
+        '''
+        (coldOuts, coldIterations) = run(False)
+        (warmOuts, warmIterations) = run(True)
+        for cold, warm in zip(coldOuts, warmOuts):
+            assert expectEqualWithError(warm, cold)
+        assert warmIterations < coldIterations
+
+    def test_calcOutGivenInWithInvariant(self):
+        amp = Decimal(10)
+        balances = [Decimal(10), Decimal(11), Decimal(12)]
+        invariant = StableMath.calculateInvariant(amp, balances)
+        result = StableMath.calcOutGivenIn(amp, balances, 0, 1, Decimal(1), invariant)
+        expected = Decimal(991747876655227989)/Decimal(1e18)
+        assert expectEqualWithError(result, expected)
+
+    def test_poolQuoteSweep(self):
+        pool = StablePool()
+        pool.join_pool({'a': Decimal(100), 'b': Decimal(120)})
+        amounts = [Decimal(i) for i in range(1, 6)]
+        sweep = pool.quote_sweep('a', 'b', amounts)
+        '''
+        Quoting does not change pool state and the invariant is solved once
+        '''
+        assert pool._balances == {'a': Decimal(100), 'b': Decimal(120)}
+        assert len(pool._invariant_cache) == 1
+        for amount, quoted in zip(amounts, sweep):
+            single = pool.quote_sweep('a', 'b', [amount])[0]
+            assert expectEqualWithError(quoted, single)
+        assert len(pool._invariant_cache) == 1
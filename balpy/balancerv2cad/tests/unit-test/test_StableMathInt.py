@@ -0,0 +1,61 @@
+from decimal import Decimal
+from balancerv2cad.FixedPoint import ONE, toFixed, fromFixed
+from balancerv2cad.StableMathInt import StableMathInt, AMP_PRECISION
+from balancerv2cad.StablePool import StablePool
+
+AMP = 100 * AMP_PRECISION
+MAX_ERROR = Decimal('1e-15')
+
+def expectEqualWithError(result: int, expected: Decimal):
+    return abs(fromFixed(result) - expected) <= MAX_ERROR
+
+
+class TestStableMathInt:
+
+    def test_invariant_balanced(self):
+        # a balanced pool has an invariant equal to the sum of balances
+        result = StableMathInt.calculateInvariant(AMP, [10 * ONE, 10 * ONE, 10 * ONE])
+        assert isinstance(result, int)
+        assert abs(result - 30 * ONE) <= 1
+
+    def test_invariant_two_tokens(self):
+        result = StableMathInt.calculateInvariant(AMP, [10 * ONE, 12 * ONE])
+        assert expectEqualWithError(result, Decimal('21.999092520992127'))
+
+    def test_invariant_empty(self):
+        assert StableMathInt.calculateInvariant(AMP, [0, 0]) == 0
+
+    def test_out_given_in(self):
+        balances = [10 * ONE, 12 * ONE, 14 * ONE]
+        result = StableMathInt.calcOutGivenIn(AMP, balances, 0, 1, ONE)
+        assert expectEqualWithError(result, Decimal('1.001008467219027'))
+        # inputs are not mutated
+        assert balances == [10 * ONE, 12 * ONE, 14 * ONE]
+
+    def test_round_trip(self):
+        # swapping the quoted amount back out never returns more than was put in
+        balances = [10 * ONE, 12 * ONE, 14 * ONE]
+        amount_out = StableMathInt.calcOutGivenIn(AMP, balances, 0, 1, ONE)
+        amount_in = StableMathInt.calcInGivenOut(AMP, balances, 0, 1, amount_out)
+        assert amount_in <= ONE
+        assert ONE - amount_in <= 1000
+
+    def test_bpt_out_given_exact_tokens_in_reverts_like_solidity(self):
+        # rounded down weights make the invariant ratio dip below ONE: StableMath.sol reverts on the sub
+        try:
+            StableMathInt.calcBptOutGivenExactTokensIn(AMP, [3 * ONE, 3 * ONE, 3 * ONE], [1, 0, 0], 9 * ONE, 0, 10**16)
+            assert False
+        except Exception as error:
+            assert str(error) == "SUB_OVERFLOW"
+
+    def test_tokens_out_given_exact_bpt_in(self):
+        result = StableMathInt.calcTokensOutGivenExactBptIn([10 * ONE, 12 * ONE], ONE, 10 * ONE)
+        assert result == [ONE, 12 * 10**17]
+
+    def test_pool_backend(self):
+        pool = StablePool()
+        pool.math = StableMathInt
+        pool.join_pool({'a': Decimal(100), 'b': Decimal(100)})
+        amount_out = pool.swap('a', 'b', Decimal(10))
+        assert isinstance(amount_out, Decimal)
+        assert abs(amount_out - Decimal('9.99496768714996')) < Decimal('1e-12')
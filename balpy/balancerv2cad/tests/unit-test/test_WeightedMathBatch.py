@@ -0,0 +1,47 @@
+from decimal import Decimal
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from balancerv2cad.FixedPoint import ONE, fromFixed
+from balancerv2cad.WeightedMath import WeightedMath
+from balancerv2cad.WeightedMathBatch import WeightedMathBatch
+from balancerv2cad.WeightedMathInt import WeightedMathInt
+
+
+class TestWeightedMathBatch:
+
+    def test_out_given_in_matches_scalar(self):
+        amounts = np.linspace(0.5, 25, 50)
+        result = WeightedMathBatch.calc_out_given_in(100, 0.6, 80, 0.4, amounts)
+        assert result.shape == amounts.shape
+        for amount, out in zip(amounts, result):
+            expected = WeightedMath.calc_out_given_in(Decimal(100), Decimal('0.6'), Decimal(80), Decimal('0.4'), Decimal(repr(float(amount))))
+            assert abs(out - float(expected)) <= 1e-9 * float(expected)
+
+    def test_in_given_out_matches_scalar(self):
+        amounts = np.linspace(0.5, 20, 40)
+        result = WeightedMathBatch.calc_in_given_out(100, 0.5, 100, 0.5, amounts)
+        for amount, amount_in in zip(amounts, result):
+            expected = 100 * (100 / (100 - amount) - 1)
+            assert abs(amount_in - expected) <= 1e-9 * expected
+
+    def test_pool_major_layout(self):
+        balances = np.array([100.0, 200.0, 300.0])
+        amounts = np.tile(np.array([1.0, 10.0, 20.0]), (3, 1))
+        result = WeightedMathBatch.calc_out_given_in(balances, 0.5, balances, 0.5, amounts)
+        assert result.shape == (3, 3)
+        for p in range(3):
+            single = WeightedMathBatch.calc_out_given_in(balances[p], 0.5, balances[p], 0.5, amounts[p])
+            assert np.allclose(result[p], single)
+
+    def test_rejected_trades(self):
+        result = WeightedMathBatch.calc_out_given_in(100, 0.5, 100, 0.5, [10, 31])
+        assert not np.isnan(result[0])
+        assert np.isnan(result[1])
+
+    def test_exact_path(self):
+        result = WeightedMathBatch.calc_out_given_in([100, 200], 0.5, [100, 200], 0.5, [[15, 40], [15, 40]], exact=True)
+        assert result[0][0] == WeightedMathInt.calc_out_given_in(100 * ONE, ONE // 2, 100 * ONE, ONE // 2, 15 * ONE)
+        assert result[0][1] is None
+        assert abs(float(fromFixed(result[1][1])) - 200 * 40 / 240) < 1e-12
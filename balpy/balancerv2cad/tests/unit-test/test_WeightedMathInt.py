@@ -0,0 +1,60 @@
+from decimal import Decimal
+from balancerv2cad.FixedPoint import ONE, toFixed, fromFixed
+from balancerv2cad.WeightedMath import WeightedMath
+from balancerv2cad.WeightedMathInt import WeightedMathInt
+from balancerv2cad.WeightedPool import WeightedPool
+
+MAX_RELATIVE_ERROR = Decimal('1e-12')
+
+def expectEqualWithError(result: int, expected: Decimal):
+    return abs(fromFixed(result) - expected) <= abs(expected) * MAX_RELATIVE_ERROR
+
+
+class TestWeightedMathInt:
+
+    def test_out_given_in(self):
+        result = WeightedMathInt.calc_out_given_in(100 * ONE, ONE // 2, 100 * ONE, ONE // 2, 15 * ONE)
+        assert isinstance(result, int)
+        # balanceOut * (1 - 100/115) for equal weights
+        assert expectEqualWithError(result, Decimal(1500) / Decimal(115))
+
+    def test_out_given_in_rounds_down(self):
+        exact = Decimal(1500) / Decimal(115)
+        assert fromFixed(WeightedMathInt.calc_out_given_in(100 * ONE, ONE // 2, 100 * ONE, ONE // 2, 15 * ONE)) <= exact
+
+    def test_in_given_out(self):
+        result = WeightedMathInt.calc_in_given_out(100 * ONE, ONE // 2, 100 * ONE, ONE // 2, 15 * ONE)
+        assert expectEqualWithError(result, Decimal(100) * (Decimal(100) / Decimal(85) - 1))
+        assert fromFixed(result) >= Decimal(100) * (Decimal(100) / Decimal(85) - 1)
+
+    def test_max_in_ratio(self):
+        try:
+            WeightedMathInt.calc_out_given_in(100 * ONE, ONE // 2, 100 * ONE, ONE // 2, 31 * ONE)
+            assert False
+        except Exception as error:
+            assert str(error) == "MAX_IN_RATIO"
+
+    def test_bpt_out_given_exact_tokens_in_reverts_like_solidity(self):
+        try:
+            WeightedMathInt.calc_bpt_out_given_exact_tokens_in([3 * ONE] * 3, [ONE // 3] * 3, [1, 0, 0], 9 * ONE, 10**16)
+            assert False
+        except Exception as error:
+            assert str(error) == "SUB_OVERFLOW"
+
+    def test_invariant(self):
+        result = WeightedMathInt.calculate_invariant([3 * 10**17, 7 * 10**17], [10 * ONE, 12 * ONE])
+        assert expectEqualWithError(result, Decimal('11.361269771988886911'))
+
+    def test_tokens_out_given_exact_bpt_in(self):
+        result = WeightedMathInt.calc_tokens_out_given_exact_bpt_in([10 * ONE, 12 * ONE], ONE, 10 * ONE)
+        assert result == [ONE, 12 * 10**17]
+
+    def test_pool_backend(self):
+        class WeightedPoolInt(WeightedPool):
+            math = WeightedMathInt
+
+        pool = WeightedPoolInt()
+        pool.join_pool({'a': 100, 'b': 100}, {'a': 0.5, 'b': 0.5})
+        amount_out = pool.swap('a', 'b', Decimal(10))
+        assert isinstance(amount_out, Decimal)
+        assert toFixed(amount_out) == WeightedMathInt.calc_out_given_in(100 * ONE, ONE // 2, 100 * ONE, ONE // 2, toFixed(Decimal(10) - Decimal(10) * pool._swap_fee))
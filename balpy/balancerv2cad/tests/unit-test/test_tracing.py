@@ -0,0 +1,32 @@
+from decimal import *
+from balancerv2cad import tracing
+from balancerv2cad.StableMath import StableMath
+from balancerv2cad.WeightedMath import WeightedMath
+
+
+class TestTracing:
+
+    def test_disabled_by_default(self, capsys):
+        assert tracing.tracer is None
+        StableMath.calcOutGivenIn(Decimal(100), [Decimal(10), Decimal(11)], 0, 1, Decimal(1))
+        WeightedMath.calc_token_in_given_exact_bpt_out(Decimal(100), Decimal(0.5), Decimal(1), Decimal(100), Decimal(0.01))
+        assert capsys.readouterr().out == ""
+
+    def test_recorder(self):
+        with tracing.TraceRecorder() as recorder:
+            result = StableMath.calcOutGivenIn(Decimal(100), [Decimal(10), Decimal(11)], 0, 1, Decimal(1))
+        assert tracing.tracer is None
+        assert [event for event, values in recorder.events] == ["StableMath.calculateInvariant", "StableMath.calcOutGivenIn"]
+        event, values = recorder.events[0]
+        assert values["iterations"] > 0
+        event, values = recorder.events[1]
+        assert values["result"] == result
+        assert "invariant" in values
+
+    def test_print_tracer(self, capsys):
+        previous = tracing.set_tracer(tracing.print_tracer)
+        try:
+            WeightedMath.calc_token_in_given_exact_bpt_out(Decimal(100), Decimal(0.5), Decimal(1), Decimal(100), Decimal(0.01))
+        finally:
+            tracing.set_tracer(previous)
+        assert capsys.readouterr().out.startswith("WeightedMath.calc_token_in_given_exact_bpt_out invariant_ratio=")
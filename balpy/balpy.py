@@ -14,12 +14,14 @@ from functools import cache
 import traceback
 import random
 import binascii
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # low level web3
 from web3 import Web3, middleware
 from web3.gas_strategies.time_based import glacial_gas_price_strategy, slow_gas_price_strategy, medium_gas_price_strategy, fast_gas_price_strategy
 from web3.middleware import geth_poa_middleware
 from web3._utils.abi import get_abi_output_types
+from web3.exceptions import TransactionNotFound
 import eth_abi
 
 # high level web3
@@ -29,6 +31,17 @@ from multicaller import multicaller
 from . import balancerErrors as be
 from .enums.stablePoolJoinExitKind import StablePoolJoinKind, StablePhantomPoolJoinKind, StablePoolExitKind
 from .enums.weightedPoolJoinExitKind import WeightedPoolJoinKind, WeightedPoolExitKind
+from .deploymentRegistry import DeploymentRegistry, LazyAbiDict, getRegistry
+from .multicallBatch import MulticallBatch, AdaptiveChunkSize
+from .nonceManager import NonceManager
+from .receiptTracker import ReceiptTracker
+from .feeOracle import FeeOracle
+from .gasProfileCache import GasProfileCache
+from .httpSession import getSession
+from .multiEndpointProvider import MultiEndpointProvider
+from .rpcBatch import RpcBatch, RpcBatcher
+from .vaultIndexer import VaultIndexer
+from .etherscanStore import TokenBucket, ResponseCache
 
 class Suppressor(object):
     def __enter__(self):
@@ -80,8 +93,9 @@ class balpy(object):
 	envVarCustomRPC = 	"BALPY_CUSTOM_RPC";
 	
 	# Etherscan API call management	
-	lastEtherscanCallTime = 0;
-	etherscanMaxRate = 5.0; #hz
+	etherscanMaxRate = 5.0; #hz, shared by every thread and process on this machine
+	etherscanFinalityBlocks = 128; # txlist results older than this are cached
+	etherscanMaxResults = 10000; # txlist page size limit
 	etherscanSpeedDict = {
 			"slow":"SafeGasPrice",
 			"average":"ProposeGasPrice",
@@ -110,47 +124,67 @@ class balpy(object):
 					"sepolia":			{"id":11155111,	"blockExplorerUrl":"sepolia.etherscan.io",			"balFrontend":"app.balancer.fi/#/sepolia"		}
 				};
 
+	# Approximate block times, used to cache fee data for about one block
+	defaultBlockTimeSec = 2;
+	blockTimeSec = {
+		"mainnet":12,
+		"goerli":12,
+		"sepolia":12,
+		"gnosis":5,
+		"polygon":2,
+		"optimism":2,
+		"zkevm":2,
+		"arbitrum":1,
+		"fantom":1
+	};
+
 	apiEndpoint = "https://api.balancer.fi/"
 
+	# Serve gas estimates learned from past receipts instead of calling estimateGas
+	useGasProfileCache = True;
+
+	# With several RPC endpoints, reads pending this long are also sent to a second node (None disables hedging)
+	rpcHedgeDelaySec = None;
+
+	# Multicall chunks executed concurrently per batch
+	multicallMaxWorkers = 4;
+
+	# Incremental on-chain data refresh
+	onchainDataMaxLogBlockRange = 2000; # larger gaps since the snapshot trigger a full refresh
+	onchainDataLogAddressChunkSize = 500; # pool addresses per eth_getLogs filter
+	onchainDataGradualWeightPoolTypes = ["LiquidityBootstrapping", "Investment", "Managed"];
+	onchainDataVaultTopics = [Web3.keccak(text=e).hex() for e in [
+		"Swap(bytes32,address,address,uint256,uint256)",
+		"PoolBalanceChanged(bytes32,address,address[],int256[],uint256[])",
+		"PoolBalanceManaged(bytes32,address,address,int256,int256)"
+	]];
+	onchainDataPoolTopics = [Web3.keccak(text=e).hex() for e in [
+		"SwapFeePercentageChanged(uint256)",
+		"PausedStateChanged(bool)",
+		"AmpUpdateStarted(uint256,uint256,uint256,uint256)",
+		"AmpUpdateStopped(uint256)",
+		"GradualWeightUpdateScheduled(uint256,uint256,uint256[],uint256[])",
+		"SwapEnabledSet(bool)"
+	]];
+
+	# Local stores (event index, caches) live here unless a path is given
+	cacheDir = os.path.join(os.path.expanduser("~"), ".balpy");
+
+	# Vault deployment blocks, where the event indexer starts scanning
+	vaultDeploymentBlock = {
+		"mainnet":12272146,
+		"polygon":15832990,
+		"arbitrum":222832
+	};
+
 	# ABIs and Deployment Addresses
+	# (populated lazily from the shared deployment registry in __init__)
 	abis = {};
 	deploymentAddresses = {};
 
 	contractDirectories = {};
 	deprecatedContractDirectories = {};
-	deprecated = True;
-	deploymentsDir = "balancer-deployments/tasks/deprecated"
-
-	for i in range(2):
-		# Get all deployment directories from the balancer-deployments repo
-		if not deprecated:
-			deploymentsDir = "balancer-deployments/tasks"
-
-		spec = importlib.util.find_spec(__name__)
-		headTail = os.path.split(spec.origin);
-		packagePath = headTail[0];
-		taskDir = os.path.join(packagePath, deploymentsDir);
-		taskSubDirs = os.listdir(taskDir);
-		taskSubDirs.sort();
-
-		for t in taskSubDirs:
-			# skip deprecated and scripts folders
-			if len(t.split("-")) == 1:
-				continue;
-
-			# skip 00000000-tokens
-			if t.startswith("00000000"):
-				continue;
-
-			currPath = os.path.join(taskDir, t, "artifact");
-			artifactNames = os.listdir(currPath);
-			for a in artifactNames:
-				contractName = a.split(".")[0];
-				if deprecated:
-					deprecatedContractDirectories[contractName] = t;
-				else:
-					contractDirectories[contractName] = t;
-		deprecated = False;
+	deploymentsDir = DeploymentRegistry.deploymentsDir;
 
 	decimals = {};
 
@@ -229,12 +263,28 @@ class balpy(object):
 			else:
 				endpoint = 'https://' + self.network + '.infura.io/v3/' + self.infuraApiKey;
 
-		self.endpoint = endpoint;
-		self.web3 = Web3(Web3.HTTPProvider(endpoint));
+		# BALPY_CUSTOM_RPC may list several endpoints separated by commas
+		endpoints = endpoint;
+		if isinstance(endpoints, str):
+			endpoints = [e.strip() for e in endpoints.split(",") if not e.strip() == ""];
+
+		self.endpoint = endpoints[0];
+		self.httpSession = getSession();
+		if len(endpoints) > 1:
+			provider = MultiEndpointProvider(endpoints, session=self.httpSession, hedgeDelaySec=self.rpcHedgeDelaySec);
+		else:
+			provider = Web3.HTTPProvider(self.endpoint, session=self.httpSession);
+		self.web3 = Web3(provider);
+		# concurrent single reads (receipts, transactions, blocks) are coalesced into JSON-RPC batches
+		self.rpcBatcher = RpcBatcher(self.web3, self.httpSession);
 
 		acct = self.web3.eth.account.privateKeyToAccount(self.privateKey);
 		self.web3.eth.default_account = acct.address;
 		self.address = acct.address;
+		self.nonceManager = NonceManager(self.web3, self.address);
+		self.receiptTracker = ReceiptTracker(self.web3);
+		self.feeOracle = FeeOracle(self.web3, cacheSec=self.blockTimeSec.get(self.network, self.defaultBlockTimeSec));
+		self.gasProfileCache = GasProfileCache();
 
 		# initialize gas block caches
 		self.currGasPriceSpeed = None;
@@ -249,7 +299,9 @@ class balpy(object):
 
 		if self.verbose:
 			print("Initialized account", self.web3.eth.default_account);
-			print("Connected to web3 at", endpoint);
+			print("Connected to web3 at", self.endpoint);
+			if len(endpoints) > 1:
+				print("\tand", len(endpoints) - 1, "more RPC endpoints");
 
 		usingCustomConfig = (not customConfigFile is None);
 		customConfig = None;
@@ -287,38 +339,36 @@ class balpy(object):
 				currNetworkParams["balFrontend"] = customConfig["networkParams"]["balFrontend"];
 			self.networkParams[self.network] = currNetworkParams;
 
+		# self.mc is kept for scripts that drive it directly. balpy methods never
+		# mutate it: they build a MulticallBatch per call (newMulticallBatch), so
+		# one instance can be shared by a pool of reader threads.
 		self.mc = multicaller.multicaller(	_chainId=self.networkParams[self.network]["id"],
 											_web3=self.web3,
 											_maxRetries=5,
 											_verbose=False,
 											_allowFailure=True);
+		self.multicallContract = self.mc.mcContract;
+		self.multicallChunkSize = AdaptiveChunkSize();
+		self.multicallExecutor = ThreadPoolExecutor(max_workers=self.multicallMaxWorkers);
+
+		# contract directories and addresses come from the prebuilt index;
+		# ABIs are only parsed when a contract is first loaded
+		self.registry = getRegistry();
+		self.contractDirectories = self.registry.contractDirectories;
+		self.deprecatedContractDirectories = self.registry.deprecatedContractDirectories;
+		self.abis = LazyAbiDict(self.registry);
 
 		#reset for the edge case in which we're iterating through multiple networks
 		self.deploymentAddresses = {};
 		missingContracts = [];
 		for contractType in self.contractDirectories.keys():
-			subdir = self.contractDirectories[contractType];
-
-			# get contract abi from deployments repo artifacts
-			abiPath = os.path.join(self.deploymentsDir, subdir , "artifact", contractType + '.json');
-			try:
-				f = pkgutil.get_data(__name__, abiPath).decode();
-				currAbi = json.loads(f)["abi"];
-				self.abis[contractType] = currAbi;
-			except BaseException as error:
-				self.ERROR('Error accessing file: {}'.format(abiPath))
-				self.ERROR('{}'.format(error))
-
 			# get deployment address for given network
 			try:
 				if usingCustomConfig:
-					currAddress = self.web3.toChecksumAddress(customConfig["contracts"][contractType]);
+					currAddress = customConfig["contracts"][contractType];
 				else:
-					deploymentPath = os.path.join(self.deploymentsDir, subdir, "output", self.network + '.json');
-					f = pkgutil.get_data(__name__, deploymentPath).decode();
-					currData = json.loads(f);
-					currAddress = self.web3.toChecksumAddress(currData[contractType]);
-				self.deploymentAddresses[contractType] = currAddress;
+					currAddress = self.registry.getAddress(contractType, self.network);
+				self.deploymentAddresses[contractType] = self.web3.toChecksumAddress(currAddress);
 			except BaseException as error:
 				missingContracts.append(contractType);
 
@@ -357,15 +407,16 @@ class balpy(object):
 	def buildTx(self, fn, gasFactor, gasSpeed="average", nonceOverride=-1, gasEstimateOverride=-1, gasPriceGweiOverride=-1):
 		chainIdNetwork = self.networkParams[self.network]["id"];
 
-		# Get nonce if not overridden
-		if nonceOverride > -1:
-			nonce = nonceOverride;
-		else:
-			nonce = self.web3.eth.get_transaction_count(self.web3.eth.default_account)
-
-		# Calculate gas estimate if not overridden
+		# Calculate gas estimate if not overridden, preferring gas used by earlier transactions of the same shape
+		gasProfileKey = self.gasProfileCache.getKey(fn);
+		cachedGas = None;
+		if self.useGasProfileCache:
+			cachedGas = self.gasProfileCache.getEstimate(gasProfileKey, gasFactor);
 		if gasEstimateOverride > -1:
 			gasEstimate = gasEstimateOverride;
+		elif not cachedGas is None:
+			# already padded by the larger of the cache padding and gasFactor
+			gasEstimate = cachedGas;
 		else:
 			try:
 				gasEstimate = int(fn.estimateGas() * gasFactor);
@@ -375,29 +426,72 @@ class balpy(object):
 				self.ERROR(descriptiveError);
 				return(None);
 
-		# Get gas price from Etherscan if not overridden
+		# EIP-1559 fees from the fee oracle unless a legacy gas price is forced or the chain has no base fee
+		fees = None;
 		if gasPriceGweiOverride > -1:
 			gasPriceGwei = gasPriceGweiOverride;
 		else:
-			gasPriceGwei = self.getGasPrice(gasSpeed);
+			if not self.isValidGasSpeed(gasSpeed):
+				return(None);
+			fees = self.feeOracle.getFees(gasSpeed);
+			if fees is None:
+				gasPriceGwei = self.getGasPrice(gasSpeed);
+
+		# Allocate nonce locally if not overridden (after everything that can fail)
+		if nonceOverride > -1:
+			nonce = nonceOverride;
+		else:
+			nonce = self.nonceManager.allocate();
 		
 		print("\tGas Estimate:\t", gasEstimate);
-		print("\tGas Price:\t", gasPriceGwei, "Gwei");
+		if fees is None:
+			print("\tGas Price:\t", gasPriceGwei, "Gwei");
+		else:
+			print("\tMax Fee:\t", self.web3.fromWei(fees["maxFeePerGas"], 'gwei'), "Gwei");
+			print("\tPriority Fee:\t", self.web3.fromWei(fees["maxPriorityFeePerGas"], 'gwei'), "Gwei");
 		print("\tNonce:\t\t", nonce);
 
 		# build transaction
-		data = fn.buildTransaction({'chainId': chainIdNetwork,
-								    'gas': gasEstimate,
-								    'gasPrice': self.web3.toWei(gasPriceGwei, 'gwei'),
-								    'nonce': nonce,
-									});
+		try:
+			if fees is None:
+				data = fn.buildTransaction({'chainId': chainIdNetwork,
+										    'gas': gasEstimate,
+										    'gasPrice': self.web3.toWei(gasPriceGwei, 'gwei'),
+										    'nonce': nonce,
+											});
+			else:
+				# built by hand: buildTransaction in web3 5.19 would add a legacy gasPrice
+				data = {'type': 2,
+						'chainId': chainIdNetwork,
+						'to': fn.address,
+						'value': 0,
+						'data': fn._encode_transaction_data(),
+						'gas': gasEstimate,
+						'maxFeePerGas': fees["maxFeePerGas"],
+						'maxPriorityFeePerGas': fees["maxPriorityFeePerGas"],
+						'nonce': nonce,
+						};
+		except BaseException as error:
+			self.nonceManager.release(nonce);
+			raise error;
+		self.gasProfileCache.expect(nonce, gasProfileKey);
 		return(data);
 
 	def sendTx(self, tx, isAsync=False):
 		if not self.omitCalldataFlag:
 			tx["data"] += self.calldataFlag;
 		signedTx = self.web3.eth.account.sign_transaction(tx, self.privateKey);
-		txHash = self.web3.eth.send_raw_transaction(signedTx.rawTransaction).hex();
+		try:
+			txHash = self.web3.eth.send_raw_transaction(signedTx.rawTransaction).hex();
+		except BaseException as error:
+			if self.nonceManager.shouldResync(error):
+				self.nonceManager.resync();
+			else:
+				self.nonceManager.release(tx["nonce"]);
+			raise error;
+		self.nonceManager.sent(tx["nonce"], txHash);
+		gasProfileKey = self.gasProfileCache.popExpected(tx["nonce"]);
+		self.receiptTracker.track(txHash, callback=lambda receipt: self.txMined(txHash, receipt, gasProfileKey));
 
 		print();
 		print("Sending transaction, view progress at:");
@@ -407,20 +501,27 @@ class balpy(object):
 			self.waitForTx(txHash);
 		return(txHash);
 
+	def txMined(self, txHash, receipt, gasProfileKey=None):
+		# receipt callback for every transaction sent by sendTx
+		self.nonceManager.mined(txHash);
+		if not gasProfileKey is None:
+			self.gasProfileCache.record(gasProfileKey, receipt);
+
 	def waitForTx(self, txHash, timeOutSec=120):
 		txSuccessful = True;
 		print();
 		print("Waiting for tx:", txHash);
 		try:
-			receipt = self.web3.eth.wait_for_transaction_receipt(txHash, timeout=timeOutSec);
+			receipt = self.receiptTracker.track(txHash, timeOutSec).result(timeout=timeOutSec);
 			if not receipt["status"] == 1:
 				txSuccessful = False;
 		except BaseException as error:
 			print('Transaction timeout: {}'.format(error))
+			self.nonceManager.checkPending();
 			return(False);
 
-		# Race condition: add a small delay to avoid getting the last nonce
-		time.sleep(0.5);
+		# nonces are allocated locally, so there is no need to wait for the node's count to catch up
+		self.nonceManager.mined(txHash);
 
 		print("\tTransaction accepted by network!");
 		if not txSuccessful:
@@ -430,10 +531,41 @@ class balpy(object):
 
 		return(True);
 
+	def waitForTxs(self, txHashes, timeOutSec=120):
+		# wait on all hashes at once; returns {txHash: True/False} like waitForTx
+		print();
+		print("Waiting for", len(txHashes), "txs");
+		futures = {};
+		for txHash in txHashes:
+			futures[txHash] = self.receiptTracker.track(txHash, timeOutSec);
+		wait(list(futures.values()), timeout=timeOutSec);
+
+		results = {};
+		timedOut = False;
+		for txHash in futures.keys():
+			future = futures[txHash];
+			if not future.done() or not future.exception() is None:
+				print("\tTransaction timeout:", txHash);
+				timedOut = True;
+				results[txHash] = False;
+			elif not future.result()["status"] == 1:
+				self.ERROR("Transaction failed! " + txHash);
+				results[txHash] = False;
+			else:
+				print("\tTransaction was successful:", txHash);
+				self.nonceManager.mined(txHash);
+				results[txHash] = True;
+		if timedOut:
+			self.nonceManager.checkPending();
+		print();
+		return(results);
+
 	def getTxReceipt(self, txHash, delay, maxRetries):
 		for i in range(maxRetries):
 			try: 
-				receipt = self.web3.eth.getTransactionReceipt(txHash);
+				receipt = self.rpcBatcher.request("eth_getTransactionReceipt", [txHash]);
+				if receipt is None:
+					raise TransactionNotFound("Transaction with hash: " + str(txHash) + " not found.");
 				print("Retrieved receipt!");
 				return(receipt);
 			except Exception as e:
@@ -606,21 +738,20 @@ class balpy(object):
 			self.ERROR("Array length mismatch with " + str(len(tokens)) + " tokens and " + str(len(targetAllowances)) + " targetAllowances.");
 			return(False);
 
-		nonce = self.web3.eth.get_transaction_count(self.web3.eth.default_account);
 		txHashes = [];
 		numElements = len(tokens);
 		for i in range(numElements):
 			token = tokens[i];
 			targetAllowance = targetAllowances[i];
 			amount = amounts[i];
-			txHash = self.erc20EnforceSufficientVaultAllowance(token, targetAllowance, amount, gasFactor, gasSpeed, nonceOverride=nonce, isAsync=True);
+			txHash = self.erc20EnforceSufficientVaultAllowance(token, targetAllowance, amount, gasFactor, gasSpeed, nonceOverride=nonceOverride, isAsync=True);
 			if not txHash is None:
 				txHashes.append(txHash);
-				nonce += 1;
-		
-		for txHash in txHashes:
-			self.waitForTx(txHash)
-		return(True)
+				if nonceOverride > -1:
+					nonceOverride += 1;
+
+		results = self.waitForTxs(txHashes);
+		return(all(results.values()));
 
 	# =====================
 	# ======Etherscan======
@@ -633,28 +764,43 @@ class balpy(object):
 		urlFront = "https://api" + separator + etherscanUrl;
 		return(urlFront);
 
-	def callEtherscan(self, url, maxRetries=3, verbose=False):
+	@cache
+	def getEtherscanStores(self):
+		# (rate limiter, response cache), created on first Etherscan call
+		dbPath = os.path.join(self.cacheDir, "etherscan.sqlite");
+		return(TokenBucket(dbPath, self.etherscanMaxRate), ResponseCache(dbPath));
+
+	def callEtherscan(self, url, maxRetries=3, verbose=False, cacheIf=None):
+		# with cacheIf, responses for which cacheIf(response) is True are stored and never requested again
 		urlFront = self.generateEtherscanApiUrl();
+		cacheKey = urlFront + url; # without the API key
 		url = urlFront + url + self.etherscanApiKey;
 		if verbose:
 			print("Calling:", url);
 
+		(rateLimiter, responseCache) = self.getEtherscanStores();
+		if not cacheIf is None:
+			data = responseCache.get(cacheKey);
+			if not data is None:
+				if verbose:
+					print("\t(cached)", data);
+				return(data);
+
 		count = 0;
 		while count < maxRetries:
 			try:
-				dt = (time.time() - self.lastEtherscanCallTime);
-				if dt < 1.0/self.etherscanMaxRate:
-					time.sleep((1.0/self.etherscanMaxRate - dt) * 1.1);
+				rateLimiter.acquire(urlFront);
 
 				# faking a user-agent resolves the 403 (forbidden) errors on api-kovan.etherscan.io
 				headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/56.0.2924.76 Safari/537.36', "Upgrade-Insecure-Requests": "1","DNT": "1","Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8","Accept-Language": "en-US,en;q=0.5","Accept-Encoding": "gzip, deflate"};
-				r = requests.get(url, headers=headers);
+				r = self.httpSession.get(url, headers=headers);
 				if verbose:
 					print("\t", r);
-				self.lastEtherscanCallTime = time.time();
 				data = r.json();
 				if verbose:
 					print("\t", data);
+				if not cacheIf is None and cacheIf(data):
+					responseCache.put(cacheKey, data);
 				return(data);
 			except Exception as e:
 				print("Exception:", e);
@@ -686,22 +832,44 @@ class balpy(object):
 		if internal:
 			internalString = "internal";
 
+		# transactions older than etherscanFinalityBlocks can't change: they're cached, only newer ones are requested
+		(rateLimiter, responseCache) = self.getEtherscanStores();
+		cacheKey = self.generateEtherscanApiUrl() + "/txlist{}/{}/{}".format(internalString, address.lower(), startblock);
+		cached = responseCache.get(cacheKey);
+		cachedTxns = [];
+		queryStart = startblock;
+		if not cached is None:
+			cachedTxns = cached["result"];
+			queryStart = cached["finalizedBlock"] + 1;
+		finalizedBlock = self.web3.eth.block_number - self.etherscanFinalityBlocks;
+
 		url = [];
 		url.append("/api?module=account&action=txlist{}&address=".format(internalString));
 		url.append(address);
-		url.append("&startblock={}&endblock=99999999&sort=asc&apikey=".format(startblock));
+		url.append("&startblock={}&endblock=99999999&sort=asc&apikey=".format(queryStart));
 		urlString = "".join(url);
 		txns = self.callEtherscan(urlString, verbose=verbose);
 
-		if int(txns["status"]) == 0:
+		if int(txns["status"]) == 1:
+			newTxns = txns["result"];
+		elif txns["message"] == "No transactions found" and len(cachedTxns) > 0:
+			newTxns = [];
+		else:
 			self.ERROR("Etherscan query failed. Please try again.");
 			return(False);
-		elif int(txns["status"]) == 1:
-			return(txns["result"]);
+
+		# a full page may be truncated: only blocks before its last one are known to be complete
+		if len(newTxns) >= self.etherscanMaxResults:
+			finalizedBlock = min(finalizedBlock, int(newTxns[-1]["blockNumber"]) - 1);
+		result = cachedTxns + newTxns;
+		if finalizedBlock >= queryStart:
+			responseCache.put(cacheKey, {"finalizedBlock":finalizedBlock, "result":[t for t in result if int(t["blockNumber"]) <= finalizedBlock]});
+		return(result);
 
 	def getTransactionByHash(self, txHash, verbose=False):
 		urlString = "/api?module=proxy&action=eth_getTransactionByHash&txhash={}&apikey=".format(txHash);
-		txns = self.callEtherscan(urlString, verbose=verbose);
+		# mined transactions never change
+		txns = self.callEtherscan(urlString, verbose=verbose, cacheIf=lambda r: isinstance(r.get("result"), dict) and not r["result"].get("blockNumber") is None);
 
 		if verbose:
 			print(txns)
@@ -713,7 +881,8 @@ class balpy(object):
 	def isContractVerified(self, poolId, verbose=False):
 		address = self.balPooldIdToAddress(poolId);
 		url = "/api?module=contract&action=getabi&address={}&apikey=".format(address);
-		results = self.callEtherscan(url, verbose=verbose);
+		# a verified contract stays verified; unverified ones are checked again next time
+		results = self.callEtherscan(url, verbose=verbose, cacheIf=lambda r: str(r.get("status")) == "1");
 		if verbose:
 			print(results);
 		isUnverified = (results["result"] == "Contract source code not verified");
@@ -736,18 +905,23 @@ class balpy(object):
 				print("\t" + s);
 			return(False);
 
-		r = requests.get("https://gasstation-mainnet.matic.network/")
+		r = self.httpSession.get("https://gasstation-mainnet.matic.network/")
 		prices = r.json();
 		return(prices[speed]);
 
-	def getGasPrice(self, speed):
+	def isValidGasSpeed(self, speed):
 		allowedSpeeds = list(self.speedDict.keys());
 		if speed not in allowedSpeeds:
-			self.ERROR("Speed entered is:" + speed);
+			self.ERROR("Speed entered is:" + str(speed));
 			self.ERROR("Speed must be one of the following options:");
 			for s in allowedSpeeds:
 				print("\t" + s);
 			return(False);
+		return(True);
+
+	def getGasPrice(self, speed):
+		if not self.isValidGasSpeed(speed):
+			return(False);
 
 		if not speed == self.currGasPriceSpeed:
 			self.currGasPriceSpeed = speed;
@@ -1047,17 +1221,17 @@ class balpy(object):
 		contractNames = self.deploymentAddresses.keys();
 		factoryNames = [c for c in contractNames if ("Factory" in c) and ("Pool" in c)]; #can't simply use "PoolFactory" b/c of WeightedPool2TokensFactory
 
-		self.mc.reset();
+		mc = self.newMulticallBatch();
 		for factoryName in factoryNames:
 			factory = self.balLoadContract(factoryName);
 			poolAddress = self.balPooldIdToAddress(poolId);
-			self.mc.addCall(factory.address, factory.abi, "isPoolFromFactory", args=[poolAddress]);
-		data = self.mc.execute();
+			mc.addCall(factory.address, factory.abi, "isPoolFromFactory", args=[poolAddress]);
+		data = mc.execute();
 
 		foundFactoryName = [];
 		numFound = 0;
 		for f,d in zip(factoryNames, data[0]):
-			if d[0]:
+			if not d is None and d[0]:
 				foundFactoryName.append(f);
 				numFound += 1;
 
@@ -1410,15 +1584,22 @@ class balpy(object):
 			return self.balFormatQueryExitPoolOutput(queryOutput, tokensSorted, poolAddress)
 		return self.balDoExitPool(poolId, userAddress, exitPoolRequestTuple, gasFactor=gasFactor, gasPriceSpeed=gasPriceSpeed, nonceOverride=nonceOverride, gasEstimateOverride=gasEstimateOverride, gasPriceGweiOverride=gasPriceGweiOverride)
 
-	def balGetRebalanceLinearPoolsData(self, linearPoolAddresses):
+	def balGetRebalanceLinearPoolsData(self, linearPoolAddresses, block_identifier=None):
+		# with a block_identifier, every read is pinned to that block and (output, blockNumber) is returned
+		blockNumber = None;
+		if not block_identifier is None:
+			blockNumber = self.newMulticallBatch().resolveBlock(block_identifier);
+		readBlock = "latest" if blockNumber is None else blockNumber;
+
 		# Can realistically be any linear pool, this one just is the most generic.
 		poolAbi = self.balPoolGetAbi("ERC4626LinearPool");
 
 		# get poolIds and mainTokens to feed into getPoolTokenInfo (to get asset managers)
+		mc = self.newMulticallBatch();
 		for i in linearPoolAddresses:
-			self.mc.addCall(i, poolAbi, 'getPoolId');
-			self.mc.addCall(i, poolAbi, 'getMainToken');
-		output = self.mc.execute();
+			mc.addCall(i, poolAbi, 'getPoolId');
+			mc.addCall(i, poolAbi, 'getMainToken');
+		output = mc.execute(readBlock);
 
 		pool_id_by_pool_address = {};
 		main_tokens_by_pool_id = {};
@@ -1436,10 +1617,11 @@ class balpy(object):
 		# determine each linear pool's asset manager (the rebalancer)
 		vault = self.balLoadContract("Vault");
 		assetManagers = [];
+		mc = self.newMulticallBatch();
 		for poolId in main_tokens_by_pool_id:
 			mainToken = main_tokens_by_pool_id[poolId];
-			self.mc.addCall(vault.address, vault.abi, 'getPoolTokenInfo', args=[poolId, mainToken]);
-		output = self.mc.execute();
+			mc.addCall(vault.address, vault.abi, 'getPoolTokenInfo', args=[poolId, mainToken]);
+		output = mc.execute(readBlock);
 		data = output[0]
 		successes = output[1]
 
@@ -1447,28 +1629,47 @@ class balpy(object):
 		for d, a in zip(data, linearPoolAddresses):
 				pools_by_rebalancer[self.web3.toChecksumAddress(d[3])] = a;
 
+		mc = self.newMulticallBatch();
 		for rebalancer in pools_by_rebalancer:
 			pool_address = pools_by_rebalancer[rebalancer];
 
 			linearPoolRebalancer = self.balLoadContractAtAddress("ERC4626LinearPoolRebalancer", rebalancer);
-			self.mc.addCall(linearPoolRebalancer.address, linearPoolRebalancer.abi, 'rebalance', args=[self.ZERO_ADDRESS]);
+			mc.addCall(linearPoolRebalancer.address, linearPoolRebalancer.abi, 'rebalance', args=[self.ZERO_ADDRESS]);
 
-		mc_output = self.mc.execute();
+		mc_output = mc.execute(readBlock);
 		results = mc_output[0];
 		successes = mc_output[1];
 		output = {};
+		rebalanceFns = {};
 		for result, success, rebalancer in zip(results, successes, list(pools_by_rebalancer.keys())):
 			if success and not result is None and result[0] > 0:
 				amount = result[0];
 				token = main_tokens_by_pool_id[pool_id_by_pool_address[pools_by_rebalancer[rebalancer]]];
 				linearPoolRebalancer = self.balLoadContractAtAddress("ERC4626LinearPoolRebalancer", rebalancer);
+				rebalanceFns[rebalancer] = linearPoolRebalancer.functions.rebalance(self.address);
 
 				output[rebalancer] = {
 					"token_out":token,
 					"amount_out":float(self.erc20ScaleDecimalsStandard(token, amount)),
-					"gas_estimate":linearPoolRebalancer.functions.rebalance(self.address).estimateGas()
+					"gas_estimate":None
 				}
-		return(output);
+
+		# learned estimates first; the remaining rebalancers are simulated concurrently
+		toEstimate = [];
+		for rebalancer in rebalanceFns.keys():
+			cachedGas = None;
+			if self.useGasProfileCache:
+				cachedGas = self.gasProfileCache.getEstimate(self.gasProfileCache.getKey(rebalanceFns[rebalancer]));
+			if cachedGas is None:
+				toEstimate.append(rebalancer);
+			else:
+				output[rebalancer]["gas_estimate"] = cachedGas;
+		estimates = self.multicallExecutor.map(lambda rebalancer: rebalanceFns[rebalancer].estimateGas(block_identifier=readBlock), toEstimate);
+		for rebalancer, gasEstimate in zip(toEstimate, estimates):
+			output[rebalancer]["gas_estimate"] = gasEstimate;
+		if blockNumber is None:
+			return(output);
+		return(output, blockNumber);
 
 	def balDoRebalanceLinearPool(self, pool_address, recipient=None, isAsync=False, gasFactor=1.05, gasPriceSpeed="average", nonceOverride=-1, gasEstimateOverride=-1, gasPriceGweiOverride=-1):
 		linear_pool = self.balLoadContractAtAddress("ERC4626LinearPool", self.web3.toChecksumAddress(pool_address));
@@ -1595,6 +1796,26 @@ class balpy(object):
 		manageUserBalanceFn = vault.functions.manageUserBalance(inputTupleList);
 		return(manageUserBalanceFn);
 
+	def close(self):
+		# stops the worker threads owned by this instance; it can't run batches afterwards
+		self.multicallExecutor.shutdown(wait=False);
+		if hasattr(self.web3.provider, "close"):
+			self.web3.provider.close();
+
+	def newMulticallBatch(self):
+		# batch-scoped multicall: each caller (and thread) gets its own call list
+		#	mc = bal.newMulticallBatch();
+		#	mc.addCall(address, abi, "functionName", args=[...]);
+		#	(outputData, successes, blockNumber) = mc.execute();
+		return(MulticallBatch(self.web3, self.multicallContract, chunkSize=self.multicallChunkSize, executor=self.multicallExecutor));
+
+	def newRpcBatch(self):
+		# explicit JSON-RPC batch for reads multicall can't make
+		#	batch = bal.newRpcBatch();
+		#	batch.add("eth_getTransactionByHash", [txHash]);
+		#	(results, successes) = batch.execute();
+		return(RpcBatch(self.web3, self.httpSession));
+
 	@cache
 	def balLoadContract(self, contractName):
 		contract = self.web3.eth.contract(address=self.deploymentAddresses[contractName], abi=self.abis[contractName]);
@@ -1619,23 +1840,7 @@ class balpy(object):
 		if not "Pool" in poolType:
 			poolType = poolType + "Pool"
 
-		deploymentFolder = None;
-		deprecatedString = ""
-		try:
-			deploymentFolder = self.contractDirectories[poolType + "Factory"];
-		except KeyError:
-			try:
-				deploymentFolder = self.deprecatedContractDirectories[poolType + "Factory"];
-				deprecatedString = "deprecated"
-			except KeyError:
-				return None;
-		except Exception as e:
-			print(e);
-			quit();
-
-		abiPath = os.path.join(self.deploymentsDir, deprecatedString, deploymentFolder, "artifact", poolType + ".json");
-		f = pkgutil.get_data(__name__, abiPath).decode();
-		poolAbi = json.loads(f)["abi"];
+		poolAbi = self.registry.getPoolAbi(poolType);
 		return(poolAbi);
 
 	@cache
@@ -1672,7 +1877,7 @@ class balpy(object):
 				print(txn);
 			poolFactoryType = poolTypeByContract[txn["to"].lower()];
 			txHash = txn["hash"];
-			stamp = self.web3.eth.get_block(int(txn["blockNumber"],16))["timestamp"];
+			stamp = self.rpcBatcher.request("eth_getBlockByNumber", [int(txn["blockNumber"],16), False])["timestamp"];
 
 		return(address, poolFactoryType, txHash, stamp);
 
@@ -1681,9 +1886,19 @@ class balpy(object):
 		return(txns[0]["timeStamp"]);
 
 	def getInputData(self, txHash):
-		transaction = self.web3.eth.get_transaction(txHash);
+		transaction = self.rpcBatcher.request("eth_getTransactionByHash", [txHash]);
+		if transaction is None:
+			raise TransactionNotFound("Transaction with hash: " + str(txHash) + " not found.");
 		return(transaction.input)
 
+	def getInputDatas(self, txHashes):
+		# input data of many transactions in one batch; None for unknown hashes
+		batch = self.newRpcBatch();
+		for txHash in txHashes:
+			batch.add("eth_getTransactionByHash", [txHash]);
+		(transactions, successes) = batch.execute();
+		return([None if t is None else t.input for t in transactions]);
+
 	def balGeneratePoolCreationArguments(self, poolId, verbose=False, creationHash=None):
 		if self.network in ["arbitrum"]:
 			self.ERROR("Automated pool verification doesn't work on " + self.network + " yet. Please try the method outlined in the docs using Tenderly.");
@@ -2017,17 +2232,19 @@ class balpy(object):
 														deadline);
 		return(batchSwapFunction);
 
-	def balQueryBatchSwaps(self, originalSwapsDescription):
+	def balQueryBatchSwaps(self, originalSwapsDescription, block_identifier=None):
+		# with a block_identifier, (outputs, successes, blockNumber) is returned
 		swapsDescription = copy.deepcopy(originalSwapsDescription);
 		vault = self.balLoadContract("Vault");
+		mc = self.newMulticallBatch();
 		for swapDescription in swapsDescription:
 
 			# do deep copy to avoid modifying the swapDescription in place, breaking index remappings
 			deepCopySwapDescription = copy.deepcopy(swapDescription);
 			(kind, swapsTuples, assets, funds, intReorderedLimits, deadline) = self.balFormatBatchSwapData(deepCopySwapDescription);
 			args = [kind, swapsTuples, assets, funds];
-			self.mc.addCall(vault.address, vault.abi, "queryBatchSwap", args=args);
-		data = self.mc.execute();
+			mc.addCall(vault.address, vault.abi, "queryBatchSwap", args=args);
+		data = mc.execute("latest" if block_identifier is None else block_identifier);
 
 		outputs = [];
 		for swapDescription, outputData, successfulCall in zip(swapsDescription, data[0], data[1]):
@@ -2046,7 +2263,9 @@ class balpy(object):
 					output[asset] = None;
 				outputs.append(output);
 
-		return(outputs, data[1]);
+		if block_identifier is None:
+			return(outputs, data[1]);
+		return(outputs, data[1], data[2]);
 
 	def balQueryBatchSwap(self, originalSwapDescription):
 		swapDescription = copy.deepcopy(originalSwapDescription);
@@ -2100,7 +2319,7 @@ class balpy(object):
 		# API gets grumpy when you send it numbers. Send everything as a string
 		for field in query:
 			query[field] = str(query[field])
-		response = requests.post(
+		response = self.httpSession.post(
 			self.balGetApiEndpointSor(),
 			headers={'Content-Type': 'application/json'},
 			data=json.dumps(query)
@@ -2118,7 +2337,7 @@ class balpy(object):
 		retries = 0
 		delay = 3
 		while not success or retries > maxRetries:
-			response = requests.get(
+			response = self.httpSession.get(
 				url,
 				headers={'Content-Type': 'application/json'}
 			);
@@ -2133,7 +2352,7 @@ class balpy(object):
 
 	def balApiGetPool(self, poolId):
 		url = self.balGetApiEndpointPools(poolId)
-		response = requests.get(
+		response = self.httpSession.get(
 			url,
 			headers={'Content-Type': 'application/json'}
 		);
@@ -2184,27 +2403,28 @@ class balpy(object):
 
 		return(query)
 
-	def multiCallErc20BatchDecimals(self, tokens):
-		self.mc.reset();
-		payload = [];
+	def multiCallErc20BatchDecimals(self, tokens, block_identifier=None):
+		# with a block_identifier, (tokensToDecimals, blockNumber) is returned
+		mc = self.newMulticallBatch();
 		for token in tokens:
 			currTokenContract = self.erc20GetContract(token);
-			self.mc.addCall(currTokenContract.address, currTokenContract.abi, 'decimals');
+			mc.addCall(currTokenContract.address, currTokenContract.abi, 'decimals');
 
 		# make the actual call to MultiCall
-		outputData = self.mc.execute();
-		outputData = outputData[0];
+		(outputData, successes, blockNumber) = mc.execute("latest" if block_identifier is None else block_identifier);
 		tokensToDecimals = {};
 
 		for token, odBytes in zip(tokens, outputData):
 			decimals = odBytes[0];
 			tokensToDecimals[token] = decimals;
 			self.decimals[token] = decimals;
-		return(tokensToDecimals);
+		if block_identifier is None:
+			return(tokensToDecimals);
+		return(tokensToDecimals, blockNumber);
 
-	def getOnchainData(self, pools):
-		# reset multicaller
-		self.mc.reset();
+	def getOnchainData(self, pools, block_identifier=None):
+		# with a block_identifier, every pool is read at that block and (chainData, blockNumber) is returned
+		mc = self.newMulticallBatch();
 
 		# load the vault contract
 		vault = self.balLoadContract("Vault");
@@ -2234,31 +2454,36 @@ class balpy(object):
 				currPool = self.balLoadArbitraryContract(poolAddress, self.mc.listToString(poolAbi))
 
 				# === all pools have tokens and swap fee, pausedState ===
-				self.mc.addCall(vault.address, vault.abi, 'getPoolTokens', args=[poolId]);
-				self.mc.addCall(currPool.address, currPool.abi, 'getSwapFeePercentage');
-				self.mc.addCall(currPool.address, currPool.abi, 'getPausedState');
+				mc.addCall(vault.address, vault.abi, 'getPoolTokens', args=[poolId]);
+				mc.addCall(currPool.address, currPool.abi, 'getSwapFeePercentage');
+				mc.addCall(currPool.address, currPool.abi, 'getPausedState');
 				pidAndFns.append((poolId, "getPoolTokens"));
 				pidAndFns.append((poolId, "getSwapFeePercentage"));
 				pidAndFns.append((poolId, "getPausedState"));
 
 				# === using weighted math ===
 				if poolType in ["Weighted", "LiquidityBootstrapping", "Investment", "Managed"]:
-					self.mc.addCall(currPool.address, currPool.abi, 'getNormalizedWeights');
+					mc.addCall(currPool.address, currPool.abi, 'getNormalizedWeights');
 					pidAndFns.append((poolId, "getNormalizedWeights"));
 
 				# === using stable math ===
 				if poolType in ["Stable", "MetaStable"]:
-					self.mc.addCall(currPool.address, currPool.abi, 'getAmplificationParameter');
+					mc.addCall(currPool.address, currPool.abi, 'getAmplificationParameter');
 					pidAndFns.append((poolId, "getAmplificationParameter"));
 
 				# === have pausable swaps by pool owner ===
 				if poolType in [ "LiquidityBootstrapping", "Investment"]:
-					self.mc.addCall(currPool.address, currPool.abi, 'getSwapEnabled');
+					mc.addCall(currPool.address, currPool.abi, 'getSwapEnabled');
 					pidAndFns.append((poolId, "getSwapEnabled"));
 
-		data = self.mc.execute();
-		data = data[0];
+		(data, successes, blockNumber) = mc.execute("latest" if block_identifier is None else block_identifier);
+		chainDataOut = self.decodeOnchainData(data, pidAndFns, poolToType);
+		if block_identifier is None:
+			return(chainDataOut);
+		return(chainDataOut, blockNumber);
 
+	def decodeOnchainData(self, data, pidAndFns, poolToType):
+		# data is the decoded multicall output, one entry per (poolId, function) in pidAndFns
 		chainDataOut = {};
 		chainDataBookkeeping = {};
 
@@ -2297,6 +2522,7 @@ class balpy(object):
 				rawAmp  = Decimal(decodedOutputData[0]);
 				scaling = Decimal(decodedOutputData[2]);
 				chainDataOut[poolId]["amp"] = str(rawAmp/scaling);
+				chainDataOut[poolId]["ampIsUpdating"] = decodedOutputData[1];
 
 			elif decoder == "getSwapEnabled":
 				chainDataOut[poolId]["swapEnabled"] = decodedOutputData[0];
@@ -2328,6 +2554,104 @@ class balpy(object):
 
 		return(chainDataOut);
 
+	def getOnchainDataChangedPools(self, poolIds, fromBlock, toBlock):
+		# pools touched by Vault balance events or by pool parameter events in [fromBlock, toBlock]
+		# parameter events come from the pools themselves, so they're filtered by pool address, in chunks
+		vault = self.balLoadContract("Vault");
+		addressToPoolId = {};
+		for poolId in poolIds:
+			addressToPoolId[self.balPooldIdToAddress(poolId)] = poolId;
+		poolAddresses = sorted(addressToPoolId.keys());
+
+		batch = self.newRpcBatch();
+		vaultLogs = batch.add("eth_getLogs", [{	"fromBlock":fromBlock,
+									"toBlock":toBlock,
+									"address":vault.address,
+									"topics":[self.onchainDataVaultTopics]}]);
+		poolLogs = [];
+		for start in range(0, len(poolAddresses), self.onchainDataLogAddressChunkSize):
+			poolLogs.append(batch.add("eth_getLogs", [{	"fromBlock":fromBlock,
+										"toBlock":toBlock,
+										"address":poolAddresses[start:start + self.onchainDataLogAddressChunkSize],
+										"topics":[self.onchainDataPoolTopics]}]));
+		batch.execute();
+		# errors are raised here, like get_logs would
+		vaultLogs = vaultLogs.result();
+		poolLogs = [log for chunk in poolLogs for log in chunk.result()];
+
+		changedPoolIds = set();
+		for log in vaultLogs:
+			changedPoolIds.add("0x" + bytes(log["topics"][1]).hex());
+
+		for log in poolLogs:
+			address = self.web3.toChecksumAddress(log["address"]);
+			if address in addressToPoolId.keys():
+				changedPoolIds.add(addressToPoolId[address]);
+
+		lowerToPoolId = {};
+		for poolId in poolIds:
+			lowerToPoolId[poolId.lower()] = poolId;
+		return(set([lowerToPoolId[p] for p in changedPoolIds if p in lowerToPoolId.keys()]));
+
+	def getOnchainDataIncremental(self, pools, snapshot=None, block_identifier="latest"):
+		# snapshot is the output of a previous call: {"blockNumber":n, "pools":chainData, "updatedPools":[...]}
+		# Only pools with events since the snapshot, new pools and pools whose parameters
+		# move with time (amp ramps, gradual weight updates) are refetched.
+		blockNumber = self.newMulticallBatch().resolveBlock(block_identifier);
+
+		fullRefresh = snapshot is None or blockNumber - snapshot["blockNumber"] > self.onchainDataMaxLogBlockRange;
+
+		poolToType = {};
+		for poolType in pools.keys():
+			for poolId in pools[poolType]:
+				poolToType[poolId] = poolType;
+
+		if fullRefresh:
+			stale = set(poolToType.keys());
+		elif blockNumber <= snapshot["blockNumber"]:
+			# no new blocks: only pools added since the snapshot are read, at the snapshot's block
+			blockNumber = snapshot["blockNumber"];
+			stale = set([poolId for poolId in poolToType.keys() if not poolId in snapshot["pools"].keys()]);
+			if len(stale) == 0:
+				return(snapshot);
+		else:
+			previous = snapshot["pools"];
+			stale = self.getOnchainDataChangedPools(list(poolToType.keys()), snapshot["blockNumber"] + 1, blockNumber);
+			for poolId in poolToType.keys():
+				if not poolId in previous.keys():
+					stale.add(poolId);
+				elif poolToType[poolId] in self.onchainDataGradualWeightPoolTypes:
+					stale.add(poolId);
+				elif previous[poolId].get("ampIsUpdating", False):
+					stale.add(poolId);
+
+		stalePools = {};
+		for poolId in stale:
+			poolType = poolToType[poolId];
+			if not poolType in stalePools.keys():
+				stalePools[poolType] = [];
+			stalePools[poolType].append(poolId);
+
+		chainData = {};
+		if not fullRefresh:
+			for poolId in poolToType.keys():
+				if poolId in snapshot["pools"].keys() and not poolId in stale:
+					chainData[poolId] = snapshot["pools"][poolId];
+
+		if len(stalePools) > 0:
+			(refreshed, blockNumber) = self.getOnchainData(stalePools, block_identifier=blockNumber);
+			chainData.update(refreshed);
+
+		return({"blockNumber":blockNumber, "pools":chainData, "updatedPools":sorted(stale)});
+
+	def balGetVaultIndexer(self, dbPath=None, startBlock=None):
+		# call sync() on the result to index (or catch up on) Vault events
+		if dbPath is None:
+			dbPath = os.path.join(self.cacheDir, self.network + "-vault-events.sqlite");
+		if startBlock is None:
+			startBlock = self.vaultDeploymentBlock.get(self.network, 0);
+		return(VaultIndexer(self.web3, self.balLoadContract("Vault"), dbPath, startBlock=startBlock));
+
 	def generateDeploymentsDocsTable(self):
 		outputString = "";
 		contracts = [];
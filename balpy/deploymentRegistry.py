@@ -0,0 +1,264 @@
+# deploymentRegistry.py
+
+# python basics
+import json
+import os
+import pkgutil
+import threading
+
+class DeploymentRegistry(object):
+
+	"""
+	Index of the contracts shipped in the balancer-deployments submodule.
+		Maps every contract name to the task directory it lives in and to its
+		deployed address on each network. The index is built once by scanning
+		balancer-deployments/tasks (and tasks/deprecated), then persisted as a
+		single json file shipped with the package, so importing and initializing
+		balpy never has to walk the deployments tree again.
+
+		The index is stamped with the balancer-deployments commit it was built
+		from. Installed packages carry no submodule checkout, so the shipped
+		index is trusted as is; in a git checkout whose submodule has moved to
+		another commit, the index is rebuilt instead of serving stale addresses.
+
+		ABIs are not part of the index. They are parsed from their artifacts on
+		first use and cached for the lifetime of the process.
+	"""
+
+	INDEX_VERSION = 2;
+	indexFileName = "deploymentsIndex.json";
+	deploymentsDir = "balancer-deployments/tasks";
+	deprecatedString = "deprecated";
+
+	def __init__(self, index=None):
+		super(DeploymentRegistry, self).__init__();
+
+		if index is None:
+			index = self.loadIndex();
+		if index is None:
+			index = self.buildIndex();
+			self.tryWriteIndex(index);
+
+		self.contractDirectories = index["contractDirectories"];
+		self.deprecatedContractDirectories = index["deprecatedContractDirectories"];
+		self.addresses = index["addresses"];
+
+		self.abiCache = {};
+		self.abiLock = threading.Lock();
+
+	@classmethod
+	def getPackagePath(cls):
+		return(os.path.dirname(os.path.abspath(__file__)));
+
+	@classmethod
+	def getIndexPath(cls):
+		return(os.path.join(cls.getPackagePath(), cls.indexFileName));
+
+	@classmethod
+	def loadIndex(cls):
+		try:
+			with open(cls.getIndexPath(), 'r') as f:
+				index = json.load(f);
+		except (OSError, ValueError):
+			return(None);
+
+		if not index.get("version") == cls.INDEX_VERSION:
+			return(None);
+
+		# installed packages have no submodule checkout: the shipped index is the source of truth
+		sourceStamp = cls.getSourceStamp();
+		if not sourceStamp is None and not index.get("sourceStamp") == sourceStamp:
+			return(None);
+		return(index);
+
+	@classmethod
+	def getSubmoduleCommit(cls):
+		# HEAD of the balancer-deployments checkout, or None outside a git checkout
+		submodulePath = os.path.join(cls.getPackagePath(), os.path.dirname(cls.deploymentsDir));
+		gitPath = os.path.join(submodulePath, ".git");
+		try:
+			if os.path.isfile(gitPath):
+				with open(gitPath, 'r') as f:
+					gitPath = os.path.join(submodulePath, f.read().strip()[len("gitdir:"):].strip());
+			with open(os.path.join(gitPath, "HEAD"), 'r') as f:
+				head = f.read().strip();
+			if not head.startswith("ref:"):
+				return(head);
+			ref = head[len("ref:"):].strip();
+			refPath = os.path.join(gitPath, ref);
+			if os.path.isfile(refPath):
+				with open(refPath, 'r') as f:
+					return(f.read().strip());
+			with open(os.path.join(gitPath, "packed-refs"), 'r') as f:
+				for line in f:
+					if line.strip().endswith(" " + ref):
+						return(line.split(" ")[0]);
+		except OSError:
+			pass;
+		return(None);
+
+	@classmethod
+	def getSourceStamp(cls):
+		# commit the index was built from; None outside a git checkout
+		return(cls.getSubmoduleCommit());
+
+	@classmethod
+	def buildIndex(cls):
+		packagePath = cls.getPackagePath();
+
+		contractDirectories = {};
+		deprecatedContractDirectories = {};
+		addresses = {};
+
+		for deprecated in [True, False]:
+			taskDir = os.path.join(packagePath, cls.deploymentsDir);
+			if deprecated:
+				taskDir = os.path.join(taskDir, cls.deprecatedString);
+			if not os.path.isdir(taskDir):
+				continue;
+
+			taskSubDirs = os.listdir(taskDir);
+			taskSubDirs.sort();
+
+			for t in taskSubDirs:
+				# skip deprecated and scripts folders
+				if len(t.split("-")) == 1:
+					continue;
+
+				# skip 00000000-tokens
+				if t.startswith("00000000"):
+					continue;
+
+				currPath = os.path.join(taskDir, t, "artifact");
+				if not os.path.isdir(currPath):
+					continue;
+
+				for a in os.listdir(currPath):
+					contractName = a.split(".")[0];
+					if deprecated:
+						deprecatedContractDirectories[contractName] = t;
+					else:
+						contractDirectories[contractName] = t;
+
+		# deployment addresses are only tracked for active (non-deprecated) tasks
+		for contractName, t in contractDirectories.items():
+			outputPath = os.path.join(packagePath, cls.deploymentsDir, t, "output");
+			if not os.path.isdir(outputPath):
+				continue;
+			networkAddresses = {};
+			for outputFile in sorted(os.listdir(outputPath)):
+				if not outputFile.endswith(".json"):
+					continue;
+				network = outputFile[:-len(".json")];
+				with open(os.path.join(outputPath, outputFile), 'r') as f:
+					outputData = json.load(f);
+				if contractName in outputData.keys():
+					networkAddresses[network] = outputData[contractName];
+			addresses[contractName] = networkAddresses;
+
+		index = {
+			"version":							cls.INDEX_VERSION,
+			"sourceStamp":						cls.getSourceStamp(),
+			"contractDirectories":				contractDirectories,
+			"deprecatedContractDirectories":	deprecatedContractDirectories,
+			"addresses":						addresses
+		};
+		return(index);
+
+	@classmethod
+	def writeIndex(cls, index=None, path=None):
+		if index is None:
+			index = cls.buildIndex();
+		if path is None:
+			path = cls.getIndexPath();
+		with open(path, 'w') as f:
+			json.dump(index, f, separators=(",", ":"), sort_keys=True);
+		return(path);
+
+	@classmethod
+	def tryWriteIndex(cls, index):
+		# refresh a stale or missing index in a source checkout so later imports load it again
+		if index["sourceStamp"] is None:
+			return;
+		try:
+			cls.writeIndex(index);
+		except OSError:
+			pass;
+
+	def getAddress(self, contractName, network):
+		return(self.addresses.get(contractName, {}).get(network));
+
+	def getAddresses(self, network):
+		networkAddresses = {};
+		for contractName in self.contractDirectories.keys():
+			address = self.getAddress(contractName, network);
+			if not address is None:
+				networkAddresses[contractName] = address;
+		return(networkAddresses);
+
+	def getArtifactAbi(self, taskDir, contractName, deprecated=False):
+		key = (taskDir, contractName, deprecated);
+		if key in self.abiCache:
+			return(self.abiCache[key]);
+
+		with self.abiLock:
+			if key in self.abiCache:
+				return(self.abiCache[key]);
+			deploymentsDir = self.deploymentsDir;
+			if deprecated:
+				deploymentsDir = os.path.join(deploymentsDir, self.deprecatedString);
+			abiPath = os.path.join(deploymentsDir, taskDir, "artifact", contractName + ".json");
+			f = pkgutil.get_data(__name__, abiPath).decode();
+			abi = json.loads(f)["abi"];
+			self.abiCache[key] = abi;
+		return(abi);
+
+	def getAbi(self, contractName):
+		if contractName in self.contractDirectories.keys():
+			return(self.getArtifactAbi(self.contractDirectories[contractName], contractName));
+		if contractName in self.deprecatedContractDirectories.keys():
+			return(self.getArtifactAbi(self.deprecatedContractDirectories[contractName], contractName, deprecated=True));
+		raise KeyError(contractName);
+
+	def getPoolAbi(self, poolType):
+		# pool artifacts live next to the artifact of the factory that deploys them
+		factoryName = poolType + "Factory";
+		if factoryName in self.contractDirectories.keys():
+			return(self.getArtifactAbi(self.contractDirectories[factoryName], poolType));
+		if factoryName in self.deprecatedContractDirectories.keys():
+			return(self.getArtifactAbi(self.deprecatedContractDirectories[factoryName], poolType, deprecated=True));
+		return(None);
+
+class LazyAbiDict(dict):
+
+	"""
+	dict of contract name -> ABI that parses artifacts on first access
+	"""
+
+	def __init__(self, registry):
+		super(LazyAbiDict, self).__init__();
+		self.registry = registry;
+
+	def __missing__(self, contractName):
+		abi = self.registry.getAbi(contractName);
+		self[contractName] = abi;
+		return(abi);
+
+registry = None;
+registryLock = threading.Lock();
+
+def getRegistry():
+	# one registry per process, shared by every balpy instance
+	global registry;
+	if registry is None:
+		with registryLock:
+			if registry is None:
+				registry = DeploymentRegistry();
+	return(registry);
+
+def main():
+	path = DeploymentRegistry.writeIndex();
+	print("Wrote deployments index to", path);
+
+if __name__ == '__main__':
+	main();
@@ -0,0 +1,97 @@
+# etherscanStore.py
+
+# python basics
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class SqliteStore(object):
+
+	"""
+	SQLite file shared by threads and processes: every write runs in an
+	IMMEDIATE transaction, so concurrent writers queue on the file lock.
+	"""
+
+	SCHEMA = [];
+
+	def __init__(self, dbPath):
+		directory = os.path.dirname(dbPath);
+		if not directory == "" and not os.path.isdir(directory):
+			os.makedirs(directory, exist_ok=True);
+		self.dbPath = dbPath;
+		self.lock = threading.Lock();
+		self.db = sqlite3.connect(dbPath, timeout=60, isolation_level=None, check_same_thread=False);
+		with self.lock:
+			for statement in self.SCHEMA:
+				self.db.execute(statement);
+
+	def close(self):
+		self.db.close();
+
+class TokenBucket(SqliteStore):
+
+	"""
+	Request rate limiter shared by every thread and process using dbPath.
+
+	Each named bucket refills at ratePerSec up to capacity tokens; acquire()
+	takes one, sleeping only as long as the bucket is empty. The bucket
+	state lives in SQLite, so separate jobs on one API key share the limit.
+	"""
+
+	SCHEMA = ["CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updatedAt REAL NOT NULL)"];
+
+	def __init__(self, dbPath, ratePerSec, capacity=1.0):
+		super(TokenBucket, self).__init__(dbPath);
+		self.ratePerSec = ratePerSec;
+		self.capacity = capacity;
+
+	def tryAcquire(self, name):
+		# returns 0 when a token was taken, otherwise the seconds until one is available
+		with self.lock:
+			self.db.execute("BEGIN IMMEDIATE");
+			try:
+				now = time.time();
+				row = self.db.execute("SELECT tokens, updatedAt FROM buckets WHERE name = ?", (name,)).fetchone();
+				tokens = self.capacity;
+				if not row is None:
+					tokens = min(self.capacity, row[0] + (now - row[1]) * self.ratePerSec);
+				waitSec = 0;
+				if tokens >= 1.0:
+					tokens -= 1.0;
+				else:
+					waitSec = (1.0 - tokens) / self.ratePerSec;
+				self.db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (name, tokens, now));
+				self.db.execute("COMMIT");
+			except BaseException as error:
+				self.db.execute("ROLLBACK");
+				raise error;
+		return(waitSec);
+
+	def acquire(self, name):
+		while True:
+			waitSec = self.tryAcquire(name);
+			if waitSec == 0:
+				return;
+			time.sleep(waitSec);
+
+class ResponseCache(SqliteStore):
+
+	"""
+	Persistent cache for API responses that can't change (mined
+	transactions, verified contracts, finalized history).
+	"""
+
+	SCHEMA = ["CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, storedAt REAL NOT NULL)"];
+
+	def get(self, key):
+		with self.lock:
+			row = self.db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone();
+		if row is None:
+			return(None);
+		return(json.loads(row[0]));
+
+	def put(self, key, response):
+		with self.lock:
+			self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (key, json.dumps(response), time.time()));
@@ -0,0 +1,92 @@
+# feeOracle.py
+
+# python basics
+import statistics
+import threading
+import time
+
+class FeeOracle(object):
+
+	"""
+	EIP-1559 fees from a single eth_feeHistory call, shared by every speed.
+
+	The response is cached for cacheSec (about one block), so building any
+	number of transactions costs at most one fee RPC per block. getFees()
+	returns None on chains without a base fee (for good) and when the fee
+	history can't be fetched (for that call only); callers then fall back to
+	a legacy gas price.
+	"""
+
+	# reward percentile of recent blocks used as the priority fee for each speed
+	speedPercentiles = {
+		"glacial":1,
+		"slow":10,
+		"average":50,
+		"fast":90
+	};
+
+	# JSON-RPC error code of a method the node doesn't implement
+	METHOD_NOT_FOUND = -32601;
+
+	def __init__(self, web3, cacheSec=12, blockCount=10, baseFeeMultiplier=2):
+		self.web3 = web3;
+		self.cacheSec = cacheSec;
+		self.blockCount = blockCount;
+		self.baseFeeMultiplier = baseFeeMultiplier;
+		self.lock = threading.Lock();
+		self.cachedAt = 0;
+		self.cachedFees = None;
+		self.supported = True;
+
+	def toInt(self, value):
+		if isinstance(value, str):
+			return(int(value, 16));
+		return(int(value));
+
+	def fetchFees(self):
+		percentiles = list(self.speedPercentiles.values());
+		history = self.web3.manager.request_blocking("eth_feeHistory", [hex(self.blockCount), "latest", percentiles]);
+
+		# the last base fee is the one for the next block; pre-London chains have none
+		baseFees = history.get("baseFeePerGas");
+		if baseFees is None or len(baseFees) == 0:
+			return(None);
+		nextBaseFee = self.toInt(baseFees[-1]);
+		if nextBaseFee == 0:
+			return(None);
+
+		fees = {};
+		for i, speed in enumerate(self.speedPercentiles.keys()):
+			rewards = [self.toInt(blockRewards[i]) for blockRewards in history["reward"]];
+			priorityFee = int(statistics.median(rewards)) if len(rewards) > 0 else 0;
+			fees[speed] = {
+				"maxFeePerGas":nextBaseFee * self.baseFeeMultiplier + priorityFee,
+				"maxPriorityFeePerGas":priorityFee
+			};
+		return(fees);
+
+	def isMethodNotFound(self, error):
+		details = error.args[0] if len(error.args) > 0 else None;
+		return(isinstance(details, dict) and details.get("code") == self.METHOD_NOT_FOUND);
+
+	def getFees(self, speed="average"):
+		if not speed in self.speedPercentiles.keys():
+			raise ValueError("Speed must be one of the following options: " + ", ".join(self.speedPercentiles.keys()));
+		if not self.supported:
+			return(None);
+		with self.lock:
+			if self.cachedFees is None or time.time() - self.cachedAt >= self.cacheSec:
+				try:
+					fees = self.fetchFees();
+				except ValueError as error:
+					# only a node without eth_feeHistory disables it for good; rate limits and
+					# other transient RPC errors fall back to a legacy gas price for this call
+					if self.isMethodNotFound(error):
+						self.supported = False;
+					return(None);
+				if fees is None:
+					self.supported = False;
+					return(None);
+				self.cachedFees = fees;
+				self.cachedAt = time.time();
+			return(dict(self.cachedFees[speed]));
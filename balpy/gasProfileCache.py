@@ -0,0 +1,84 @@
+# gasProfileCache.py
+
+# python basics
+import collections
+import threading
+
+class GasProfileCache(object):
+
+	"""
+	Gas used by past transactions, keyed by what drives their cost:
+	(contract, function selector, pool ids, hop/token count, kind). The kind
+	is the swap kind for swaps and, for joins and exits, the userData kind
+	with the tokens that have non-zero limits, so an exact-in and an
+	exact-out exit never share samples.
+
+	record() stores gasUsed from successful receipts and getEstimate() serves
+	the largest recent value, padded once by the larger of padding and the
+	caller's gas factor. A reverted transaction clears its key, so the next
+	one goes back to estimateGas.
+	"""
+
+	def __init__(self, padding=1.1, maxSamples=20):
+		self.padding = padding;
+		self.maxSamples = maxSamples;
+		self.lock = threading.Lock();
+		self.samples = {};
+		self.expected = {}; # nonce -> key, between buildTx and sendTx
+
+	def toHex(self, value):
+		if isinstance(value, (bytes, bytearray)):
+			return("0x" + bytes(value).hex());
+		return(str(value).lower());
+
+	def getUserDataKind(self, userData):
+		# join/exit userData starts with the kind enum as a uint256 word
+		if isinstance(userData, str):
+			userData = bytes.fromhex(userData[2:] if userData.startswith("0x") else userData);
+		if len(userData) < 32:
+			return(None);
+		return(int.from_bytes(bytes(userData[:32]), "big"));
+
+	def getKey(self, fn):
+		selector = fn._encode_transaction_data()[:10];
+		args = fn.args;
+		poolIds = ();
+		count = None;
+		kind = None;
+		if fn.fn_name == "swap":
+			poolIds = (self.toHex(args[0][0]),);
+			count = 1;
+			kind = args[0][1];
+		elif fn.fn_name == "batchSwap":
+			poolIds = tuple([self.toHex(swap[0]) for swap in args[1]]);
+			count = len(args[2]);
+			kind = args[0];
+		elif fn.fn_name in ["joinPool", "exitPool"]:
+			# request: (assets, limits, userData, internalBalance)
+			poolIds = (self.toHex(args[0]),);
+			count = len(args[3][0]);
+			kind = (self.getUserDataKind(args[3][2]), tuple([not int(limit) == 0 for limit in args[3][1]]));
+		return((fn.address, selector, poolIds, count, kind));
+
+	def getEstimate(self, key, gasFactor=1.0):
+		with self.lock:
+			if not key in self.samples.keys():
+				return(None);
+			return(int(max(self.samples[key]) * max(self.padding, gasFactor)));
+
+	def record(self, key, receipt):
+		with self.lock:
+			if not receipt["status"] == 1:
+				self.samples.pop(key, None);
+				return;
+			if not key in self.samples.keys():
+				self.samples[key] = collections.deque(maxlen=self.maxSamples);
+			self.samples[key].append(receipt["gasUsed"]);
+
+	def expect(self, nonce, key):
+		with self.lock:
+			self.expected[nonce] = key;
+
+	def popExpected(self, nonce):
+		with self.lock:
+			return(self.expected.pop(nonce, None));
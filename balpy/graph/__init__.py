@@ -1 +1,9 @@
 from balpy.graph import graph
+from balpy.graph import subgraphMirror
+
+def __getattr__(name):
+	# asyncGraph needs aiohttp: only imported on first use of balpy.graph.asyncGraph
+	if name == "asyncGraph":
+		import importlib
+		return(importlib.import_module("balpy.graph.asyncGraph"));
+	raise AttributeError("module 'balpy.graph' has no attribute '" + name + "'");
@@ -0,0 +1,224 @@
+# asyncGraph.py
+
+# python basics
+import asyncio
+
+# async http
+import aiohttp
+
+# balpy modules
+from .graph import TheGraph, getParsedQuery
+
+class AsyncTheGraph(object):
+
+	"""
+	Coroutine versions of the TheGraph queries.
+
+	Queries are the same parameterized documents TheGraph uses, parsed once
+	per process, and are posted with their variables over a shared aiohttp
+	session, so subgraph reads can run on the same event loop as AsyncBalpy
+	RPC calls. maxConcurrency bounds how many requests are outstanding.
+	URLs, page sizes and result shapes come from the synchronous client,
+	available as .graph
+
+		async with AsyncTheGraph("mainnet") as agraph:
+			(pools, prices) = await asyncio.gather(	agraph.getV2PoolIDs(1000),
+													agraph.getPoolBptPriceEstimateBatch(poolIds));
+	"""
+
+	DEFAULT_MAX_CONCURRENCY = 16;
+
+	def __init__(self, network="mainnet", customUrl=None, usingJsonEndpoint=False, maxConcurrency=DEFAULT_MAX_CONCURRENCY, graph=None):
+		if graph is None:
+			graph = TheGraph(network, customUrl=customUrl, usingJsonEndpoint=usingJsonEndpoint);
+		self.graph = graph;
+		self.graphUrl = graph.graphUrl;
+		self.maxConcurrency = maxConcurrency;
+
+		# session and semaphore must be created inside the running event loop
+		self.session = None;
+		self.semaphore = None;
+
+	async def __aenter__(self):
+		return(self);
+
+	async def __aexit__(self, type, value, traceback):
+		await self.close();
+
+	async def close(self):
+		if not self.session is None:
+			await self.session.close();
+			self.session = None;
+
+	def getSession(self):
+		if self.session is None:
+			connector = aiohttp.TCPConnector(limit=self.maxConcurrency);
+			self.session = aiohttp.ClientSession(connector=connector);
+			self.semaphore = asyncio.Semaphore(self.maxConcurrency);
+		return(self.session);
+
+	# =====================
+	# ======Transport======
+	# =====================
+	async def execute(self, query_string, variables=None):
+		session = self.getSession();
+		(document, query) = getParsedQuery(query_string);
+		payload = {"query":query};
+		if not variables is None:
+			payload["variables"] = variables;
+		async with self.semaphore:
+			async with session.post(self.graphUrl, json=payload) as response:
+				response.raise_for_status();
+				result = await response.json();
+		if "errors" in result.keys():
+			raise ValueError(result["errors"]);
+		return(result["data"]);
+
+	# =====================
+	# =======Queries=======
+	# =====================
+	async def getPoolTokens(self, pool_id, verbose=False):
+		if verbose:
+			print("Querying tokens for pool with ID:", pool_id)
+		response = await self.execute(self.graph.POOL_TOKENS_QUERY, {"poolId":pool_id});
+		return(response["poolTokens"])
+
+	async def getNumPools(self, verbose=False):
+		if verbose:
+			print("Querying number of pools...")
+		response = await self.execute(self.graph.NUM_POOLS_QUERY);
+		return(self.graph.parseNumPools(response))
+
+	async def getIndexedBlock(self, verbose=False):
+		response = await self.execute(self.graph.INDEXED_BLOCK_QUERY);
+		return(int(response["_meta"]["block"]["number"]))
+
+	async def queryPools(self, batch_size, skips, fields, last_id=None, id_lt=None, verbose=False):
+		response = await self.execute(*self.graph.buildPoolsQuery(batch_size, skips, fields, last_id, id_lt));
+		return(response)
+
+	async def getPools(self, batch_size, skips, verbose=False, last_id=None):
+		response = await self.queryPools(batch_size, skips, self.graph.POOL_FIELDS, last_id=last_id, verbose=verbose);
+		return(response)
+
+	async def getPoolsWithTokens(self, batch_size, skips, verbose=False, last_id=None):
+		response = await self.queryPools(batch_size, skips, self.graph.POOL_WITH_TOKENS_FIELDS, last_id=last_id, verbose=verbose);
+		return(response)
+
+	async def getPoolsAndTokens(self, batch_size, skips, verbose=False, last_id=None):
+		response = await self.queryPools(batch_size, skips, self.graph.POOL_TOKEN_ADDRESS_FIELDS, last_id=last_id, verbose=verbose);
+		return(response)
+
+	async def iterateEntities(self, entity, fields, batch_size=TheGraph.MAX_PAGE_SIZE, where=None, verbose=False):
+		# async generator over every entity matching where (a filter dict), paged by id
+		batch_size = min(batch_size, self.graph.MAX_PAGE_SIZE);
+		last_id = "";
+		while True:
+			if verbose:
+				print("Querying", batch_size, entity, "after", last_id, "...")
+			page_where = dict(where or {});
+			page_where["id_gt"] = last_id;
+			response = await self.execute(*self.graph.buildEntitiesQuery(entity, fields, batch_size, page_where));
+			for item in response[entity]:
+				yield(item);
+			if len(response[entity]) < batch_size:
+				return;
+			last_id = response[entity][-1]["id"];
+
+	async def iteratePoolRange(self, batch_size, fields, id_gt="", id_lt=None, verbose=False):
+		batch_size = min(batch_size, self.graph.MAX_PAGE_SIZE);
+		last_id = id_gt;
+		while True:
+			if verbose:
+				print("Querying", batch_size, "pools after", last_id, "...")
+			response = await self.queryPools(batch_size, 0, fields, last_id=last_id, id_lt=id_lt, verbose=verbose);
+			pools = response["pools"];
+			if len(pools) > 0:
+				yield(pools);
+			if len(pools) < batch_size:
+				return;
+			last_id = pools[-1]["id"];
+
+	async def iteratePools(self, batch_size=TheGraph.MAX_PAGE_SIZE, fields=TheGraph.POOL_FIELDS, partitions=1, verbose=False):
+		# async generator over every pool; id ranges are fetched as concurrent tasks when partitions > 1
+		if partitions <= 1:
+			async for pools in self.iteratePoolRange(batch_size, fields, verbose=verbose):
+				for pool in pools:
+					yield(pool);
+			return;
+
+		# bounded queue: fetching pauses while the consumer is behind
+		pages = asyncio.Queue(maxsize=2 * partitions);
+
+		async def fetchRange(id_gt, id_lt):
+			# no put after a cancel: the consumer is gone and a full queue would never drain
+			try:
+				async for pools in self.iteratePoolRange(batch_size, fields, id_gt, id_lt, verbose=verbose):
+					await pages.put(("pools", pools));
+			except asyncio.CancelledError:
+				raise;
+			except Exception as e:
+				await pages.put(("error", e));
+				return;
+			await pages.put(("done", None));
+
+		ranges = self.graph.getIdPartitions(partitions);
+		tasks = [asyncio.ensure_future(fetchRange(id_gt, id_lt)) for (id_gt, id_lt) in ranges];
+		finished = 0;
+		try:
+			while finished < len(ranges):
+				(kind, item) = await pages.get();
+				if kind == "done":
+					finished += 1;
+				elif kind == "error":
+					raise item;
+				else:
+					for pool in item:
+						yield(pool);
+		finally:
+			for task in tasks:
+				task.cancel();
+			await asyncio.gather(*tasks, return_exceptions=True);
+
+	async def getV2Pools(self, batch_size, verbose=False, partitions=1):
+		if verbose:
+			print("Querying pools...");
+		pools = [pool async for pool in self.iteratePools(batch_size, self.graph.POOL_WITH_TOKENS_FIELDS, partitions=partitions, verbose=verbose)];
+		return(self.graph.collectV2Pools(pools))
+
+	async def getV2PoolIDs(self, batch_size, pool_filter=None, verbose=False, partitions=1):
+		if verbose:
+			print("Querying pools...");
+		pools = [pool async for pool in self.iteratePools(batch_size, self.graph.POOL_FIELDS, partitions=partitions, verbose=verbose)];
+		return(self.graph.collectV2PoolIDs(pools, pool_filter))
+
+	async def getPoolBptPriceEstimate(self, poolId, verbose=False):
+		if verbose:
+			print("Getting data for pool", poolId, "from the subgraph...")
+		response = await self.execute(self.graph.BPT_PRICE_QUERY, {"poolId":poolId});
+		pool = response["pools"][0]
+		pricePerBpt = float(pool["totalLiquidity"])/float(pool["totalShares"])
+		return(pricePerBpt)
+
+	async def queryPoolsById(self, pool_ids, fields, batch_size=TheGraph.LOOKUP_BATCH_SIZE, verbose=False):
+		# all id_in chunks are requested concurrently
+		(input_ids, chunks) = self.graph.chunkPoolIds(pool_ids, batch_size);
+		if verbose:
+			print("Querying", len(chunks), "pool chunks...")
+		responses = await asyncio.gather(*[self.execute(*self.graph.buildPoolsByIdQuery(chunk, fields)) for chunk in chunks]);
+		pools = {};
+		for response in responses:
+			for pool in response["pools"]:
+				pools[input_ids[pool["id"]]] = pool;
+		return(pools)
+
+	async def getPoolTokensBatch(self, pool_ids, batch_size=TheGraph.LOOKUP_BATCH_SIZE, verbose=False):
+		pools = await self.queryPoolsById(pool_ids, self.graph.POOL_TOKENS_BATCH_FIELDS, batch_size=batch_size, verbose=verbose);
+		pool_tokens = {};
+		for pool_id in pools.keys():
+			pool_tokens[pool_id] = pools[pool_id]["tokens"];
+		return(pool_tokens)
+
+	async def getPoolBptPriceEstimateBatch(self, pool_ids, batch_size=TheGraph.LOOKUP_BATCH_SIZE, verbose=False):
+		pools = await self.queryPoolsById(pool_ids, "totalShares totalLiquidity", batch_size=batch_size, verbose=verbose);
+		return(self.graph.collectBptPrices(pools))
@@ -1,18 +1,165 @@
 # basics
 import json
-import math
+import os
+import queue
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # thegraph queries
 from gql import gql, Client
 from gql.transport.requests import RequestsHTTPTransport
+from graphql.execution import ExecutionResult
+from graphql.language.printer import print_ast
+import requests
 
 # for customized endpoints
-import requests
+from ..httpSession import getSession
+
+# local pool mirror
+from .subgraphMirror import SubgraphMirror
+
+# parsed query documents, keyed by query string: each query is parsed once per process
+parsedQueries = {};
+parsedQueriesLock = threading.Lock();
+
+# print_ast text of each parsed document, keyed by id(document); parsedQueries keeps the documents (and ids) alive
+printedQueries = {};
+
+def getParsedQuery(query_string):
+	# (document for gql, compact text for plain JSON endpoints)
+	if not query_string in parsedQueries.keys():
+		with parsedQueriesLock:
+			if not query_string in parsedQueries.keys():
+				text = query_string.replace("\n"," ").replace("\t","");
+				document = gql(query_string);
+				printedQueries[id(document)] = print_ast(document);
+				parsedQueries[query_string] = (document, text);
+	return(parsedQueries[query_string]);
+
+class PrintedQueryTransport(RequestsHTTPTransport):
+
+	"""
+	RequestsHTTPTransport that sends the text printed once by getParsedQuery
+	instead of running print_ast on the document for every request.
+	"""
+
+	def execute(self, document, variable_values=None, operation_name=None, timeout=None):
+		query_str = printedQueries.get(id(document));
+		if query_str is None:
+			return(super(PrintedQueryTransport, self).execute(document, variable_values, operation_name, timeout));
+
+		payload = {"query":query_str};
+		if variable_values:
+			payload["variables"] = variable_values;
+		if operation_name:
+			payload["operationName"] = operation_name;
+
+		data_key = "json" if self.use_json else "data";
+		post_args = {	"headers":self.headers,
+						"auth":self.auth,
+						"cookies":self.cookies,
+						"timeout":timeout or self.default_timeout,
+						"verify":self.verify,
+						data_key:payload};
+		post_args.update(self.kwargs);
+
+		response = self.session.request(self.method, self.url, **post_args);
+		try:
+			result = response.json();
+			if not isinstance(result, dict):
+				raise ValueError;
+		except ValueError:
+			result = {};
+		if "errors" not in result and "data" not in result:
+			response.raise_for_status();
+			raise requests.HTTPError("Server did not return a GraphQL result", response=response);
+		return(ExecutionResult(errors=result.get("errors"), data=result.get("data")));
 
 class TheGraph(object):
 	client = None;
+
+	# largest "first" graph-node accepts
+	MAX_PAGE_SIZE = 1000;
+
+	# pool fields returned by the paged pool queries
+	POOL_FIELDS = "id address poolType strategyType swapFee";
+	POOL_WITH_TOKENS_FIELDS = POOL_FIELDS + " tokens { id poolId { id } symbol name decimals address balance weight }";
+	POOL_TOKEN_ADDRESS_FIELDS = "id tokens { token { id } }";
+	POOL_TOKENS_BATCH_FIELDS = "tokens { id poolId { id } symbol name decimals address balance weight }";
+
+	# pool ids per id_in lookup, small enough to stay under query complexity limits
+	LOOKUP_BATCH_SIZE = 100;
+
+	# local mirrors live here unless a path is given
+	cacheDir = os.path.join(os.path.expanduser("~"), ".balpy");
+
+	# Parameterized queries: values are passed as variables, only the selected fields are formatted in
+	POOL_TOKENS_QUERY = '''
+		query($poolId: String!) {
+		  poolTokens(first: 8, where: { poolId: $poolId }) {
+		    id
+			poolId {
+				id
+			}
+			symbol
+			name
+			decimals
+			address
+			balance
+			weight
+		  }
+		}
+		''';
+	NUM_POOLS_QUERY = '''
+		query {
+			balancers(first: 5) {
+		    id
+		    poolCount
+		  }
+		}
+		''';
+	INDEXED_BLOCK_QUERY = '''
+		query {
+		  _meta {
+		    block {
+		      number
+		    }
+		  }
+		}
+		''';
+	POOLS_SKIP_QUERY = '''
+		query($first: Int!, $skip: Int!) {{
+		  pools(first: $first, skip: $skip) {{
+		    {fields}
+		  }}
+		}}
+		''';
+	ENTITIES_BY_ID_QUERY = '''
+		query($first: Int!, $where: {filter_type}) {{
+		  {entity}(first: $first, orderBy: id, orderDirection: asc, where: $where) {{
+		    id
+		    {fields}
+		  }}
+		}}
+		''';
+	POOLS_ID_IN_QUERY = '''
+		query($first: Int!, $ids: [ID!]) {{
+		  pools(first: $first, where: {{ id_in: $ids }}) {{
+		    id
+		    {fields}
+		  }}
+		}}
+		''';
+	BPT_PRICE_QUERY = '''
+		query($poolId: ID!) {
+			pools(where: { id: $poolId }) {
+				totalShares
+				totalLiquidity
+			}
+		}
+		''';
 	
 	"""
 	A starting point for querying pool data from the Balancer Subgraph.
@@ -28,19 +175,21 @@ class TheGraph(object):
 	def __init__(self, network="mainnet", customUrl=None, usingJsonEndpoint=False):
 		super(TheGraph, self).__init__()
 		self.network = network;
+		self.httpSession = getSession();
 		self.initBalV2Graph(customUrl=customUrl, usingJsonEndpoint=usingJsonEndpoint);
 
 	def printJson(self, curr_dict):
 		print(json.dumps(curr_dict, indent=4))
 
-	def callCustomEndpoint(self, query):
+	def callCustomEndpoint(self, query, variables=None):
 
-		query = query.replace("\n"," ");
-		query = query.replace("\t","");
+		(document, query) = getParsedQuery(query);
 		queryDict = {"query":query};
+		if not variables is None:
+			queryDict["variables"] = variables;
 		serializedData = json.dumps(queryDict);
 		headers = {"Content-Type":"application/json"};
-		r = requests.post(self.graphUrl, data=serializedData, headers=headers);
+		r = self.httpSession.post(self.graphUrl, data=serializedData, headers=headers);
 		response = r.json();
 		return(response["data"])
 
@@ -68,152 +217,236 @@ class TheGraph(object):
 		graphUrl = "https://api.thegraph.com/subgraphs/name/balancer-labs/balancer" + network_string + "-v2";
 		if not customUrl is None and not usingJsonEndpoint:
 			graphUrl = customUrl;
+		self.graphUrl = graphUrl;
 
-		balancer_transport=RequestsHTTPTransport(
+		balancer_transport=PrintedQueryTransport(
 		    url=graphUrl,
 		    verify=True,
 		    retries=3
 		)
+		# share pooled connections with the other clients; the shared session has the same retry policy
+		balancer_transport.session = self.httpSession;
 		self.client = Client(transport=balancer_transport)
 		
 		if verbose:
 			print("Successfully initialized on network:", self.network);
 
-	def getPoolTokens(self, pool_id, verbose=False):
-
+	def execute(self, query_string, variables=None):
+		# runs a (parameterized) query on the CUSTOM endpoint or through gql
 		self.assertInit();
+		if self.client == "CUSTOM":
+			return(self.callCustomEndpoint(query_string, variables));
+		(document, text) = getParsedQuery(query_string);
+		return(self.client.execute(document, variable_values=variables))
+
+	def getPoolTokens(self, pool_id, verbose=False):
 
 		if verbose:
 			print("Querying tokens for pool with ID:", pool_id)
-
-		pool_token_query = '''
-		query {{
-		  poolTokens(first: 8, where: {{ poolId: "{pool_id}" }}) {{
-		    id
-			poolId {{
-				id
-			}}
-			symbol
-			name
-			decimals
-			address
-			balance
-			weight
-		  }}
-		}}
-		''';
-		formatted_query_string = pool_token_query.format(pool_id=pool_id)
-		if self.client == "CUSTOM":
-			response = self.callCustomEndpoint(formatted_query_string);
-		else:
-			response = self.client.execute(gql(formatted_query_string))
+		response = self.execute(self.POOL_TOKENS_QUERY, {"poolId":pool_id});
 		if verbose:
 			print("Got pool tokens.")
 		return(response["poolTokens"])
 
 	def getNumPools(self, verbose=False):
 
-		self.assertInit();
 		if verbose:
 			print("Querying number of pools...")
 
 		# get number of balancer pools on v2
-		balancers_query = '''
-		query {
-			balancers(first: 5) {
-		    id
-		    poolCount
-		  }
-		}
-		'''
-		if self.client == "CUSTOM":
-			response = self.callCustomEndpoint(balancers_query);
-		else:
-			response = self.client.execute(gql(balancers_query));
+		response = self.execute(self.NUM_POOLS_QUERY);
 
 		if verbose:
 			print("Got response from the Subgraph")
+		return(self.parseNumPools(response))
 
+	def parseNumPools(self, response):
 		for balancer in response["balancers"]:
 			if balancer["id"] == "2":
 				num_pools = balancer["poolCount"]
 				return(num_pools)
 		return None;
 
-	def getPools(self, batch_size, skips, verbose=False):
+	def buildPoolsQuery(self, batch_size, skips, fields, last_id=None, id_lt=None):
+		# skip paging when last_id is None, otherwise keyset paging on id (ids above last_id, below id_lt)
+		batch_size = min(batch_size, self.MAX_PAGE_SIZE);
+		if last_id is None:
+			return(self.POOLS_SKIP_QUERY.format(fields=fields), {"first":batch_size, "skip":skips});
+		where = {"id_gt":last_id};
+		if not id_lt is None:
+			where["id_lt"] = id_lt;
+		return(self.buildEntitiesQuery("pools", fields, batch_size, where));
 
-		self.assertInit();
-		if verbose:
-			print("Querying pools #", skips, "through #", skips + batch_size, "...")
-
-		query_string = '''
-			query {{
-			  pools(first: {first}, skip: {skip}) {{
-			    id
-			    address
-			    poolType
-			    strategyType
-			    swapFee
-			  }}
-			}}
-			'''
-		formatted_query_string = query_string.format(first=batch_size, skip=skips)
-		if self.client == "CUSTOM":
-			response = self.callCustomEndpoint(formatted_query_string);
-		else:
-			response = self.client.execute(gql(formatted_query_string))
+	def buildEntitiesQuery(self, entity, fields, batch_size, where):
+		# filter type names follow graph-node's schema: pools -> Pool_filter, poolTokens -> PoolToken_filter
+		filter_type = entity[0].upper() + entity[1:-1] + "_filter";
+		query_string = self.ENTITIES_BY_ID_QUERY.format(entity=entity, filter_type=filter_type, fields=fields);
+		return(query_string, {"first":min(batch_size, self.MAX_PAGE_SIZE), "where":where});
+
+	def queryPools(self, batch_size, skips, fields, last_id=None, id_lt=None, verbose=False):
+		return(self.execute(*self.buildPoolsQuery(batch_size, skips, fields, last_id, id_lt)))
+
+	def getPools(self, batch_size, skips, verbose=False, last_id=None):
 
+		if verbose:
+			if last_id is None:
+				print("Querying pools #", skips, "through #", skips + batch_size, "...")
+			else:
+				print("Querying", batch_size, "pools after", last_id, "...")
+		response = self.queryPools(batch_size, skips, self.POOL_FIELDS, last_id=last_id, verbose=verbose);
 		if verbose:
 			print("Got pools.")
 		return(response)
 
-	def getV2Pools(self, batch_size, verbose=False):
+	def getPoolsWithTokens(self, batch_size, skips, verbose=False, last_id=None):
+
+		# tokens are nested in the pool query, so one request covers a whole page
+		if verbose:
+			if last_id is None:
+				print("Querying pools and tokens #", skips, "through #", skips + batch_size, "...")
+			else:
+				print("Querying", batch_size, "pools and tokens after", last_id, "...")
+		response = self.queryPools(batch_size, skips, self.POOL_WITH_TOKENS_FIELDS, last_id=last_id, verbose=verbose);
+		if verbose:
+			print("Got pools and tokens.")
+		return(response)
+
+	def getIndexedBlock(self, verbose=False):
+		# latest block the subgraph has indexed
+		response = self.execute(self.INDEXED_BLOCK_QUERY);
+		return(int(response["_meta"]["block"]["number"]))
+
+	def iterateEntities(self, entity, fields, batch_size=MAX_PAGE_SIZE, where=None, verbose=False):
+		# generator over every entity matching where (a filter dict), paged by id
+		batch_size = min(batch_size, self.MAX_PAGE_SIZE);
+		last_id = "";
+		while True:
+			if verbose:
+				print("Querying", batch_size, entity, "after", last_id, "...")
+			page_where = dict(where or {});
+			page_where["id_gt"] = last_id;
+			response = self.execute(*self.buildEntitiesQuery(entity, fields, batch_size, page_where));
+			for item in response[entity]:
+				yield(item);
+			if len(response[entity]) < batch_size:
+				return;
+			last_id = response[entity][-1]["id"];
+
+	def iteratePoolRange(self, batch_size, fields, id_gt="", id_lt=None, verbose=False):
+		# pages of pools with id_gt < id < id_lt, following the last id of each page
+		batch_size = min(batch_size, self.MAX_PAGE_SIZE);
+		last_id = id_gt;
+		while True:
+			if verbose:
+				print("Querying", batch_size, "pools after", last_id, "...")
+			pools = self.queryPools(batch_size, 0, fields, last_id=last_id, id_lt=id_lt, verbose=verbose)["pools"];
+			if len(pools) > 0:
+				yield(pools);
+			if len(pools) < batch_size:
+				return;
+			last_id = pools[-1]["id"];
+
+	def getIdPartitions(self, partitions):
+		# splits the id space on its first 4 hex digits into (id_gt, id_lt) ranges
+		bounds = ["0x{:04x}".format(int(i * 0x10000 / partitions)) for i in range(1, partitions)];
+		lowers = [""] + bounds;
+		uppers = bounds + [None];
+		return(list(zip(lowers, uppers)));
+
+	def iteratePools(self, batch_size=MAX_PAGE_SIZE, fields=POOL_FIELDS, partitions=1, max_workers=8, verbose=False):
+		"""
+		Generator over every pool, paged by id so deep pages cost the same as the first.
+			With partitions > 1 the id space is split into ranges fetched concurrently,
+			and pools are yielded as their pages arrive (in no particular order).
+		"""
+		if partitions <= 1:
+			for pools in self.iteratePoolRange(batch_size, fields, verbose=verbose):
+				for pool in pools:
+					yield(pool);
+			return;
+
+		# bounded queue: fetching pauses while the consumer is behind
+		pages = queue.Queue(maxsize=2 * partitions);
+		stopped = threading.Event();
+
+		def put(item):
+			while not stopped.is_set():
+				try:
+					pages.put(item, timeout=0.1);
+					return(True);
+				except queue.Full:
+					pass;
+			return(False);
+
+		def fetchRange(id_gt, id_lt):
+			try:
+				for pools in self.iteratePoolRange(batch_size, fields, id_gt, id_lt, verbose=verbose):
+					if not put(("pools", pools)):
+						return;
+			except Exception as e:
+				put(("error", e));
+			finally:
+				put(("done", None));
+
+		ranges = self.getIdPartitions(partitions);
+		executor = ThreadPoolExecutor(max_workers=min(max_workers, partitions));
+		for (id_gt, id_lt) in ranges:
+			executor.submit(fetchRange, id_gt, id_lt);
+
+		finished = 0;
+		try:
+			while finished < len(ranges):
+				(kind, item) = pages.get();
+				if kind == "done":
+					finished += 1;
+				elif kind == "error":
+					raise item;
+				else:
+					for pool in item:
+						yield(pool);
+		finally:
+			stopped.set();
+			executor.shutdown(wait=False);
+
+	def getV2Pools(self, batch_size, verbose=False, partitions=1):
 
 		if self.client is None:
 			self.initBalV2Graph(verbose=verbose);
-		
-		num_pools = self.getNumPools(verbose=verbose);
-		num_calls = math.ceil(num_pools/batch_size)
 
 		if verbose:
-			print("Querying",num_pools, "pools...");
+			print("Querying pools...");
+
+		return(self.collectV2Pools(self.iteratePools(batch_size, self.POOL_WITH_TOKENS_FIELDS, partitions=partitions, verbose=verbose)))
 
-		# query all pools by batch to save time
+	def collectV2Pools(self, pools):
 		pool_tokens = {};
-		for i in range(num_calls):
-			response = self.getPools(batch_size, batch_size*i, verbose)
-			
-			for pool in response["pools"]:
-				curr_id = pool["id"]
-				curr_pool_token_data = self.getPoolTokens(curr_id, verbose=verbose);
-				pool_data = {};
-				pool_data["tokens"] = curr_pool_token_data;
-				pool_data["poolType"] = pool["poolType"];
-				pool_data["swapFee"] = pool["swapFee"];
-				pool_tokens[curr_id] = pool_data;
+		for pool in pools:
+			curr_id = pool["id"]
+			pool_data = {};
+			pool_data["tokens"] = pool["tokens"];
+			pool_data["poolType"] = pool["poolType"];
+			pool_data["swapFee"] = pool["swapFee"];
+			pool_tokens[curr_id] = pool_data;
 		return(pool_tokens)
 
-	def getV2PoolIDs(self, batch_size, pool_filter=None, verbose=False):
+	def getV2PoolIDs(self, batch_size, pool_filter=None, verbose=False, partitions=1):
 
 		if self.client is None:
 			self.initBalV2Graph(verbose=verbose);
 
-		num_pools = self.getNumPools(verbose=verbose);
-		num_calls = math.ceil(num_pools/batch_size)
-
 		if verbose:
-			print("Querying",num_pools, "pools...");
+			print("Querying pools...");
+
+		return(self.collectV2PoolIDs(self.iteratePools(batch_size, self.POOL_FIELDS, partitions=partitions, verbose=verbose), pool_filter))
 
-		# query all pools by batch to save time
+	def collectV2PoolIDs(self, pools, pool_filter=None):
 		poolIdsByType = {};
-		for i in range(num_calls):
-			response = self.getPools(batch_size, batch_size*i, verbose)
-			for pool in response["pools"]:
-				if not pool_filter is None and not pool_filter.lower() in pool["poolType"].lower():
-					continue;
-				if pool["poolType"] not in poolIdsByType.keys():
-					poolIdsByType[pool["poolType"]] = [];
-				poolIdsByType[pool["poolType"]].append(pool["id"])
+		for pool in pools:
+			if not pool_filter is None and not pool_filter.lower() in pool["poolType"].lower():
+				continue;
+			if pool["poolType"] not in poolIdsByType.keys():
+				poolIdsByType[pool["poolType"]] = [];
+			poolIdsByType[pool["poolType"]].append(pool["id"])
 		header = {};
 		header["stamp"] = time.time();
 		poolCount = 0
@@ -226,22 +459,18 @@ class TheGraph(object):
 		data["pools"] = poolIdsByType
 		return(data)
 
+	def getMirror(self, db_path=None):
+		# local pool/token mirror of this subgraph; call sync() on it before reading
+		if db_path is None:
+			db_path = os.path.join(self.cacheDir, self.network + "-subgraph.sqlite");
+		return(SubgraphMirror(self, db_path))
+
 	def getPoolBptPriceEstimate(self, poolId, verbose=False):
 
-		self.assertInit();
 		if verbose:
 			print("Getting data for pool", poolId, "from the subgraph...")
 
-		query_string = '''
-			query {{
-				pools(where:{{id: "{poolId}"}}) {{
-					totalShares
-					totalLiquidity
-				}}
-			}}
-			'''
-		formatted_query_string = query_string.format(poolId=poolId);
-		response = self.client.execute(gql(formatted_query_string));
+		response = self.execute(self.BPT_PRICE_QUERY, {"poolId":poolId});
 
 		pool = response["pools"][0]
 		pricePerBpt = float(pool["totalLiquidity"])/float(pool["totalShares"])
@@ -250,29 +479,56 @@ class TheGraph(object):
 			print("Got price data:", pricePerBpt)
 		return(pricePerBpt)
 
-	def getPoolsAndTokens(self, batch_size, skips, verbose=False):
-		self.assertInit();
-		query_string = '''
-			query {{
-			  pools(first: {first}, skip: {skip}) {{
-			    id
-			    tokens {{
-			      token
-			      {{
-			        id
-			      }}
-			    }}
-			  }}
-			}}
-		'''
-		formatted_query_string = query_string.format(first=batch_size, skip=skips)
-
-		response = self.client.execute(gql(formatted_query_string));
-		if self.client == "CUSTOM":
-			response = self.callCustomEndpoint(formatted_query_string);
-		else:
-			response = self.client.execute(gql(formatted_query_string))
-		return(response)
+	def chunkPoolIds(self, pool_ids, batch_size):
+		# ({lowercase id: caller's id}, [chunk of lowercase ids, ...])
+		batch_size = min(batch_size, self.MAX_PAGE_SIZE);
+		input_ids = {};
+		for pool_id in pool_ids:
+			input_ids[pool_id.lower()] = pool_id;
+		lower_ids = list(input_ids.keys());
+		chunks = [lower_ids[start:start + batch_size] for start in range(0, len(lower_ids), batch_size)];
+		return(input_ids, chunks);
+
+	def buildPoolsByIdQuery(self, chunk, fields):
+		return(self.POOLS_ID_IN_QUERY.format(fields=fields), {"first":len(chunk), "ids":chunk});
+
+	def queryPoolsById(self, pool_ids, fields, batch_size=LOOKUP_BATCH_SIZE, verbose=False):
+		# {poolId: pool} for pool_ids, looked up with id_in in chunks of batch_size ids per request
+		(input_ids, chunks) = self.chunkPoolIds(pool_ids, batch_size);
+		pools = {};
+		for i, chunk in enumerate(chunks):
+			if verbose:
+				print("Querying pool chunk", i + 1, "of", len(chunks), "...")
+			response = self.execute(*self.buildPoolsByIdQuery(chunk, fields));
+			for pool in response["pools"]:
+				pools[input_ids[pool["id"]]] = pool;
+		return(pools)
+
+	def getPoolTokensBatch(self, pool_ids, batch_size=LOOKUP_BATCH_SIZE, verbose=False):
+		# getPoolTokens for many pools: {poolId: [token, ...]}
+		pools = self.queryPoolsById(pool_ids, self.POOL_TOKENS_BATCH_FIELDS, batch_size=batch_size, verbose=verbose);
+		pool_tokens = {};
+		for pool_id in pools.keys():
+			pool_tokens[pool_id] = pools[pool_id]["tokens"];
+		return(pool_tokens)
+
+	def getPoolBptPriceEstimateBatch(self, pool_ids, batch_size=LOOKUP_BATCH_SIZE, verbose=False):
+		# getPoolBptPriceEstimate for many pools: {poolId: pricePerBpt}, None for pools without shares
+		pools = self.queryPoolsById(pool_ids, "totalShares totalLiquidity", batch_size=batch_size, verbose=verbose);
+		return(self.collectBptPrices(pools))
+
+	def collectBptPrices(self, pools):
+		prices = {};
+		for pool_id in pools.keys():
+			pool = pools[pool_id];
+			if float(pool["totalShares"]) == 0:
+				prices[pool_id] = None;
+			else:
+				prices[pool_id] = float(pool["totalLiquidity"])/float(pool["totalShares"]);
+		return(prices)
+
+	def getPoolsAndTokens(self, batch_size, skips, verbose=False, last_id=None):
+		return(self.queryPools(batch_size, skips, self.POOL_TOKEN_ADDRESS_FIELDS, last_id=last_id, verbose=verbose))
 
 def main():
 	
@@ -0,0 +1,257 @@
+# basics
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class SubgraphMirror(object):
+
+	"""
+	Local SQLite copy of the pools and pool tokens of a Balancer subgraph.
+		The first sync() downloads every pool with its tokens. Later syncs only
+		fetch pools and pool tokens changed since the last synced block (using
+		the subgraph's _change_block filter), so a restarted service is ready
+		after a small catch-up instead of a full remote scan. The last
+		reorgMarginBlocks blocks are fetched again each time, so entities the
+		graph node reverted and re-indexed below the synced block aren't missed.
+
+		Incremental syncs can't see entities that were removed (or stopped
+		matching) upstream, so every fullSyncIntervalSec a sync also starts a
+		background sweep that downloads everything again and deletes what the
+		subgraph no longer returns; the local data keeps being served and
+		synced meanwhile. sync(full=True) runs that sweep inline.
+
+		getV2PoolIDs, getV2Pools and getPoolTokens return the same shapes as
+		the TheGraph methods of the same name, served from local indexes.
+	"""
+
+	POOL_FIELDS = "address poolType strategyType swapFee";
+	TOKEN_FIELDS = "poolId { id } symbol name decimals address balance weight";
+
+	# full download + deletion sweep at most this often; None disables the periodic sweep
+	fullSyncIntervalSec = 24 * 3600;
+
+	# blocks below the synced block fetched again by incremental syncs
+	reorgMarginBlocks = 50;
+
+	SCHEMA = [
+		"""CREATE TABLE IF NOT EXISTS pools (
+			id TEXT PRIMARY KEY,
+			address TEXT,
+			poolType TEXT,
+			data TEXT NOT NULL)""",
+		"CREATE INDEX IF NOT EXISTS poolsByType ON pools (poolType)",
+		"""CREATE TABLE IF NOT EXISTS poolTokens (
+			id TEXT PRIMARY KEY,
+			poolId TEXT NOT NULL,
+			address TEXT,
+			data TEXT NOT NULL)""",
+		"CREATE INDEX IF NOT EXISTS poolTokensByPool ON poolTokens (poolId)",
+		"CREATE INDEX IF NOT EXISTS poolTokensByAddress ON poolTokens (address)",
+		"CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+	];
+
+	def __init__(self, graph, db_path):
+		super(SubgraphMirror, self).__init__()
+		self.graph = graph;
+		self.db_path = db_path;
+		directory = os.path.dirname(db_path);
+		if not directory == "" and not os.path.isdir(directory):
+			os.makedirs(directory, exist_ok=True);
+		self.lock = threading.Lock();
+		self.db = sqlite3.connect(db_path, check_same_thread=False);
+		with self.lock, self.db:
+			for statement in self.SCHEMA:
+				self.db.execute(statement);
+		self.syncLock = threading.Lock(); # one sync (or end of a background sweep) at a time
+		self.fullSyncThread = None;
+		self.stopping = threading.Event();
+
+	def close(self):
+		# a background sweep stops at its next page
+		self.stopping.set();
+		if not self.fullSyncThread is None:
+			self.fullSyncThread.join();
+		self.db.close();
+
+	def getMeta(self, key):
+		with self.lock:
+			row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone();
+		if row is None:
+			return(None);
+		return(json.loads(row[0]));
+
+	def getSyncedBlock(self):
+		return(self.getMeta("block"));
+
+	# =====================
+	# =======syncing=======
+	# =====================
+	def storePools(self, pools):
+		rows = [];
+		token_rows = [];
+		for pool in pools:
+			tokens = pool.pop("tokens", None);
+			rows.append((pool["id"], pool["address"].lower(), pool["poolType"], json.dumps(pool)));
+			if not tokens is None:
+				token_rows.extend([self.tokenRow(token) for token in tokens]);
+		with self.lock, self.db:
+			self.db.executemany("INSERT OR REPLACE INTO pools VALUES (?, ?, ?, ?)", rows);
+			self.db.executemany("INSERT OR REPLACE INTO poolTokens VALUES (?, ?, ?, ?)", token_rows);
+
+	def tokenRow(self, token):
+		return((token["id"], token["poolId"]["id"], token["address"].lower(), json.dumps(token)));
+
+	def storeTokens(self, tokens):
+		with self.lock, self.db:
+			self.db.executemany("INSERT OR REPLACE INTO poolTokens VALUES (?, ?, ?, ?)", [self.tokenRow(token) for token in tokens]);
+
+	def storeBlock(self, block):
+		with self.lock, self.db:
+			self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("block", json.dumps(block)));
+			self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("stamp", json.dumps(time.time())));
+
+	def deleteMissing(self, pool_ids, token_ids):
+		# drops every row a full download didn't return; returns the number of rows deleted
+		deleted = 0;
+		with self.lock, self.db:
+			for (table, ids) in [("pools", pool_ids), ("poolTokens", token_ids)]:
+				stale = [(row[0],) for row in self.db.execute("SELECT id FROM " + table).fetchall() if not row[0] in ids];
+				self.db.executemany("DELETE FROM " + table + " WHERE id = ?", stale);
+				deleted += len(stale);
+		return(deleted);
+
+	def needsFullSync(self):
+		lastFullSync = self.getMeta("fullSyncStamp");
+		if lastFullSync is None:
+			return(True);
+		return(not self.fullSyncIntervalSec is None and time.time() - lastFullSync >= self.fullSyncIntervalSec);
+
+	def fullSync(self, head, batch_size, partitions, verbose):
+		if verbose:
+			print("Mirroring every pool up to block", head, "...")
+		fields = "id " + self.POOL_FIELDS + " tokens { id " + self.TOKEN_FIELDS + " }";
+		pool_ids = set();
+		token_ids = set();
+		pools = [];
+		for pool in self.graph.iteratePools(batch_size, fields, partitions=partitions, verbose=verbose):
+			if self.stopping.is_set():
+				return;
+			pool_ids.add(pool["id"]);
+			token_ids.update([token["id"] for token in pool["tokens"]]);
+			pools.append(pool);
+			if len(pools) >= batch_size:
+				self.storePools(pools);
+				pools = [];
+		self.storePools(pools);
+		deleted = self.deleteMissing(pool_ids, token_ids);
+		if verbose:
+			print("Mirrored", len(pool_ids), "pools, removed", deleted, "pools and pool tokens gone from the subgraph")
+		with self.lock, self.db:
+			self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("fullSyncStamp", json.dumps(time.time())));
+
+	def backgroundFullSync(self, batch_size, partitions, verbose):
+		try:
+			head = self.graph.getIndexedBlock(verbose=verbose);
+			self.fullSync(head, batch_size, partitions, verbose);
+			# incremental syncs that ran meanwhile may have been overwritten (or deleted): catch up from the sweep's head
+			with self.syncLock:
+				synced = self.getSyncedBlock();
+				if not synced is None and synced > head:
+					self.storeBlock(head);
+		except Exception as error:
+			print("[WARNING] Subgraph mirror full sync failed:", error);
+
+	def startFullSync(self, batch_size=1000, partitions=1, verbose=False):
+		# returns the sweep thread, or None when one is already running
+		if not self.fullSyncThread is None and self.fullSyncThread.is_alive():
+			return(None);
+		self.fullSyncThread = threading.Thread(target=self.backgroundFullSync, args=(batch_size, partitions, verbose), daemon=True);
+		self.fullSyncThread.start();
+		return(self.fullSyncThread);
+
+	def sync(self, batch_size=1000, partitions=1, full=False, verbose=False):
+		# returns the subgraph block the mirror is now synced to
+		# the head is read first: anything changed while fetching is fetched again next sync
+		head = self.graph.getIndexedBlock(verbose=verbose);
+		synced = self.getSyncedBlock();
+		full = full or synced is None;
+		if not full and self.needsFullSync():
+			self.startFullSync(batch_size, partitions, verbose);
+		if not full and head == synced:
+			return(synced);
+
+		with self.syncLock:
+			if full:
+				self.fullSync(head, batch_size, partitions, verbose);
+			else:
+				# a head below the synced block means the graph node rewound: refetch from there
+				fromBlock = max(0, min(synced, head) + 1 - self.reorgMarginBlocks);
+				if verbose:
+					print("Mirroring changes in blocks", fromBlock, "through", head, "...")
+				where = {"_change_block":{"number_gte":fromBlock}};
+				pools = list(self.graph.iterateEntities("pools", self.POOL_FIELDS, batch_size, where=where, verbose=verbose));
+				self.storePools(pools);
+				tokens = list(self.graph.iterateEntities("poolTokens", self.TOKEN_FIELDS, batch_size, where=where, verbose=verbose));
+				self.storeTokens(tokens);
+				if verbose:
+					print("Updated", len(pools), "pools and", len(tokens), "pool tokens")
+			self.storeBlock(head);
+		return(head);
+
+	# =====================
+	# =======queries=======
+	# =====================
+	def getPoolTokens(self, pool_id):
+		with self.lock:
+			rows = self.db.execute("SELECT data FROM poolTokens WHERE poolId = ? ORDER BY id", (pool_id.lower(),)).fetchall();
+		return([json.loads(row[0]) for row in rows]);
+
+	def getPoolIdsByToken(self, token_address):
+		with self.lock:
+			rows = self.db.execute("SELECT DISTINCT poolId FROM poolTokens WHERE address = ? ORDER BY poolId", (token_address.lower(),)).fetchall();
+		return([row[0] for row in rows]);
+
+	def getV2Pools(self):
+		with self.lock:
+			pool_rows = self.db.execute("SELECT id, data FROM pools ORDER BY id").fetchall();
+			token_rows = self.db.execute("SELECT poolId, data FROM poolTokens ORDER BY poolId, id").fetchall();
+
+		tokens_by_pool = {};
+		for (pool_id, data) in token_rows:
+			if pool_id not in tokens_by_pool.keys():
+				tokens_by_pool[pool_id] = [];
+			tokens_by_pool[pool_id].append(json.loads(data));
+
+		pool_tokens = {};
+		for (pool_id, data) in pool_rows:
+			pool = json.loads(data);
+			pool_data = {};
+			pool_data["tokens"] = tokens_by_pool.get(pool_id, []);
+			pool_data["poolType"] = pool["poolType"];
+			pool_data["swapFee"] = pool["swapFee"];
+			pool_tokens[pool_id] = pool_data;
+		return(pool_tokens)
+
+	def getV2PoolIDs(self, pool_filter=None):
+		with self.lock:
+			rows = self.db.execute("SELECT id, poolType FROM pools ORDER BY id").fetchall();
+
+		poolIdsByType = {};
+		for (pool_id, pool_type) in rows:
+			if not pool_filter is None and not pool_filter.lower() in pool_type.lower():
+				continue;
+			if pool_type not in poolIdsByType.keys():
+				poolIdsByType[pool_type] = [];
+			poolIdsByType[pool_type].append(pool_id)
+
+		header = {};
+		header["stamp"] = self.getMeta("stamp");
+		header["block"] = self.getSyncedBlock();
+		header["numPools"] = sum([len(ids) for ids in poolIdsByType.values()]);
+
+		data = {};
+		data["header"] = header;
+		data["pools"] = poolIdsByType
+		return(data)
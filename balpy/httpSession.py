@@ -0,0 +1,70 @@
+# httpSession.py
+
+# python basics
+import threading
+from urllib.parse import urlparse
+
+# http
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class HttpSession(requests.Session):
+
+	"""
+	requests.Session with keep-alive connection pools, a default timeout and
+	a cap on concurrent requests per host.
+
+	One session is shared by every HTTP call site (Etherscan, Balancer API,
+	gas station, subgraph and the web3 HTTPProvider), so repeated requests
+	to a host reuse an open TCP+TLS connection instead of handshaking again.
+	Responses are gzip-encoded whenever the server supports it.
+	"""
+
+	def __init__(self, timeoutSec=30, maxConnectionsPerHost=16, maxConcurrentPerHost=8, retries=3):
+		super(HttpSession, self).__init__();
+		self.timeoutSec = timeoutSec;
+		self.maxConcurrentPerHost = maxConcurrentPerHost;
+		self.hostLock = threading.Lock();
+		self.hostSemaphores = {};
+
+		# connection errors and 5xx on idempotent requests are retried by urllib3
+		retry = Retry(total=retries, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504]);
+		# pool_maxsize is the keep-alive connections kept per host (pool_connections counts hosts)
+		adapter = HTTPAdapter(pool_maxsize=maxConnectionsPerHost, max_retries=retry);
+		self.mount("http://", adapter);
+		self.mount("https://", adapter);
+		self.headers.update({"Accept-Encoding":"gzip, deflate"});
+
+	def getHostSemaphore(self, url):
+		host = urlparse(url).netloc;
+		with self.hostLock:
+			if not host in self.hostSemaphores.keys():
+				self.hostSemaphores[host] = threading.BoundedSemaphore(self.maxConcurrentPerHost);
+			return(self.hostSemaphores[host]);
+
+	def request(self, method, url, **kwargs):
+		if kwargs.get("timeout") is None:
+			kwargs["timeout"] = self.timeoutSec;
+		with self.getHostSemaphore(url):
+			return(super(HttpSession, self).request(method, url, **kwargs));
+
+session = None;
+sessionLock = threading.Lock();
+
+def getSession():
+	# one session per process, shared by every balpy and TheGraph instance
+	global session;
+	if session is None:
+		with sessionLock:
+			if session is None:
+				session = HttpSession();
+	return(session);
+
+def setSession(newSession):
+	# replace the shared session (e.g. with other timeouts or limits); returns the previous one
+	global session;
+	with sessionLock:
+		previous = session;
+		session = newSession;
+	return(previous);
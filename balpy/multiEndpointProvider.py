@@ -0,0 +1,279 @@
+# multiEndpointProvider.py
+
+# python basics
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# low level web3
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+from web3._utils.encoding import Web3JsonEncoder
+
+# balpy modules
+from .httpSession import getSession
+
+class RpcEndpoint(object):
+
+	"""
+	One RPC node and its smoothed latency and error rate.
+	"""
+
+	# weight of the newest sample in the moving averages
+	SMOOTHING = 0.2;
+
+	def __init__(self, uri, session=None):
+		self.uri = uri;
+		self.session = session if not session is None else getSession();
+		self.provider = Web3.HTTPProvider(uri, session=self.session);
+		self.lock = threading.Lock();
+		self.latencySec = None;
+		self.errorRate = 0.0;
+		self.downUntil = 0;
+		self.consecutiveErrors = 0;
+		self.headBlock = None; # highest block number this node has served
+
+	def recordSuccess(self, seconds):
+		with self.lock:
+			if self.latencySec is None:
+				self.latencySec = seconds;
+			else:
+				self.latencySec += self.SMOOTHING * (seconds - self.latencySec);
+			self.errorRate -= self.SMOOTHING * self.errorRate;
+			self.consecutiveErrors = 0;
+
+	def recordFailure(self, cooldownSec):
+		with self.lock:
+			self.errorRate += self.SMOOTHING * (1.0 - self.errorRate);
+			self.consecutiveErrors += 1;
+			# back off longer from a node that keeps failing
+			self.downUntil = time.time() + cooldownSec * 2**min(self.consecutiveErrors - 1, 5);
+
+	def recordHead(self, blockNumber):
+		with self.lock:
+			if self.headBlock is None or blockNumber > self.headBlock:
+				self.headBlock = blockNumber;
+
+	def hasBlock(self, blockNumber):
+		return(not self.headBlock is None and self.headBlock >= blockNumber);
+
+	def isHealthy(self):
+		return(time.time() >= self.downUntil);
+
+	def score(self):
+		# untested nodes are tried before known-slow ones
+		latency = 0.0 if self.latencySec is None else self.latencySec;
+		return(latency * (1.0 + 4.0 * self.errorRate));
+
+class MultiEndpointProvider(JSONBaseProvider):
+
+	"""
+	web3 provider spreading requests over several RPC endpoints.
+
+	Reads go to the healthy endpoint with the lowest smoothed latency
+	(weighted by its error rate) and fail over to the next one on errors.
+	With hedgeDelaySec set, a read still pending after that long is also
+	sent to the runner-up and the first answer wins.
+
+	Transaction sends and the reads that must agree with them (nonces,
+	pending transactions) are pinned to one endpoint, which only changes
+	when it fails, so the nonce count and mempool view stay consistent.
+
+	Reads at an explicit block number go to endpoints known to have served
+	that block (the fastest of them), or else to the most advanced one, so a
+	head read on one node followed by reads at that block never lands on a
+	node that is still behind.
+	"""
+
+	PINNED_METHODS = ["eth_sendRawTransaction", "eth_sendTransaction", "eth_getTransactionCount", "eth_getTransactionByHash"];
+
+	# position of the block parameter of methods that read state at a block
+	BLOCK_PARAM_INDEX = {	"eth_call":1,
+							"eth_estimateGas":1,
+							"eth_getBalance":1,
+							"eth_getCode":1,
+							"eth_getStorageAt":2,
+							"eth_getTransactionCount":1,
+							"eth_getBlockByNumber":0,
+							"eth_getBlockTransactionCountByNumber":0,
+							"eth_getTransactionByBlockNumberAndIndex":0};
+
+	# JSON-RPC error codes meaning the node (not the request) is at fault
+	ENDPOINT_ERROR_CODES = [-32005, 429];
+
+	def __init__(self, endpointUris, session=None, hedgeDelaySec=None, cooldownSec=5.0):
+		super(MultiEndpointProvider, self).__init__();
+		if len(endpointUris) == 0:
+			raise ValueError("MultiEndpointProvider needs at least one endpoint");
+		self.endpoints = [RpcEndpoint(uri, session) for uri in endpointUris];
+		self.hedgeDelaySec = hedgeDelaySec;
+		self.cooldownSec = cooldownSec;
+		self.pinned = self.endpoints[0];
+		self.executor = ThreadPoolExecutor(max_workers=2 * len(self.endpoints));
+
+	def __str__(self):
+		return("RPC connection to " + ", ".join([e.uri for e in self.endpoints]));
+
+	def close(self):
+		self.executor.shutdown(wait=False);
+
+	@classmethod
+	def parseBlockNumber(cls, block):
+		# explicit block numbers only; tags like "latest" can be served by any node
+		if isinstance(block, int):
+			return(block);
+		if isinstance(block, str) and block.startswith("0x"):
+			return(int(block, 16));
+		return(None);
+
+	@classmethod
+	def getRequestBlock(cls, method, params):
+		# highest explicit block number a request reads at, or None
+		if not isinstance(params, (list, tuple)):
+			return(None);
+		if method == "eth_getLogs" and len(params) > 0 and isinstance(params[0], dict):
+			blocks = [cls.parseBlockNumber(params[0].get(key)) for key in ["fromBlock", "toBlock"]];
+			blocks = [b for b in blocks if not b is None];
+			return(max(blocks) if len(blocks) > 0 else None);
+		index = cls.BLOCK_PARAM_INDEX.get(method);
+		if index is None or len(params) <= index:
+			return(None);
+		return(cls.parseBlockNumber(params[index]));
+
+	@classmethod
+	def getBatchBlock(cls, payload):
+		blocks = [cls.getRequestBlock(request["method"], request.get("params")) for request in payload];
+		blocks = [b for b in blocks if not b is None];
+		return(max(blocks) if len(blocks) > 0 else None);
+
+	@classmethod
+	def getServedBlock(cls, method, response):
+		# block number a response proves the node has
+		if not isinstance(response, dict):
+			return(None);
+		result = response.get("result");
+		if method == "eth_blockNumber":
+			return(cls.parseBlockNumber(result));
+		if method in ["eth_getBlockByNumber", "eth_getBlockByHash"] and isinstance(result, dict):
+			return(cls.parseBlockNumber(result.get("number")));
+		return(None);
+
+	def recordServedBlocks(self, endpoint, method, params, response):
+		if method is None:
+			methods = {};
+			for request in params:
+				methods[request.get("id")] = request["method"];
+			served = [self.getServedBlock(methods.get(r.get("id")), r) for r in response if isinstance(r, dict)];
+		else:
+			served = [self.getServedBlock(method, response)];
+		served = [b for b in served if not b is None];
+		if len(served) > 0:
+			endpoint.recordHead(max(served));
+
+	def rankEndpoints(self):
+		healthy = [e for e in self.endpoints if e.isHealthy()];
+		down = [e for e in self.endpoints if not e.isHealthy()];
+		# nodes cooling down are still tried last rather than failing outright
+		return(sorted(healthy, key=lambda e: e.score()) + sorted(down, key=lambda e: e.downUntil));
+
+	def blockEndpoints(self, blockNumber):
+		# nodes known to have the block (fastest first), then the most advanced ones
+		ranked = self.rankEndpoints();
+		current = [e for e in ranked if e.hasBlock(blockNumber)];
+		behind = [e for e in ranked if not e.hasBlock(blockNumber)];
+		behind.sort(key=lambda e: -1 if e.headBlock is None else e.headBlock, reverse=True);
+		return(current + behind);
+
+	def pinnedEndpoints(self):
+		pinned = self.pinned;
+		rest = [e for e in self.endpoints if not e is pinned];
+		if pinned.isHealthy():
+			return([pinned] + rest);
+		return([e for e in rest if e.isHealthy()] + [pinned] + [e for e in rest if not e.isHealthy()]);
+
+	def postBatch(self, endpoint, payload):
+		response = endpoint.session.post(endpoint.uri, data=json.dumps(payload, cls=Web3JsonEncoder), headers={"Content-Type":"application/json"});
+		response.raise_for_status();
+		return(response.json());
+
+	def requestEndpoint(self, endpoint, method, params):
+		tStart = time.time();
+		try:
+			if method is None:
+				# params is a whole JSON-RPC batch array
+				response = self.postBatch(endpoint, params);
+			else:
+				response = endpoint.provider.make_request(method, params);
+		except Exception as error:
+			endpoint.recordFailure(self.cooldownSec);
+			raise error;
+		if isinstance(response, list):
+			endpoint.recordSuccess(time.time() - tStart);
+			self.recordServedBlocks(endpoint, method, params, response);
+			return(response);
+		if "error" in response and isinstance(response["error"], dict) and response["error"].get("code") in self.ENDPOINT_ERROR_CODES:
+			endpoint.recordFailure(self.cooldownSec);
+			raise ConnectionError(endpoint.uri + ": " + str(response["error"]));
+		endpoint.recordSuccess(time.time() - tStart);
+		self.recordServedBlocks(endpoint, method, params, response);
+		return(response);
+
+	def hedgedRequest(self, first, second, method, params):
+		futures = [self.executor.submit(self.requestEndpoint, first, method, params)];
+		done, pending = wait(futures, timeout=self.hedgeDelaySec);
+		if len(done) == 0 or not futures[0].exception() is None:
+			futures.append(self.executor.submit(self.requestEndpoint, second, method, params));
+		lastError = None;
+		while len(futures) > 0:
+			done, pending = wait(futures, return_when=FIRST_COMPLETED);
+			for future in done:
+				if future.exception() is None:
+					return(future.result());
+				lastError = future.exception();
+			futures = list(pending);
+		raise lastError;
+
+	def makeBatchRequest(self, payload):
+		# a batch holding any pinned method (nonces, pending transactions) must see the pinned node's mempool
+		isPinned = any([request["method"] in self.PINNED_METHODS for request in payload]);
+		return(self.sendRequest(None, payload, isPinned, self.getBatchBlock(payload)));
+
+	def makePinnedRequest(self, method, params):
+		# the pinned endpoint only, without failover: for answers only that node can give
+		return(self.requestEndpoint(self.pinned, method, params));
+
+	def make_request(self, method, params):
+		return(self.sendRequest(method, params, method in self.PINNED_METHODS, self.getRequestBlock(method, params)));
+
+	def sendRequest(self, method, params, isPinned, blockNumber=None):
+		if isPinned:
+			endpoints = self.pinnedEndpoints();
+		elif not blockNumber is None:
+			endpoints = self.blockEndpoints(blockNumber);
+		else:
+			endpoints = self.rankEndpoints();
+
+		# a hedge for a read at a block must also go to a node that has the block
+		canHedge = not isPinned and not self.hedgeDelaySec is None and len(endpoints) > 1;
+		if canHedge and not blockNumber is None:
+			canHedge = endpoints[1].hasBlock(blockNumber);
+
+		lastError = None;
+		start = 0;
+		if canHedge:
+			try:
+				return(self.hedgedRequest(endpoints[0], endpoints[1], method, params));
+			except Exception as error:
+				lastError = error;
+				start = 2;
+
+		for endpoint in endpoints[start:]:
+			try:
+				response = self.requestEndpoint(endpoint, method, params);
+				if isPinned:
+					self.pinned = endpoint;
+				return(response);
+			except Exception as error:
+				lastError = error;
+		raise lastError;
@@ -0,0 +1,183 @@
+# multicallBatch.py
+
+# python basics
+import threading
+import time
+
+# http
+from requests.exceptions import Timeout
+
+# low level web3
+from web3._utils.abi import get_abi_output_types
+
+# lowercase fragments of node errors a smaller request can avoid
+CHUNK_LIMIT_MESSAGES = [	"out of gas",
+							"gas required exceeds",
+							"gas limit",
+							"too large",
+							"too big",
+							"response size",
+							"limit exceeded",
+							"query returned more than",
+							"too many",
+							"timeout",
+							"timed out"];
+
+def isChunkLimitError(error):
+	# gas or response size limits and timeouts; anything else (node down, pruned state...) is not about size
+	if isinstance(error, (Timeout, TimeoutError)):
+		return(True);
+	message = str(error).lower();
+	for limitMessage in CHUNK_LIMIT_MESSAGES:
+		if limitMessage in message:
+			return(True);
+	return(False);
+
+class AdaptiveChunkSize(object):
+
+	"""
+	Calls per multicall chunk, shared by all batches of one client.
+
+	Grows while full chunks come back well under targetSeconds, shrinks in
+	proportion when they take longer, and halves below any chunk that failed
+	(gas or response size limits, timeouts).
+	"""
+
+	def __init__(self, initial=500, minimum=1, maximum=5000, targetSeconds=2.0):
+		self.size = initial;
+		self.minimum = minimum;
+		self.maximum = maximum;
+		self.targetSeconds = targetSeconds;
+		self.lock = threading.Lock();
+
+	def get(self):
+		return(self.size);
+
+	def recordSuccess(self, numCalls, seconds):
+		with self.lock:
+			# partial chunks say little about how far the size can grow
+			if numCalls < self.size:
+				return;
+			if seconds < self.targetSeconds / 2:
+				self.size = min(self.maximum, int(self.size * 1.5) + 1);
+			elif seconds > self.targetSeconds:
+				self.size = max(self.minimum, int(self.size * self.targetSeconds / seconds));
+
+	def recordFailure(self, numCalls):
+		with self.lock:
+			self.size = max(self.minimum, min(self.size, numCalls // 2));
+
+class MulticallBatch(object):
+
+	"""
+	Batch of read calls aggregated through Multicall3.tryBlockAndAggregate.
+
+	Takes the same addCall arguments as multicaller, but every chunk of the
+	batch reads the same block and execute() returns that block number with
+	the results, so outputs can be cached and deduplicated per block.
+
+	Calls are split into chunks of chunkSize (an int or a shared
+	AdaptiveChunkSize) and run on executor when one is given. A chunk that
+	fails on a gas, size or timeout limit is bisected until the halves
+	succeed, and single calls are retried up to maxRetries times before the
+	error is raised. Any other error is raised right away. An empty batch
+	makes no RPC call at all.
+	"""
+
+	# calls per eth_call when no chunk size is given
+	DEFAULT_CHUNK_SIZE = 1000;
+
+	def __init__(self, web3, multicallContract, chunkSize=DEFAULT_CHUNK_SIZE, executor=None, maxRetries=3, retryDelaySec=0.5):
+		self.web3 = web3;
+		self.multicallContract = multicallContract;
+		if isinstance(chunkSize, int):
+			chunkSize = AdaptiveChunkSize(initial=chunkSize, minimum=chunkSize, maximum=chunkSize);
+		self.chunkSize = chunkSize;
+		self.executor = executor;
+		self.maxRetries = maxRetries;
+		self.retryDelaySec = retryDelaySec;
+		self.contracts = {};
+		self.calls = [];
+		self.decoders = [];
+
+	def getContract(self, address, abi):
+		# the stored contract keeps abi alive, so its id stays unique for this batch
+		key = (address, id(abi));
+		if not key in self.contracts.keys():
+			self.contracts[key] = self.web3.eth.contract(self.web3.toChecksumAddress(address), abi=abi);
+		return(self.contracts[key]);
+
+	def addCall(self, address, abi, functionName, args=None):
+		contract = self.getContract(address, abi);
+		if args is None:
+			args = [];
+		callData = contract.encodeABI(fn_name=functionName, args=args);
+		fn = contract.get_function_by_name(functionName);
+
+		self.calls.append((contract.address, callData));
+		self.decoders.append(get_abi_output_types(fn.abi));
+
+	def resolveBlock(self, block_identifier):
+		# chunks are separate eth_calls, so a tag like "latest" must be pinned first
+		if isinstance(block_identifier, int):
+			return(block_identifier);
+		return(self.web3.eth.get_block(block_identifier)["number"]);
+
+	def executeChunk(self, chunk, block_identifier):
+		# returns (blockNumber, [(success, rawOutput), ...]) for the calls in chunk
+		retries = 0;
+		while True:
+			try:
+				tStart = time.time();
+				(blockNumber, blockHash, results) = self.multicallContract.functions.tryBlockAndAggregate(False, chunk).call(block_identifier=block_identifier);
+				self.chunkSize.recordSuccess(len(chunk), time.time() - tStart);
+				return(blockNumber, results);
+			except Exception as e:
+				if not isChunkLimitError(e):
+					raise e;
+				if len(chunk) > 1:
+					self.chunkSize.recordFailure(len(chunk));
+					# both halves must read the same block as the rest of the batch
+					block_identifier = self.resolveBlock(block_identifier);
+					middle = len(chunk) // 2;
+					(blockNumber, left) = self.executeChunk(chunk[:middle], block_identifier);
+					(blockNumber, right) = self.executeChunk(chunk[middle:], block_identifier);
+					return(blockNumber, left + right);
+				retries += 1;
+				if retries > self.maxRetries:
+					raise e;
+				time.sleep(self.retryDelaySec * 2**(retries - 1));
+
+	def execute(self, block_identifier="latest"):
+		# nothing to read: no RPC, and no block number unless one was given
+		if len(self.calls) == 0:
+			return([], [], block_identifier if isinstance(block_identifier, int) else None);
+
+		chunkSize = self.chunkSize.get();
+		if len(self.calls) > chunkSize:
+			block_identifier = self.resolveBlock(block_identifier);
+
+		chunks = [self.calls[start:start + chunkSize] for start in range(0, len(self.calls), chunkSize)];
+		if self.executor is None or len(chunks) < 2:
+			chunkResults = [self.executeChunk(chunk, block_identifier) for chunk in chunks];
+		else:
+			chunkResults = list(self.executor.map(lambda chunk: self.executeChunk(chunk, block_identifier), chunks));
+
+		outputData = [];
+		successes = [];
+		blockNumber = None;
+		results = [];
+		for (blockNumber, chunkResult) in chunkResults:
+			results.extend(chunkResult);
+
+		for (success, rawOutput), decoder in zip(results, self.decoders):
+			# empty output means the call hit a fallback function
+			currOutputData = None;
+			if success and not rawOutput == b'':
+				currOutputData = self.web3.codec.decode_abi(decoder, rawOutput);
+			outputData.append(currOutputData);
+			successes.append(success);
+
+		if blockNumber is None:
+			blockNumber = self.resolveBlock(block_identifier);
+		return(outputData, successes, blockNumber);
@@ -0,0 +1,136 @@
+# nonceManager.py
+
+# python basics
+import threading
+
+# balpy modules
+from .rpcBatch import RpcBatch
+
+class NonceManager(object):
+
+	"""
+	Allocates nonces for one account locally, so transactions can be built and
+	sent back to back without a get_transaction_count round-trip each.
+
+	allocate() hands out the next nonce, sent() and mined() track it until it
+	lands, and release() returns a nonce that was never sent so the gap is
+	filled by the next transaction. resync() reloads the count from the node
+	(pending block) after a send error; checkPending() drops transactions
+	that were mined or replaced and rewinds past transactions the node they
+	were sent to no longer knows about.
+	"""
+
+	# send errors after which the local count can't be trusted
+	RESYNC_ERRORS = ["nonce too low", "nonce too high", "already known", "replacement transaction underpriced", "known transaction"];
+
+	def __init__(self, web3, address):
+		self.web3 = web3;
+		self.address = address;
+		self.lock = threading.Lock();
+		self.nextNonce = None;
+		self.allocated = set(); # handed out, not sent yet
+		self.released = set();
+		self.pending = {}; # nonce -> txHash
+		self.sentTo = {}; # nonce -> endpoint the transaction was sent through (multi-endpoint providers)
+
+	def getChainNonce(self, block_identifier="pending"):
+		return(self.web3.eth.get_transaction_count(self.address, block_identifier));
+
+	def allocate(self):
+		with self.lock:
+			if self.nextNonce is None:
+				self.nextNonce = self.getChainNonce();
+			if len(self.released) > 0:
+				nonce = min(self.released);
+				self.released.remove(nonce);
+			else:
+				nonce = self.nextNonce;
+				self.nextNonce += 1;
+			self.allocated.add(nonce);
+			return(nonce);
+
+	def release(self, nonce):
+		# nonce was allocated but its transaction was never sent; overrides are ignored
+		with self.lock:
+			if not nonce in self.allocated:
+				return;
+			self.allocated.remove(nonce);
+			if self.nextNonce == nonce + 1:
+				self.nextNonce = nonce;
+			else:
+				self.released.add(nonce);
+
+	def sent(self, nonce, txHash):
+		with self.lock:
+			self.allocated.discard(nonce);
+			self.released.discard(nonce);
+			# overridden nonces at or past the local count must not be handed out again
+			if not self.nextNonce is None:
+				self.nextNonce = max(self.nextNonce, nonce + 1);
+			self.pending[nonce] = txHash;
+			self.sentTo[nonce] = getattr(self.web3.provider, "pinned", None);
+
+	def mined(self, txHash):
+		with self.lock:
+			for nonce in list(self.pending.keys()):
+				if self.pending[nonce] == txHash:
+					del self.pending[nonce];
+					self.sentTo.pop(nonce, None);
+
+	def shouldResync(self, error):
+		message = str(error).lower();
+		return(any([e in message for e in self.RESYNC_ERRORS]));
+
+	def resync(self):
+		chainNonce = self.getChainNonce();
+		with self.lock:
+			# nonces other threads hold but haven't sent yet stay theirs; gaps below them are handed out first
+			self.nextNonce = max([chainNonce] + [nonce + 1 for nonce in self.allocated]);
+			self.released = set([nonce for nonce in range(chainNonce, self.nextNonce) if not nonce in self.allocated]);
+			for nonce in list(self.pending.keys()):
+				if nonce < chainNonce:
+					del self.pending[nonce];
+					self.sentTo.pop(nonce, None);
+
+	def isDropped(self, txHash, sentTo=None):
+		# only the node the transaction was sent to can tell it is gone; any error means "not sure"
+		if not isinstance(txHash, str):
+			txHash = self.web3.toHex(txHash);
+		provider = self.web3.provider;
+		try:
+			if hasattr(provider, "makePinnedRequest"):
+				# after a failover the pinned node may never have seen the transaction
+				if not provider.pinned is sentTo:
+					return(False);
+				response = provider.makePinnedRequest("eth_getTransactionByHash", [txHash]);
+			else:
+				response = provider.make_request("eth_getTransactionByHash", [txHash]);
+		except Exception as error:
+			return(False);
+		return(not "error" in response and response.get("result") is None);
+
+	def checkPending(self):
+		# mined (or replaced) transactions are below the latest count
+		minedNonce = self.getChainNonce("latest");
+		with self.lock:
+			pending = dict(self.pending);
+			sentTo = dict(self.sentTo);
+		unmined = [nonce for nonce in sorted(pending.keys()) if nonce >= minedNonce];
+		batch = RpcBatch(self.web3);
+		for nonce in unmined:
+			batch.add("eth_getTransactionByHash", [pending[nonce]]);
+		(transactions, successes) = batch.execute();
+		dropped = [];
+		for nonce, transaction, success in zip(unmined, transactions, successes):
+			if success and transaction is None and self.isDropped(pending[nonce], sentTo.get(nonce)):
+				dropped.append(nonce);
+
+		with self.lock:
+			for nonce in list(self.pending.keys()):
+				if nonce < minedNonce or nonce in dropped:
+					del self.pending[nonce];
+					self.sentTo.pop(nonce, None);
+			# dropped nonces are handed out again (lowest first) so later pending transactions can land
+			if len(dropped) > 0 and not self.nextNonce is None:
+				self.released.update([n for n in dropped if n < self.nextNonce]);
+		return(dropped);
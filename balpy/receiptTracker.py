@@ -0,0 +1,156 @@
+# receiptTracker.py
+
+# python basics
+import threading
+import time
+from concurrent.futures import Future
+
+# low level web3
+from web3.exceptions import TimeExhausted
+
+# balpy modules
+from .rpcBatch import RpcBatch
+
+class ReceiptTracker(object):
+
+	"""
+	Watches many pending transactions at once from a single background thread.
+
+	Instead of polling every hash, the tracker fetches each new block once
+	(hashes only) and requests receipts just for the tracked transactions it
+	contains, each step as a single JSON-RPC batch. track() returns a Future that resolves to the receipt, or fails
+	with TimeExhausted once the hash has been pending for timeOutSec.
+	Failed polls are reported and retried; after maxPollErrors in a row every
+	tracked Future fails with the last error.
+	"""
+
+	def __init__(self, web3, pollIntervalSec=1.0, maxBlocksPerPoll=50, maxPollErrors=10):
+		self.web3 = web3;
+		self.pollIntervalSec = pollIntervalSec;
+		self.maxBlocksPerPoll = maxBlocksPerPoll;
+		self.maxPollErrors = maxPollErrors;
+		self.pollErrors = 0;
+		self.lock = threading.Lock();
+		self.thread = None;
+		self.lastBlock = None;
+		self.futures = {};		# txHash -> Future
+		self.deadlines = {};	# txHash -> time.time() deadline
+		self.unchecked = set();	# hashes that may have been mined before they were tracked
+
+	def normalizeHash(self, txHash):
+		if not isinstance(txHash, str):
+			txHash = txHash.hex();
+		txHash = txHash.lower();
+		if not txHash.startswith("0x"):
+			txHash = "0x" + txHash;
+		return(txHash);
+
+	def track(self, txHash, timeOutSec=120, callback=None):
+		txHash = self.normalizeHash(txHash);
+		with self.lock:
+			if not txHash in self.futures.keys():
+				self.futures[txHash] = Future();
+				self.unchecked.add(txHash);
+			future = self.futures[txHash];
+			self.deadlines[txHash] = max(self.deadlines.get(txHash, 0), time.time() + timeOutSec);
+			if self.thread is None:
+				self.thread = threading.Thread(target=self.run, daemon=True);
+				self.thread.start();
+		if not callback is None:
+			future.add_done_callback(lambda f: callback(f.result()) if f.exception() is None else None);
+		return(future);
+
+	def resolve(self, txHash, receipt=None, error=None):
+		with self.lock:
+			future = self.futures.pop(txHash, None);
+			self.deadlines.pop(txHash, None);
+			self.unchecked.discard(txHash);
+		if future is None or future.done():
+			return;
+		if error is None:
+			future.set_result(receipt);
+		else:
+			future.set_exception(error);
+
+	def checkHashes(self, txHashes):
+		if len(txHashes) == 0:
+			return;
+		batch = RpcBatch(self.web3);
+		for txHash in txHashes:
+			batch.add("eth_getTransactionReceipt", [txHash]);
+		(receipts, successes) = batch.execute();
+		for txHash, receipt in zip(txHashes, receipts):
+			if not receipt is None:
+				self.resolve(txHash, receipt);
+
+	def poll(self):
+		# read the head first so nothing mined while checking new hashes is skipped
+		latest = self.web3.eth.block_number;
+		with self.lock:
+			unchecked = list(self.unchecked);
+			self.unchecked = set();
+		self.checkHashes(unchecked);
+
+		if self.lastBlock is None:
+			# every pending hash was just checked as unchecked
+			self.lastBlock = latest;
+			return;
+		if latest - self.lastBlock > self.maxBlocksPerPoll:
+			# too far behind to walk blocks: check the remaining hashes directly once
+			with self.lock:
+				pending = list(self.futures.keys());
+			self.checkHashes(pending);
+			self.lastBlock = latest;
+			return;
+
+		blockNumbers = list(range(self.lastBlock + 1, latest + 1));
+		batch = RpcBatch(self.web3);
+		for blockNumber in blockNumbers:
+			batch.add("eth_getBlockByNumber", [blockNumber, False]);
+		(blocks, successes) = batch.execute();
+
+		landed = set();
+		lastBlock = self.lastBlock;
+		for blockNumber, block in zip(blockNumbers, blocks):
+			if block is None:
+				# not served yet; walk on from here next poll
+				break;
+			landed.update([self.normalizeHash(h) for h in block["transactions"]]);
+			lastBlock = blockNumber;
+		with self.lock:
+			landed = list(landed.intersection(self.futures.keys()));
+		self.checkHashes(landed);
+		self.lastBlock = lastBlock;
+
+	def expire(self):
+		now = time.time();
+		with self.lock:
+			expired = [h for h in self.deadlines.keys() if self.deadlines[h] < now];
+		for txHash in expired:
+			self.resolve(txHash, error=TimeExhausted("Transaction " + txHash + " is not in the chain after the timeout"));
+
+	def pollFailed(self, error):
+		# transient RPC errors are retried next interval; persistent ones fail every tracked hash
+		self.pollErrors += 1;
+		print("[WARNING] Receipt poll failed (" + str(self.pollErrors) + "/" + str(self.maxPollErrors) + "):", error);
+		if self.pollErrors < self.maxPollErrors:
+			return;
+		self.pollErrors = 0;
+		with self.lock:
+			pending = list(self.futures.keys());
+		for txHash in pending:
+			self.resolve(txHash, error=error);
+
+	def run(self):
+		while True:
+			with self.lock:
+				if len(self.futures) == 0:
+					self.thread = None;
+					return;
+			try:
+				self.poll();
+				self.pollErrors = 0;
+			except Exception as error:
+				self.pollFailed(error);
+			self.expire();
+			time.sleep(self.pollIntervalSec);
@@ -0,0 +1,177 @@
+# rpcBatch.py
+
+# python basics
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+# low level web3
+from web3._utils.encoding import Web3JsonEncoder
+from web3._utils.method_formatters import get_request_formatters, get_result_formatters
+from web3.middleware.geth_poa import geth_poa_cleanup, geth_poa_middleware
+
+# balpy modules
+from .httpSession import getSession
+
+class RpcBatch(object):
+
+	"""
+	Group of JSON-RPC requests sent as one batch array, for reads that can't
+	go through Multicall (blocks, transactions, receipts, nonces, logs).
+
+	Works like MulticallBatch: add() the requests, then execute() returns
+	(results, successes) in the same order. Results get the same formatting
+	as the matching web3.eth call; a request that errors or finds nothing
+	returns None.
+
+	Batched responses don't pass through the web3 middleware onion (its
+	cache middlewares would issue requests of their own), so the one result
+	middleware balpy relies on, geth_poa_middleware, is applied here when
+	the web3 instance has it.
+	"""
+
+	# result formatters of response middlewares, applied before web3's own formatting
+	MIDDLEWARE_RESULT_FORMATTERS = {geth_poa_middleware:{	"eth_getBlockByHash":geth_poa_cleanup,
+															"eth_getBlockByNumber":geth_poa_cleanup}};
+
+	# requests per HTTP call; most nodes cap batch size
+	DEFAULT_MAX_BATCH_SIZE = 100;
+
+	def __init__(self, web3, session=None, maxBatchSize=DEFAULT_MAX_BATCH_SIZE):
+		self.web3 = web3;
+		self.session = session if not session is None else getSession();
+		self.maxBatchSize = maxBatchSize;
+		self.requests = [];
+		self.futures = [];
+
+	def add(self, method, params):
+		# returns a Future resolved by execute()
+		params = get_request_formatters(method)(params);
+		future = Future();
+		self.requests.append((method, params));
+		self.futures.append(future);
+		return(future);
+
+	def sendPayload(self, payload):
+		provider = self.web3.provider;
+		if hasattr(provider, "makeBatchRequest"):
+			return(provider.makeBatchRequest(payload));
+		response = self.session.post(provider.endpoint_uri, data=json.dumps(payload, cls=Web3JsonEncoder), headers={"Content-Type":"application/json"});
+		response.raise_for_status();
+		return(response.json());
+
+	def formatResult(self, method, result):
+		for middleware in self.web3.middleware_onion:
+			formatters = self.MIDDLEWARE_RESULT_FORMATTERS.get(middleware, {});
+			if method in formatters.keys() and not result is None:
+				result = formatters[method](result);
+		return(get_result_formatters(method, self.web3.eth)(result));
+
+	def executeChunk(self, start, end):
+		payload = [];
+		for i in range(start, end):
+			(method, params) = self.requests[i];
+			payload.append({"jsonrpc":"2.0", "method":method, "params":params, "id":i});
+		responses = self.sendPayload(payload);
+		if not isinstance(responses, list):
+			# nodes without batch support answer with a single error object
+			raise ValueError("RPC batch request failed: " + str(responses));
+
+		# responses may come back in any order
+		responsesById = {};
+		for response in responses:
+			responsesById[response.get("id")] = response;
+		for i in range(start, end):
+			(method, params) = self.requests[i];
+			response = responsesById.get(i);
+			if response is None:
+				self.futures[i].set_exception(ValueError("No response to batched " + method));
+			elif "error" in response:
+				self.futures[i].set_exception(ValueError(response["error"]));
+			else:
+				# a result that fails formatting only fails its own request
+				try:
+					result = self.formatResult(method, response["result"]);
+				except Exception as error:
+					self.futures[i].set_exception(error);
+					continue;
+				self.futures[i].set_result(result);
+
+	def execute(self):
+		try:
+			for start in range(0, len(self.requests), self.maxBatchSize):
+				self.executeChunk(start, min(start + self.maxBatchSize, len(self.requests)));
+		except BaseException as error:
+			for future in self.futures:
+				if not future.done():
+					future.set_exception(error);
+			raise error;
+
+		results = [];
+		successes = [];
+		for future in self.futures:
+			success = future.exception() is None;
+			results.append(future.result() if success else None);
+			successes.append(success);
+		return(results, successes);
+
+class RpcBatcher(object):
+
+	"""
+	Coalesces JSON-RPC requests made concurrently from different threads.
+
+	Requests submitted within maxWaitSec of each other (up to maxBatchSize)
+	are sent together as one RpcBatch by a background thread, which exits
+	while there is nothing queued.
+	"""
+
+	def __init__(self, web3, session=None, maxBatchSize=RpcBatch.DEFAULT_MAX_BATCH_SIZE, maxWaitSec=0.005):
+		self.web3 = web3;
+		self.session = session;
+		self.maxBatchSize = maxBatchSize;
+		self.maxWaitSec = maxWaitSec;
+		self.lock = threading.Lock();
+		self.queue = [];
+		self.thread = None;
+
+	def submit(self, method, params):
+		future = Future();
+		with self.lock:
+			self.queue.append((method, params, future));
+			if self.thread is None:
+				self.thread = threading.Thread(target=self.run, daemon=True);
+				self.thread.start();
+		return(future);
+
+	def request(self, method, params):
+		# blocking call; raises the request's error like web3 would
+		return(self.submit(method, params).result());
+
+	def run(self):
+		while True:
+			time.sleep(self.maxWaitSec);
+			with self.lock:
+				queued = self.queue[:self.maxBatchSize];
+				self.queue = self.queue[self.maxBatchSize:];
+				if len(queued) == 0:
+					self.thread = None;
+					return;
+
+			batch = RpcBatch(self.web3, self.session, self.maxBatchSize);
+			callers = [];
+			for (method, params, future) in queued:
+				try:
+					callers.append((batch.add(method, params), future));
+				except BaseException as error:
+					future.set_exception(error);
+			try:
+				batch.execute();
+			except BaseException as error:
+				# already set on every request of the batch
+				pass;
+			for (batchFuture, future) in callers:
+				if batchFuture.exception() is None:
+					future.set_result(batchFuture.result());
+				else:
+					future.set_exception(batchFuture.exception());
@@ -0,0 +1,262 @@
+# vaultIndexer.py
+
+# python basics
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# low level web3
+from web3.exceptions import BlockNotFound
+
+# balpy modules
+from .multicallBatch import AdaptiveChunkSize, isChunkLimitError
+from .rpcBatch import RpcBatch
+
+class VaultIndexer(object):
+
+	"""
+	Local SQLite index of Vault events, filled straight from eth_getLogs.
+
+	sync() scans the Vault for the events in EVENTS over block ranges that
+	grow while the node keeps up and shrink when it refuses a range (too
+	many results, timeouts); other errors, like a node that doesn't have the
+	range's last block yet, are retried maxRetries times without shrinking
+	the range and then raised. Logs are decoded in bulk from the Vault ABI and
+	stored with the hash of the last block of each range as a checkpoint.
+	Before scanning, the newest checkpoints are compared against the chain
+	and everything above the last matching one is dropped, so reorgs near
+	the head are re-indexed instead of leaving orphaned events behind.
+	"""
+
+	EVENTS = ["PoolRegistered", "TokensRegistered", "Swap", "PoolBalanceChanged", "InternalBalanceChanged"];
+
+	# checkpoints kept for reorg detection; a deeper reorg re-indexes from scratch
+	MAX_CHECKPOINTS = 64;
+
+	SCHEMA = [
+		"""CREATE TABLE IF NOT EXISTS events (
+			blockNumber INTEGER NOT NULL,
+			logIndex INTEGER NOT NULL,
+			blockHash TEXT NOT NULL,
+			transactionHash TEXT NOT NULL,
+			event TEXT NOT NULL,
+			poolId TEXT,
+			args TEXT NOT NULL,
+			PRIMARY KEY (blockNumber, logIndex))""",
+		"CREATE INDEX IF NOT EXISTS eventsByPool ON events (poolId, blockNumber)",
+		"CREATE INDEX IF NOT EXISTS eventsByName ON events (event, blockNumber)",
+		"""CREATE TABLE IF NOT EXISTS checkpoints (
+			blockNumber INTEGER PRIMARY KEY,
+			blockHash TEXT NOT NULL)"""
+	];
+
+	def __init__(self, web3, vault, dbPath, startBlock=0, rangeSize=None, maxRetries=3, retryDelaySec=1.0):
+		self.web3 = web3;
+		self.vault = vault;
+		self.dbPath = dbPath;
+		self.startBlock = startBlock;
+		if rangeSize is None:
+			rangeSize = AdaptiveChunkSize(initial=2000, minimum=1, maximum=100000, targetSeconds=5.0);
+		self.rangeSize = rangeSize;
+		self.maxRetries = maxRetries;
+		self.retryDelaySec = retryDelaySec;
+
+		self.decoders = {};
+		for item in vault.abi:
+			if item["type"] == "event" and item["name"] in self.EVENTS:
+				signature = item["name"] + "(" + ",".join([i["type"] for i in item["inputs"]]) + ")";
+				self.decoders[self.web3.keccak(text=signature).hex()] = item;
+
+		directory = os.path.dirname(dbPath);
+		if not directory == "" and not os.path.isdir(directory):
+			os.makedirs(directory);
+		self.lock = threading.Lock();
+		self.db = sqlite3.connect(dbPath, check_same_thread=False);
+		with self.db:
+			for statement in self.SCHEMA:
+				self.db.execute(statement);
+
+	def close(self):
+		self.db.close();
+
+	# =====================
+	# ======decoding=======
+	# =====================
+	def normalize(self, abiType, value):
+		if abiType.endswith("[]"):
+			return([self.normalize(abiType[:-2], v) for v in value]);
+		if abiType == "address":
+			return(self.web3.toChecksumAddress(value));
+		if isinstance(value, (bytes, bytearray)):
+			return("0x" + bytes(value).hex());
+		return(value);
+
+	def decodeLog(self, log):
+		topics = ["0x" + bytes(t).hex() for t in log["topics"]];
+		item = self.decoders.get(topics[0]);
+		if item is None:
+			return(None);
+
+		indexed = [i for i in item["inputs"] if i["indexed"]];
+		unindexed = [i for i in item["inputs"] if not i["indexed"]];
+		data = log["data"];
+		if isinstance(data, str):
+			data = bytes.fromhex(data[2:]);
+		values = self.web3.codec.decode_abi([i["type"] for i in unindexed], data);
+
+		args = {};
+		for i, topic in zip(indexed, topics[1:]):
+			args[i["name"]] = self.normalize(i["type"], self.web3.codec.decode_single(i["type"], bytes.fromhex(topic[2:])));
+		for i, value in zip(unindexed, values):
+			args[i["name"]] = self.normalize(i["type"], value);
+
+		return((log["blockNumber"],
+				log["logIndex"],
+				"0x" + bytes(log["blockHash"]).hex(),
+				"0x" + bytes(log["transactionHash"]).hex(),
+				item["name"],
+				args.get("poolId"),
+				json.dumps(args)));
+
+	# =====================
+	# ======indexing=======
+	# =====================
+	def getCheckpoints(self):
+		with self.lock:
+			return(self.db.execute("SELECT blockNumber, blockHash FROM checkpoints ORDER BY blockNumber DESC").fetchall());
+
+	def rewindTo(self, blockNumber):
+		with self.lock, self.db:
+			self.db.execute("DELETE FROM events WHERE blockNumber > ?", (blockNumber,));
+			self.db.execute("DELETE FROM checkpoints WHERE blockNumber > ?", (blockNumber,));
+
+	def rewindReorgs(self):
+		# returns the last block whose indexed data still matches the chain
+		checkpoints = self.getCheckpoints();
+		if len(checkpoints) == 0:
+			return(self.startBlock - 1);
+		batch = RpcBatch(self.web3);
+		for (blockNumber, blockHash) in checkpoints:
+			batch.add("eth_getBlockByNumber", [blockNumber, False]);
+		(blocks, successes) = batch.execute();
+		if not all(successes):
+			raise ValueError("Could not verify checkpoints of " + self.dbPath);
+
+		for (blockNumber, blockHash), block in zip(checkpoints, blocks):
+			if not block is None and "0x" + bytes(block["hash"]).hex() == blockHash:
+				self.rewindTo(blockNumber);
+				return(blockNumber);
+		self.rewindTo(self.startBlock - 1);
+		return(self.startBlock - 1);
+
+	def fetchRange(self, fromBlock, toBlock):
+		# logs and the hash of the range's last block in one round-trip
+		batch = RpcBatch(self.web3);
+		logs = batch.add("eth_getLogs", [{	"fromBlock":fromBlock,
+											"toBlock":toBlock,
+											"address":self.vault.address,
+											"topics":[list(self.decoders.keys())]}]);
+		block = batch.add("eth_getBlockByNumber", [toBlock, False]);
+		batch.execute();
+		logs = logs.result();
+		block = block.result();
+		if block is None:
+			# a lagging node can't checkpoint the range
+			raise BlockNotFound("Block " + str(toBlock) + " is not available from the node yet");
+		return(logs, "0x" + bytes(block["hash"]).hex());
+
+	def store(self, rows, blockNumber, blockHash):
+		with self.lock, self.db:
+			self.db.executemany("INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", rows);
+			self.db.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?)", (blockNumber, blockHash));
+			self.db.execute("DELETE FROM checkpoints WHERE blockNumber NOT IN (SELECT blockNumber FROM checkpoints ORDER BY blockNumber DESC LIMIT ?)", (self.MAX_CHECKPOINTS,));
+
+	def sync(self, block_identifier="latest", verbose=False):
+		# index every event up to block_identifier; returns the last indexed block
+		toBlock = block_identifier;
+		if not isinstance(toBlock, int):
+			toBlock = self.web3.eth.get_block(block_identifier)["number"];
+		fromBlock = self.rewindReorgs() + 1;
+
+		retries = 0;
+		while fromBlock <= toBlock:
+			endBlock = min(toBlock, fromBlock + self.rangeSize.get() - 1);
+			numBlocks = endBlock - fromBlock + 1;
+			try:
+				tStart = time.time();
+				(logs, blockHash) = self.fetchRange(fromBlock, endBlock);
+				self.rangeSize.recordSuccess(numBlocks, time.time() - tStart);
+			except Exception as e:
+				if numBlocks > 1 and isChunkLimitError(e):
+					self.rangeSize.recordFailure(numBlocks);
+					continue;
+				retries += 1;
+				if retries > self.maxRetries:
+					raise e;
+				time.sleep(self.retryDelaySec * 2**(retries - 1));
+				continue;
+			retries = 0;
+
+			rows = [row for row in [self.decodeLog(log) for log in logs] if not row is None];
+			self.store(rows, endBlock, blockHash);
+			if verbose:
+				print("\tIndexed blocks", fromBlock, "to", endBlock, "(" + str(len(rows)) + " events)");
+			fromBlock = endBlock + 1;
+		return(toBlock);
+
+	# =====================
+	# =======queries=======
+	# =====================
+	def getLastIndexedBlock(self):
+		checkpoints = self.getCheckpoints();
+		if len(checkpoints) == 0:
+			return(None);
+		return(checkpoints[0][0]);
+
+	def getEvents(self, event=None, poolId=None, fromBlock=None, toBlock=None):
+		conditions = [];
+		params = [];
+		if not event is None:
+			conditions.append("event = ?");
+			params.append(event);
+		if not poolId is None:
+			conditions.append("poolId = ?");
+			params.append(poolId.lower());
+		if not fromBlock is None:
+			conditions.append("blockNumber >= ?");
+			params.append(fromBlock);
+		if not toBlock is None:
+			conditions.append("blockNumber <= ?");
+			params.append(toBlock);
+
+		query = "SELECT blockNumber, logIndex, blockHash, transactionHash, event, args FROM events";
+		if len(conditions) > 0:
+			query += " WHERE " + " AND ".join(conditions);
+		query += " ORDER BY blockNumber, logIndex";
+		with self.lock:
+			rows = self.db.execute(query, params).fetchall();
+
+		events = [];
+		for (blockNumber, logIndex, blockHash, transactionHash, name, args) in rows:
+			events.append({	"event":name,
+							"blockNumber":blockNumber,
+							"logIndex":logIndex,
+							"blockHash":blockHash,
+							"transactionHash":transactionHash,
+							"args":json.loads(args)});
+		return(events);
+
+	def getPools(self):
+		# pool discovery: {poolId: {"address", "specialization", "tokens", "blockNumber"}}
+		pools = {};
+		for e in self.getEvents("PoolRegistered"):
+			pools[e["args"]["poolId"]] = {	"address":e["args"]["poolAddress"],
+											"specialization":e["args"]["specialization"],
+											"tokens":[],
+											"blockNumber":e["blockNumber"]};
+		for e in self.getEvents("TokensRegistered"):
+			if e["args"]["poolId"] in pools.keys():
+				pools[e["args"]["poolId"]]["tokens"].extend(e["args"]["tokens"]);
+		return(pools);
@@ -0,0 +1,74 @@
+import copy
+import json
+import os
+import random
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+balpy = pytest.importorskip("balpy.balpy")
+from web3 import Web3
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def loadFixture(name):
+	with open(os.path.join(FIXTURES, name)) as f:
+		return(json.load(f));
+
+@pytest.fixture
+def onchainData():
+	return(loadFixture("getOnchainData.json"));
+
+@pytest.fixture
+def bal(onchainData):
+	# offline instance: only the pieces the encoding/decoding paths touch
+	bal = balpy.balpy.__new__(balpy.balpy);
+	bal.web3 = Web3();
+	bal.decimals = dict(onchainData["decimals"]);
+	return(bal);
+
+def makeBatchSwap(tokens, numAssets, numSwaps, seed=7):
+	rng = random.Random(seed);
+	assets = rng.sample(tokens, numAssets);
+	swaps = [];
+	for i in range(numSwaps):
+		# chain of hops through every asset, restarting from asset 0
+		hop = i % (numAssets - 1);
+		swaps.append({
+			"poolId":"0x" + "%040x" % rng.getrandbits(160) + "0001" + "0" * 20,
+			"assetInIndex":hop,
+			"assetOutIndex":hop + 1,
+			"amount":"0" if hop > 0 else str(rng.uniform(1, 1000))
+		});
+	return({
+		"network":"mainnet",
+		"batchSwapKind":0,
+		"kind":0,
+		"assets":assets,
+		"swaps":swaps,
+		"funds":{
+			"sender":"0x0000000000000000000000000000000000000001",
+			"recipient":"0x0000000000000000000000000000000000000001",
+			"fromInternalBalance":False,
+			"toInternalBalance":False
+		},
+		"limits":[str(rng.uniform(0, 1000)) for a in assets],
+		"deadline":"999999999999999999"
+	});
+
+@pytest.mark.parametrize("numAssets,numSwaps", [(3, 2), (8, 28), (16, 120)])
+def test_balFormatBatchSwapData(benchmark, bal, onchainData, numAssets, numSwaps):
+	swapDescription = makeBatchSwap(list(onchainData["decimals"].keys()), numAssets, numSwaps);
+	benchmark.group = "balFormatBatchSwapData";
+	# balReorderTokenDicts sorts the assets in place, so every round gets a fresh copy
+	benchmark.pedantic(bal.balFormatBatchSwapData, setup=lambda: ((copy.deepcopy(swapDescription),), {}), rounds=200);
+
+@pytest.mark.parametrize("numTokens", [2, 8, 50])
+def test_balSortTokens(benchmark, bal, onchainData, numTokens):
+	tokens = list(onchainData["decimals"].keys())[:numTokens];
+	benchmark.group = "balSortTokens";
+	benchmark(bal.balSortTokens, tokens);
+
+def test_decodeOnchainData(benchmark, bal, onchainData):
+	benchmark.group = "getOnchainData";
+	result = benchmark(bal.decodeOnchainData, onchainData["data"], onchainData["pidAndFns"], onchainData["poolToType"]);
+	assert set(result.keys()) == set(onchainData["poolToType"].keys());
@@ -14,4 +14,7 @@ rm -rf ./balpy/balancer-deployments/tasks/*/build-info
 rm -rf ./balpy/balancer-deployments/tasks/scripts
 rm -rf ./balpy/balancer-deployments/tasks/deprecated/*/build-info
 
+# Build the contract -> task -> address index shipped with the package
+python3 ./balpy/deploymentRegistry.py
+
 poetry build
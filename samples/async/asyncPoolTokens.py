@@ -0,0 +1,28 @@
+import balpy
+import asyncio
+import requests
+import time
+
+async def fetchPoolTokens(network, poolIds):
+	async with balpy.asyncBalpy.AsyncBalpy(network, maxConcurrency=64) as abal:
+		results = await asyncio.gather(*[abal.balVaultGetPoolTokens(poolId) for poolId in poolIds]);
+	return(dict(zip(poolIds, results)));
+
+def main():
+	network = "mainnet";
+
+	poolIdsUrl = "https://raw.githubusercontent.com/gerrrg/balancer-pool-ids/master/pools/" + network + ".json";
+	r = requests.get(poolIdsUrl);
+	poolIds = [poolId for poolType in r.json()["pools"].values() for poolId in poolType];
+
+	tStart = time.time();
+	results = asyncio.run(fetchPoolTokens(network, poolIds));
+	tEnd = time.time();
+
+	for poolId in results.keys():
+		(tokens, balances, lastChangeBlock) = results[poolId];
+		print(poolId, lastChangeBlock, len(tokens), "tokens");
+	print("Queried", len(results), "pools in", tEnd - tStart, "seconds");
+
+if __name__ == '__main__':
+	main();
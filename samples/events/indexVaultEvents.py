@@ -0,0 +1,20 @@
+import balpy
+
+def main():
+	network = "mainnet";
+	bal = balpy.balpy.balpy(network);
+
+	# the first sync scans from the Vault deployment, later syncs only catch up on new blocks
+	indexer = bal.balGetVaultIndexer();
+	lastBlock = indexer.sync(verbose=True);
+	print("Indexed Vault events up to block", lastBlock);
+
+	pools = indexer.getPools();
+	print("Pools registered:", len(pools));
+
+	poolId = list(pools.keys())[0];
+	swaps = indexer.getEvents("Swap", poolId=poolId);
+	print("Swaps in pool", poolId + ":", len(swaps));
+
+if __name__ == '__main__':
+	main();
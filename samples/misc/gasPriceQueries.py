@@ -7,6 +7,19 @@ def main():
 
 	speeds = ["slow", "average", "fast"]
 
+	# EIP-1559 fees: one eth_feeHistory call serves every speed and is cached for about a block
+	start = time.time()
+	print("\n--- Fee History Method ---------------------")
+	print("\tSpeed\tMax Fee(gwei)\tPriority Fee(gwei)")
+	print("\t-----\t-------------\t-----------------")
+	for speed in speeds:
+		fees = bal.feeOracle.getFees(speed)
+		if fees is None:
+			print("\t" + speed + "\tnot supported on " + network)
+			continue
+		print("\t" + speed + "\t" + str(bal.web3.fromWei(fees["maxFeePerGas"], "gwei")) + "\t\t" + str(bal.web3.fromWei(fees["maxPriorityFeePerGas"], "gwei")))
+	print("\nFee history queries took", time.time() - start, "seconds\n")
+
 	# NOTE: Using these time-based gas strategies requires caching gas prices over 
 	# extended time periods. In testing, this script made 140-150 calls to the RPC
 	# and took ~1 minute to initialize the cache. 
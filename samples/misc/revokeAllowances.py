@@ -19,7 +19,7 @@ def main():
 				"0x15E76Fc74C6ab1c3141D61219883d1c59F716E21",
 				"0x22ee6c3B011fACC530dd01fe94C58919344d6Db5"];
 
-	nonce = bal.web3.eth.get_transaction_count(bal.web3.eth.default_account);
+	# nonces are allocated locally by bal.nonceManager, so allowances can be sent back to back
 	hashes = [];
 
 	for token in tokens:
@@ -31,17 +31,14 @@ def main():
 														0,
 														gasFactor,
 														gasSpeed,
-														nonceOverride=nonce,
 														isAsync=True,
 														gasPriceGweiOverride=gasOverride);
-			nonce += 1
 			hashes.append(txHash);
 			print("\tRevoking allowance -- txHash:", txHash)
 		else:
 			print("\tNo allowance. Skipping...")
 
-	for txHash in hashes:
-		bal.waitForTx(txHash);
+	bal.waitForTxs(hashes);
 		
 if __name__ == '__main__':
 	main();
\ No newline at end of file
@@ -0,0 +1,26 @@
+import balpy
+import requests
+import time
+
+def main():
+	network = "mainnet";
+	bal = balpy.balpy.balpy(network);
+
+	poolIdsUrl = "https://raw.githubusercontent.com/gerrrg/balancer-pool-ids/master/pools/" + network + ".json";
+	r = requests.get(poolIdsUrl);
+	poolIds = r.json()["pools"];
+
+	if "Element" in poolIds.keys():
+		del poolIds["Element"];
+
+	# the first call fetches everything, later calls only refetch pools that changed
+	snapshot = None;
+	for i in range(5):
+		tStart = time.time();
+		snapshot = bal.getOnchainDataIncremental(poolIds, snapshot);
+		tEnd = time.time();
+		print("Block", snapshot["blockNumber"], "refreshed", len(snapshot["updatedPools"]), "of", len(snapshot["pools"]), "pools in", tEnd - tStart, "seconds");
+		time.sleep(12);
+
+if __name__ == '__main__':
+	main();
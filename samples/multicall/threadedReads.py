@@ -0,0 +1,31 @@
+import balpy
+import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def main():
+	network = "mainnet";
+
+	# a single client is shared by every thread: each bulk call builds its own multicall batch
+	bal = balpy.balpy.balpy(network);
+
+	poolIdsUrl = "https://raw.githubusercontent.com/gerrrg/balancer-pool-ids/master/pools/" + network + ".json";
+	r = requests.get(poolIdsUrl);
+	poolIds = r.json()["pools"];
+
+	if "Element" in poolIds.keys():
+		del poolIds["Element"];
+
+	# one getOnchainData call per pool type, all running at once
+	tStart = time.time();
+	with ThreadPoolExecutor(max_workers=len(poolIds)) as executor:
+		futures = {poolType:executor.submit(bal.getOnchainData, {poolType:poolIds[poolType]}) for poolType in poolIds.keys()};
+		results = {poolType:futures[poolType].result() for poolType in futures.keys()};
+	tEnd = time.time();
+
+	for poolType in results.keys():
+		print(poolType, len(results[poolType]), "pools");
+	print("Query took", tEnd - tStart, "seconds");
+
+if __name__ == '__main__':
+	main();
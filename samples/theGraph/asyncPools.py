@@ -0,0 +1,22 @@
+import asyncio
+import sys
+import time
+import balpy.graph.asyncGraph as balAsyncGraph
+
+async def run(network):
+	async with balAsyncGraph.AsyncTheGraph(network, maxConcurrency=16) as agraph:
+		tStart = time.time();
+		(numPools, pools) = await asyncio.gather(	agraph.getNumPools(),
+													agraph.getV2PoolIDs(1000, partitions=8));
+		poolIds = [poolId for ids in pools["pools"].values() for poolId in ids];
+		prices = await agraph.getPoolBptPriceEstimateBatch(poolIds);
+		print("Queried", numPools, "pools and", len(prices), "BPT prices in", time.time() - tStart, "seconds");
+
+def main():
+	network = "mainnet";
+	if len(sys.argv) > 1:
+		network = sys.argv[1];
+	asyncio.run(run(network));
+
+if __name__ == '__main__':
+	main();
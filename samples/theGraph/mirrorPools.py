@@ -0,0 +1,25 @@
+import sys
+import time
+import balpy.graph.graph as balGraph
+
+def main():
+	network = "mainnet";
+	if len(sys.argv) > 1:
+		network = sys.argv[1];
+
+	verbose = True;
+	bg = balGraph.TheGraph(network)
+
+	# the first sync downloads every pool, later syncs (and restarts) only fetch changes
+	mirror = bg.getMirror();
+	for i in range(3):
+		tStart = time.time();
+		block = mirror.sync(partitions=8, verbose=verbose);
+		print("Synced to block", block, "in", time.time() - tStart, "seconds");
+		time.sleep(15);
+
+	pools = mirror.getV2PoolIDs();
+	print("Pools mirrored:", pools["header"]["numPools"]);
+
+if __name__ == '__main__':
+	main();
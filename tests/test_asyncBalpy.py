@@ -0,0 +1,110 @@
+import asyncio
+import subprocess
+import sys
+
+from aiohttp import web
+
+from balpy.asyncBalpy import AsyncBalpy
+from balpy.balpy import balpy
+
+VAULT_ADDRESS = "0xBA12222222228d8Ba445958a75a0704d566BF2C8";
+TOKEN = "0xba100000625a3754423978a60c9317c58a424e3D";
+POOL_ID = "0x5c6ee304399dbdb9c8ef030ab642b10820db8f56000200000000000000000014";
+DECIMALS_SELECTOR = "0x313ce567";
+
+class FakeNode(object):
+
+	# JSON-RPC server answering decimals() calls after delaySec, or failing with errorCode
+	def __init__(self, delaySec=0.05, errorCode=None):
+		self.delaySec = delaySec;
+		self.errorCode = errorCode;
+		self.requests = [];
+		self.runner = None;
+
+	async def handle(self, request):
+		payload = await request.json();
+		self.requests.append(payload);
+		await asyncio.sleep(self.delaySec);
+		response = {"jsonrpc":"2.0", "id":payload["id"]};
+		if not self.errorCode is None:
+			response["error"] = {"code":self.errorCode, "message":"rate limited"};
+		elif payload["method"] == "eth_call" and payload["params"][0]["data"] == DECIMALS_SELECTOR:
+			response["result"] = "0x" + "%064x" % 6;
+		else:
+			response["error"] = {"code":-32601, "message":"unexpected " + payload["method"]};
+		return(web.json_response(response));
+
+	async def start(self):
+		app = web.Application();
+		app.router.add_post("/", self.handle);
+		self.runner = web.AppRunner(app);
+		await self.runner.setup();
+		site = web.TCPSite(self.runner, "127.0.0.1", 0);
+		await site.start();
+		return("http://127.0.0.1:" + str(self.runner.addresses[0][1]) + "/");
+
+	async def stop(self):
+		await self.runner.cleanup();
+
+VAULT_ABI = [{	"type":"function", "name":"getPoolTokens", "stateMutability":"view",
+				"inputs":[{"name":"poolId", "type":"bytes32"}],
+				"outputs":[{"name":"", "type":t} for t in ["address[]", "uint256[]", "uint256"]]}];
+
+def makeBalpy(endpoints):
+	manualEnv = {"customRPC":",".join(endpoints), "etherscanApiKey":"unused", "privateKey":"0x" + "11" * 32};
+	bal = balpy("mainnet", verbose=False, manualEnv=manualEnv);
+	bal.decimals = {}; # the class level cache is shared by every instance
+	bal.abis["Vault"] = VAULT_ABI;
+	bal.deploymentAddresses["Vault"] = VAULT_ADDRESS;
+	return(bal);
+
+def calls(node):
+	return([r for r in node.requests if r["method"] == "eth_call"]);
+
+class TestAsyncBalpy:
+
+	def test_import_does_not_load_aiohttp(self):
+		code = "import inspect; inspect.getargspec = inspect.getfullargspec; import sys, balpy; print('aiohttp' in sys.modules); balpy.asyncBalpy.AsyncBalpy; print('aiohttp' in sys.modules)";
+		output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split();
+		assert output == ["False", "True"];
+
+	def test_calldata_matches_web3(self):
+		bal = makeBalpy(["http://127.0.0.1:1"]);
+		abal = AsyncBalpy(bal=bal);
+		vault = bal.balLoadContract("Vault");
+		fn = vault.functions.getPoolTokens(POOL_ID);
+		assert abal.encodeCall(fn) == fn._encode_transaction_data();
+		assert abal.encodeCall(bal.erc20GetContract(TOKEN).functions.decimals()) == DECIMALS_SELECTOR;
+		assert len(abal.encoders) == 2;
+
+	def test_concurrent_decimals_share_one_request(self):
+		async def run():
+			node = FakeNode();
+			bal = makeBalpy([await node.start()]);
+			async with AsyncBalpy(bal=bal) as abal:
+				decimals = await asyncio.gather(*[abal.erc20GetDecimals(TOKEN) for i in range(5)]);
+				assert await abal.erc20GetDecimals(TOKEN) == 6;
+			await node.stop();
+			return(decimals, node, abal);
+		(decimals, node, abal) = asyncio.run(run());
+		assert decimals == [6] * 5;
+		assert len(calls(node)) == 1;
+		assert abal.pendingDecimals == {};
+
+	def test_requests_fail_over_across_endpoints(self):
+		async def run():
+			limited = FakeNode(errorCode=429);
+			node = FakeNode();
+			bal = makeBalpy([await limited.start(), await node.start()]);
+			async with AsyncBalpy(bal=bal) as abal:
+				decimals = await abal.erc20GetDecimals(TOKEN);
+			await limited.stop();
+			await node.stop();
+			return(decimals, limited, node, bal.web3.provider.endpoints);
+		(decimals, limited, node, endpoints) = asyncio.run(run());
+		assert decimals == 6;
+		assert len(calls(limited)) == 1;
+		assert len(calls(node)) == 1;
+		# the synchronous client sees the same endpoint health
+		assert not endpoints[0].isHealthy();
+		assert endpoints[1].isHealthy() and not endpoints[1].latencySec is None;
@@ -0,0 +1,81 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from balpy.graph.asyncGraph import AsyncTheGraph
+from balpy.graph.graph import TheGraph
+
+def poolId(n):
+	return("0x%04x" % n + "00" * 30);
+
+class FakeAsyncGraph(AsyncTheGraph):
+
+	# answers the id-paged pool queries from a list of pools instead of the network
+	def __init__(self, numPools, failAfter=None):
+		super(FakeAsyncGraph, self).__init__(graph=TheGraph("mainnet"));
+		self.pools = [{"id":poolId(n * 0x10000 // numPools), "poolType":"Weighted"} for n in range(numPools)];
+		self.queries = [];
+		self.failAfter = failAfter;
+
+	async def execute(self, query_string, variables=None):
+		self.queries.append(variables);
+		await asyncio.sleep(0);
+		if not self.failAfter is None and len(self.queries) > self.failAfter:
+			raise ValueError("subgraph down");
+		if "ids" in variables.keys():
+			return({"pools":[{"id":i, "totalShares":"2", "totalLiquidity":"10"} for i in variables["ids"]]});
+		where = variables["where"];
+		pools = [p for p in self.pools if p["id"] > where["id_gt"] and (not "id_lt" in where.keys() or p["id"] < where["id_lt"])];
+		return({"pools":pools[:variables["first"]]});
+
+def pendingTasks():
+	return([t for t in asyncio.all_tasks() if not t is asyncio.current_task()]);
+
+class TestAsyncTheGraph:
+
+	def test_import_does_not_load_aiohttp(self):
+		code = "import inspect; inspect.getargspec = inspect.getfullargspec; import sys, balpy.graph; print('aiohttp' in sys.modules); balpy.graph.asyncGraph.AsyncTheGraph; print('aiohttp' in sys.modules)";
+		output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split();
+		assert output == ["False", "True"];
+
+	@pytest.mark.parametrize("partitions", [1, 4])
+	def test_every_pool_once(self, partitions):
+		async def run():
+			graph = FakeAsyncGraph(40);
+			pools = [pool async for pool in graph.iteratePools(batch_size=3, fields="id", partitions=partitions)];
+			return(graph, pools);
+		(graph, pools) = asyncio.run(run());
+		assert sorted([p["id"] for p in pools]) == [p["id"] for p in graph.pools];
+
+	def test_early_exit_leaves_no_pending_tasks(self):
+		async def run():
+			graph = FakeAsyncGraph(200);
+			pools = graph.iteratePools(batch_size=2, fields="id", partitions=4);
+			first = await pools.__anext__();
+			# the producers fill the queue while the consumer waits
+			for i in range(10):
+				await asyncio.sleep(0);
+			await pools.aclose();
+			return(graph, first, pendingTasks());
+		(graph, first, pending) = asyncio.run(run());
+		assert first in graph.pools;
+		assert pending == [];
+
+	def test_errors_reach_the_consumer(self):
+		async def run():
+			graph = FakeAsyncGraph(40, failAfter=2);
+			with pytest.raises(ValueError, match="subgraph down"):
+				[pool async for pool in graph.iteratePools(batch_size=3, fields="id", partitions=4)];
+			return(pendingTasks());
+		assert asyncio.run(run()) == [];
+
+	def test_id_chunks_are_requested_concurrently(self):
+		async def run():
+			graph = FakeAsyncGraph(0);
+			prices = await graph.getPoolBptPriceEstimateBatch(["0xAA", "0xbb", "0xCC"], batch_size=2);
+			return(graph, prices);
+		(graph, prices) = asyncio.run(run());
+		assert prices == {"0xAA":5.0, "0xbb":5.0, "0xCC":5.0};
+		assert [q["ids"] for q in graph.queries] == [["0xaa", "0xbb"], ["0xcc"]];
@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+from balpy.deploymentRegistry import DeploymentRegistry
+
+VAULT_ADDRESS = "0xBA12222222228d8Ba445958a75a0704d566BF2C8";
+TASK = "20210418-vault";
+
+def makeRegistryClass(packagePath):
+	class Registry(DeploymentRegistry):
+		@classmethod
+		def getPackagePath(cls):
+			return(str(packagePath));
+	return(Registry);
+
+def writeTask(packagePath, address):
+	taskPath = os.path.join(str(packagePath), DeploymentRegistry.deploymentsDir, TASK);
+	for sub in ["artifact", "output"]:
+		os.makedirs(os.path.join(taskPath, sub), exist_ok=True);
+	with open(os.path.join(taskPath, "artifact", "Vault.json"), 'w') as f:
+		json.dump({"abi":[]}, f);
+	with open(os.path.join(taskPath, "output", "mainnet.json"), 'w') as f:
+		json.dump({"Vault":address}, f);
+
+def writeIndex(packagePath, sourceStamp, address):
+	index = {	"version":DeploymentRegistry.INDEX_VERSION,
+				"sourceStamp":sourceStamp,
+				"contractDirectories":{"Vault":TASK},
+				"deprecatedContractDirectories":{},
+				"addresses":{"Vault":{"mainnet":address}}};
+	with open(os.path.join(str(packagePath), DeploymentRegistry.indexFileName), 'w') as f:
+		json.dump(index, f);
+
+def writeSubmoduleHead(packagePath, commit):
+	gitPath = os.path.join(str(packagePath), os.path.dirname(DeploymentRegistry.deploymentsDir), ".git");
+	os.makedirs(gitPath, exist_ok=True);
+	with open(os.path.join(gitPath, "HEAD"), 'w') as f:
+		f.write(commit + "\n");
+
+class TestDeploymentRegistry:
+
+	def test_packaged_index_without_git(self, tmp_path, monkeypatch):
+		# installed package: deployments tree but no submodule checkout
+		writeTask(tmp_path, "0x" + "22" * 20);
+		writeIndex(tmp_path, "a" * 40, VAULT_ADDRESS);
+		Registry = makeRegistryClass(tmp_path);
+
+		def walk(*args):
+			raise AssertionError("deployments tree was walked");
+		monkeypatch.setattr(Registry, "buildIndex", classmethod(walk));
+		monkeypatch.setattr(os, "listdir", walk);
+
+		registry = Registry();
+		assert registry.getAddress("Vault", "mainnet") == VAULT_ADDRESS;
+		assert registry.contractDirectories == {"Vault":TASK};
+
+	def test_index_matching_submodule_commit(self, tmp_path, monkeypatch):
+		writeTask(tmp_path, "0x" + "22" * 20);
+		writeIndex(tmp_path, "a" * 40, VAULT_ADDRESS);
+		writeSubmoduleHead(tmp_path, "a" * 40);
+		Registry = makeRegistryClass(tmp_path);
+		monkeypatch.setattr(Registry, "buildIndex", classmethod(lambda cls: pytest.fail("index was rebuilt")));
+
+		assert Registry().getAddress("Vault", "mainnet") == VAULT_ADDRESS;
+
+	def test_stale_index_is_rebuilt(self, tmp_path):
+		newAddress = "0x" + "22" * 20;
+		writeTask(tmp_path, newAddress);
+		writeIndex(tmp_path, "a" * 40, VAULT_ADDRESS);
+		writeSubmoduleHead(tmp_path, "b" * 40);
+		Registry = makeRegistryClass(tmp_path);
+
+		assert Registry().getAddress("Vault", "mainnet") == newAddress;
+
+		# the refreshed index is written back and loaded on the next start
+		index = Registry.loadIndex();
+		assert index["sourceStamp"] == "b" * 40;
+		assert index["addresses"]["Vault"]["mainnet"] == newAddress;
@@ -0,0 +1,170 @@
+import types
+
+import pytest
+
+from balpy.balpy import balpy
+from balpy.etherscanStore import TokenBucket, ResponseCache
+import balpy.etherscanStore as etherscanStore
+
+ADDRESS = "0xBA12222222228d8Ba445958a75a0704d566BF2C8";
+
+class FakeClock(object):
+
+	# time.time/time.sleep for the store module; sleeping advances the clock
+	def __init__(self):
+		self.now = 1000.0;
+		self.sleeps = [];
+
+	def time(self):
+		return(self.now);
+
+	def sleep(self, seconds):
+		self.sleeps.append(seconds);
+		self.now += seconds;
+
+@pytest.fixture
+def clock(monkeypatch):
+	clock = FakeClock();
+	monkeypatch.setattr(etherscanStore, "time", clock);
+	return(clock);
+
+class TestTokenBucket:
+
+	def test_burst_then_rate(self, clock, tmp_path):
+		bucket = TokenBucket(str(tmp_path / "etherscan.sqlite"), ratePerSec=5.0, capacity=2.0);
+		assert bucket.tryAcquire("api") == 0;
+		assert bucket.tryAcquire("api") == 0;
+		assert bucket.tryAcquire("api") == pytest.approx(0.2);
+		clock.now += 0.2;
+		assert bucket.tryAcquire("api") == 0;
+		bucket.close();
+
+	def test_acquire_sleeps_until_a_token_is_available(self, clock, tmp_path):
+		bucket = TokenBucket(str(tmp_path / "etherscan.sqlite"), ratePerSec=2.0);
+		bucket.acquire("api");
+		bucket.acquire("api");
+		assert sum(clock.sleeps) == pytest.approx(0.5);
+		bucket.close();
+
+	def test_refill_is_capped(self, clock, tmp_path):
+		bucket = TokenBucket(str(tmp_path / "etherscan.sqlite"), ratePerSec=5.0, capacity=2.0);
+		bucket.tryAcquire("api");
+		clock.now += 3600;
+		assert [bucket.tryAcquire("api") for i in range(3)][-1] > 0;
+		bucket.close();
+
+	def test_limit_is_shared_through_the_database(self, clock, tmp_path):
+		# separate connections stand in for separate processes
+		dbPath = str(tmp_path / "etherscan.sqlite");
+		first = TokenBucket(dbPath, ratePerSec=1.0);
+		second = TokenBucket(dbPath, ratePerSec=1.0);
+		assert first.tryAcquire("api") == 0;
+		assert second.tryAcquire("api") == pytest.approx(1.0);
+		assert second.tryAcquire("other") == 0;
+		first.close();
+		second.close();
+
+class TestResponseCache:
+
+	def test_roundtrip_and_persistence(self, tmp_path):
+		dbPath = str(tmp_path / "etherscan.sqlite");
+		cache = ResponseCache(dbPath);
+		assert cache.get("key") is None;
+		cache.put("key", {"status":"1", "result":[1, 2]});
+		cache.close();
+
+		cache = ResponseCache(dbPath);
+		assert cache.get("key") == {"status":"1", "result":[1, 2]};
+		cache.put("key", {"status":"1", "result":[]});
+		assert cache.get("key") == {"status":"1", "result":[]};
+		cache.close();
+
+def tx(blockNumber):
+	return({"blockNumber":str(blockNumber), "hash":"0x%064x" % blockNumber});
+
+@pytest.fixture
+def bal(tmp_path):
+	manualEnv = {"customRPC":"http://127.0.0.1:1", "etherscanApiKey":"unused", "privateKey":"0x" + "11" * 32};
+	bal = balpy("mainnet", verbose=False, manualEnv=manualEnv);
+	bal.cacheDir = str(tmp_path);
+	bal.web3 = types.SimpleNamespace(eth=types.SimpleNamespace(block_number=1000));
+	bal.urls = [];
+	bal.responses = [];
+	def callEtherscan(url, verbose=False):
+		bal.urls.append(url);
+		return(bal.responses.pop(0));
+	bal.callEtherscan = callEtherscan;
+	return(bal);
+
+def found(blocks):
+	return({"status":"1", "message":"OK", "result":[tx(b) for b in blocks]});
+
+NOT_FOUND = {"status":"0", "message":"No transactions found", "result":[]};
+
+def startBlocks(bal):
+	return([int(url.split("startblock=")[1].split("&")[0]) for url in bal.urls]);
+
+class TestGetTransactionsByAddress:
+
+	def test_finalized_transactions_are_cached(self, bal):
+		bal.responses = [found([10, 800, 950]), found([990])];
+		assert [t["blockNumber"] for t in bal.getTransactionsByAddress(ADDRESS)] == ["10", "800", "950"];
+
+		# only blocks after head - etherscanFinalityBlocks are requested again
+		bal.web3.eth.block_number = 1100;
+		assert [t["blockNumber"] for t in bal.getTransactionsByAddress(ADDRESS)] == ["10", "800", "990"];
+		assert startBlocks(bal) == [0, 1000 - bal.etherscanFinalityBlocks + 1];
+
+	def test_nothing_new_with_a_cache(self, bal):
+		bal.responses = [found([10]), NOT_FOUND];
+		bal.getTransactionsByAddress(ADDRESS);
+		assert bal.getTransactionsByAddress(ADDRESS) == [tx(10)];
+
+	def test_nothing_found_without_a_cache(self, bal):
+		bal.responses = [NOT_FOUND];
+		assert bal.getTransactionsByAddress(ADDRESS) == False;
+
+	def test_truncated_page_is_cached_up_to_its_last_block(self, bal):
+		bal.etherscanMaxResults = 3;
+		bal.responses = [found([10, 20, 20]), found([20, 20, 30])];
+		assert len(bal.getTransactionsByAddress(ADDRESS)) == 3;
+
+		# block 20 may have more transactions than the page held: it's requested again
+		assert [t["blockNumber"] for t in bal.getTransactionsByAddress(ADDRESS)] == ["10", "20", "20", "30"];
+		assert startBlocks(bal) == [0, 20];
+
+	def test_internal_and_start_block_have_their_own_entries(self, bal):
+		bal.responses = [found([10]), found([10]), found([10])];
+		bal.getTransactionsByAddress(ADDRESS);
+		bal.getTransactionsByAddress(ADDRESS, internal=True);
+		bal.getTransactionsByAddress(ADDRESS, startblock=5);
+		assert startBlocks(bal) == [0, 0, 5];
+		assert "txlistinternal" in bal.urls[1];
+
+class FakeResponse(object):
+
+	def __init__(self, data):
+		self.data = data;
+
+	def json(self):
+		return(self.data);
+
+class TestCallEtherscan:
+
+	def test_cacheable_responses_are_not_requested_again(self, tmp_path):
+		manualEnv = {"customRPC":"http://127.0.0.1:1", "etherscanApiKey":"secret", "privateKey":"0x" + "11" * 32};
+		bal = balpy("mainnet", verbose=False, manualEnv=manualEnv);
+		bal.cacheDir = str(tmp_path);
+		urls = [];
+		def get(url, headers=None):
+			urls.append(url);
+			return(FakeResponse({"status":str(len(urls) % 2), "result":len(urls)}));
+		bal.httpSession = types.SimpleNamespace(get=get);
+
+		cacheIf = lambda r: r["status"] == "1";
+		assert bal.callEtherscan("/api?module=test&apikey=", cacheIf=cacheIf)["result"] == 1;
+		assert bal.callEtherscan("/api?module=test&apikey=", cacheIf=cacheIf)["result"] == 1;
+		assert bal.callEtherscan("/api?module=other&apikey=", cacheIf=cacheIf)["result"] == 2;
+		assert bal.callEtherscan("/api?module=other&apikey=", cacheIf=cacheIf)["result"] == 3;
+		assert len(urls) == 3;
+		assert all([url.endswith("apikey=secret") for url in urls]);
@@ -0,0 +1,105 @@
+import pytest
+
+from balpy.balpy import balpy
+from balpy.gasProfileCache import GasProfileCache
+
+VAULT_ADDRESS = "0xBA12222222228d8Ba445958a75a0704d566BF2C8";
+POOL_ID = bytes.fromhex("5c6ee304399dbdb9c8ef030ab642b10820db8f56000200000000000000000014");
+TOKENS = ["0xba100000625a3754423978a60c9317c58a424e3D", "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"];
+
+class FakeFunction(object):
+
+	# the parts of a web3 ContractFunction the cache reads
+	def __init__(self, fn_name, args, selector="0x12345678"):
+		self.fn_name = fn_name;
+		self.args = args;
+		self.address = VAULT_ADDRESS;
+		self.selector = selector;
+
+	def _encode_transaction_data(self):
+		return(self.selector + "00" * 32);
+
+	def estimateGas(self):
+		raise AssertionError("estimateGas called with a cached profile");
+
+def userData(kind, amount):
+	return("0x" + "%064x" % kind + "%064x" % amount);
+
+def exitPool(kind, minAmountsOut, amount=10**18):
+	return(FakeFunction("exitPool", [POOL_ID, VAULT_ADDRESS, VAULT_ADDRESS, (TOKENS, minAmountsOut, userData(kind, amount), False)]));
+
+def receipt(gasUsed, status=1):
+	return({"gasUsed":gasUsed, "status":status});
+
+class TestGasProfileCache:
+
+	def test_estimate_is_padded_once(self):
+		cache = GasProfileCache(padding=1.1);
+		key = cache.getKey(exitPool(1, [0, 0]));
+		cache.record(key, receipt(100000));
+		cache.record(key, receipt(120000));
+		assert cache.getEstimate(key) == 132000;
+		assert cache.getEstimate(key, gasFactor=1.05) == 132000;
+		assert cache.getEstimate(key, gasFactor=1.5) == 180000;
+
+	def test_unknown_key(self):
+		cache = GasProfileCache();
+		assert cache.getEstimate(cache.getKey(exitPool(1, [0, 0]))) is None;
+
+	def test_exit_kinds_have_their_own_profiles(self):
+		cache = GasProfileCache();
+		exactIn = cache.getKey(exitPool(0, [1, 0]));
+		exactOut = cache.getKey(exitPool(2, [1, 0]));
+		proportional = cache.getKey(exitPool(1, [1, 1]));
+		assert len(set([exactIn, exactOut, proportional])) == 3;
+
+	def test_amounts_do_not_split_profiles(self):
+		cache = GasProfileCache();
+		assert cache.getKey(exitPool(1, [5, 7], amount=1)) == cache.getKey(exitPool(1, [9, 3], amount=2));
+
+	def test_limits_select_the_tokens(self):
+		cache = GasProfileCache();
+		assert not cache.getKey(exitPool(0, [1, 0])) == cache.getKey(exitPool(0, [0, 1]));
+
+	def test_swap_kinds_have_their_own_profiles(self):
+		cache = GasProfileCache();
+		givenIn = FakeFunction("swap", [(POOL_ID, 0, TOKENS[0], TOKENS[1], 10, b""), (), 0, 0]);
+		givenOut = FakeFunction("swap", [(POOL_ID, 1, TOKENS[0], TOKENS[1], 10, b""), (), 0, 0]);
+		assert not cache.getKey(givenIn) == cache.getKey(givenOut);
+
+	def test_revert_clears_the_profile(self):
+		cache = GasProfileCache();
+		key = cache.getKey(exitPool(1, [0, 0]));
+		cache.record(key, receipt(100000));
+		cache.record(key, receipt(100000, status=0));
+		assert cache.getEstimate(key) is None;
+
+	def test_samples_are_bounded(self):
+		cache = GasProfileCache(padding=1.0, maxSamples=2);
+		key = cache.getKey(exitPool(1, [0, 0]));
+		for gasUsed in [300000, 100000, 110000]:
+			cache.record(key, receipt(gasUsed));
+		assert cache.getEstimate(key) == 110000;
+
+@pytest.fixture
+def bal():
+	manualEnv = {"customRPC":"http://127.0.0.1:1", "etherscanApiKey":"unused", "privateKey":"0x" + "11" * 32};
+	bal = balpy("mainnet", verbose=False, manualEnv=manualEnv);
+	bal.feeOracle.getFees = lambda speed: {"maxFeePerGas":2 * 10**9, "maxPriorityFeePerGas":10**9};
+	bal.nonceManager.allocate = lambda: 3;
+	return(bal);
+
+class TestBuildTx:
+
+	def test_cached_profile_is_padded_once(self, bal):
+		fn = exitPool(1, [0, 0]);
+		bal.gasProfileCache.record(bal.gasProfileCache.getKey(fn), receipt(100000));
+		tx = bal.buildTx(fn, 1.05);
+		assert tx["gas"] == 110000;
+		assert tx["nonce"] == 3;
+
+	def test_other_kinds_are_estimated(self, bal):
+		bal.gasProfileCache.record(bal.gasProfileCache.getKey(exitPool(1, [0, 0])), receipt(100000));
+		fn = exitPool(2, [0, 0]);
+		fn.estimateGas = lambda: 200000;
+		assert bal.buildTx(fn, 1.05)["gas"] == 210000;
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+import balpy.graph.graph as graphModule
+from balpy.graph.graph import TheGraph, getParsedQuery
+
+def poolId(n):
+	return("0x%04x" % n + "00" * 30);
+
+class FakePoolsGraph(TheGraph):
+
+	# answers the id-paged pool queries from a list of pools instead of the network
+	def __init__(self, numPools, failAfter=None):
+		super(FakePoolsGraph, self).__init__("mainnet");
+		self.pools = [{"id":poolId(n * 0x10000 // numPools), "poolType":"Weighted" if n % 2 == 0 else "Stable"} for n in range(numPools)];
+		self.queries = [];
+		self.failAfter = failAfter;
+
+	def execute(self, query_string, variables=None):
+		self.queries.append(variables);
+		if not self.failAfter is None and len(self.queries) > self.failAfter:
+			raise ValueError("subgraph down");
+		where = variables["where"];
+		pools = [p for p in self.pools if p["id"] > where["id_gt"] and (not "id_lt" in where.keys() or p["id"] < where["id_lt"])];
+		return({"pools":pools[:variables["first"]]});
+
+class TestQueryBuilding:
+
+	def test_skip_paging(self):
+		graph = TheGraph("mainnet");
+		(query, variables) = graph.buildPoolsQuery(5000, 20, "id poolType");
+		assert "pools(first: $first, skip: $skip)" in query;
+		assert "id poolType" in query;
+		assert variables == {"first":TheGraph.MAX_PAGE_SIZE, "skip":20};
+
+	def test_id_paging(self):
+		graph = TheGraph("mainnet");
+		(query, variables) = graph.buildPoolsQuery(100, 0, "id", last_id="0x01", id_lt="0x02");
+		assert "$where: Pool_filter" in query;
+		assert "orderBy: id" in query;
+		assert variables == {"first":100, "where":{"id_gt":"0x01", "id_lt":"0x02"}};
+
+	def test_entity_filter_type(self):
+		graph = TheGraph("mainnet");
+		(query, variables) = graph.buildEntitiesQuery("poolTokens", "balance", 10, {"id_gt":""});
+		assert "$where: PoolToken_filter" in query;
+		assert "poolTokens(first: $first" in query;
+
+	def test_queries_are_parsed_once(self):
+		query = TheGraph("mainnet").buildPoolsQuery(10, 0, "id swapFee")[0];
+		(document, text) = getParsedQuery(query);
+		assert getParsedQuery(query)[0] is document;
+		assert not "\n" in text and not "\t" in text;
+
+	def test_pool_id_chunks(self):
+		graph = TheGraph("mainnet");
+		(input_ids, chunks) = graph.chunkPoolIds(["0xAB", "0xcd", "0xEf"], 2);
+		assert chunks == [["0xab", "0xcd"], ["0xef"]];
+		assert input_ids["0xab"] == "0xAB";
+		(query, variables) = graph.buildPoolsByIdQuery(chunks[0], "totalShares");
+		assert "id_in: $ids" in query;
+		assert variables == {"first":2, "ids":["0xab", "0xcd"]};
+
+class TestPartitions:
+
+	def test_partitions_cover_the_id_space(self):
+		ranges = TheGraph("mainnet").getIdPartitions(4);
+		assert ranges == [("", "0x4000"), ("0x4000", "0x8000"), ("0x8000", "0xc000"), ("0xc000", None)];
+		assert TheGraph("mainnet").getIdPartitions(1) == [("", None)];
+
+	@pytest.mark.parametrize("partitions", [1, 3, 8])
+	def test_every_pool_once(self, partitions):
+		graph = FakePoolsGraph(50);
+		pools = list(graph.iteratePools(batch_size=4, fields="id poolType", partitions=partitions));
+		assert sorted([p["id"] for p in pools]) == [p["id"] for p in graph.pools];
+
+	def test_errors_reach_the_consumer(self):
+		graph = FakePoolsGraph(50, failAfter=3);
+		with pytest.raises(ValueError, match="subgraph down"):
+			list(graph.iteratePools(batch_size=4, fields="id", partitions=4));
+
+	def test_collect_pool_ids(self):
+		graph = FakePoolsGraph(4);
+		data = graph.getV2PoolIDs(10, partitions=2);
+		assert data["pools"] == {"Weighted":[poolId(0), poolId(0x8000)], "Stable":[poolId(0x4000), poolId(0xc000)]};
+		assert data["header"]["numPools"] == 4;
+
+class FakeResponse(object):
+
+	def __init__(self, data):
+		self.data = data;
+
+	def json(self):
+		return(self.data);
+
+class FakeSession(object):
+
+	def __init__(self):
+		self.posts = [];
+
+	def request(self, method, url, **kwargs):
+		self.posts.append(kwargs);
+		return(FakeResponse({"data":{"_meta":{"block":{"number":123}}}}));
+
+class TestPrintedQueryTransport:
+
+	def test_documents_are_printed_once(self, monkeypatch):
+		printed = [];
+		printAst = graphModule.print_ast;
+		monkeypatch.setattr(graphModule, "print_ast", lambda document: printed.append(document) or printAst(document));
+		graphModule.parsedQueries.pop(TheGraph.INDEXED_BLOCK_QUERY, None);
+
+		graph = TheGraph("mainnet");
+		session = FakeSession();
+		graph.client.transport.session = session;
+		assert [graph.getIndexedBlock() for i in range(3)] == [123] * 3;
+		assert len(printed) == 1;
+		assert len(session.posts) == 3;
+		body = session.posts[0]["json"];
+		assert body["query"] == printAst(getParsedQuery(TheGraph.INDEXED_BLOCK_QUERY)[0]);
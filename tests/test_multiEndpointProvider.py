@@ -0,0 +1,144 @@
+import time
+
+import pytest
+
+from balpy.multiEndpointProvider import MultiEndpointProvider
+
+class FakeNode(object):
+
+	# stands in for an endpoint's HTTPProvider: records requests, can fail or lag behind
+	def __init__(self, name, head=100):
+		self.name = name;
+		self.head = head;
+		self.error = None;
+		self.requests = [];
+
+	def answer(self, method, params):
+		self.requests.append(method);
+		if method == "eth_blockNumber":
+			return({"jsonrpc":"2.0", "id":0, "result":hex(self.head)});
+		if method == "eth_getBlockByNumber" and params[0] == "latest":
+			return({"jsonrpc":"2.0", "id":0, "result":{"number":hex(self.head)}});
+		return({"jsonrpc":"2.0", "id":0, "result":self.name});
+
+	def make_request(self, method, params):
+		if not self.error is None:
+			raise self.error;
+		return(self.answer(method, params));
+
+	def batch(self, payload):
+		if not self.error is None:
+			raise self.error;
+		responses = [];
+		for request in payload:
+			response = self.answer(request["method"], request["params"]);
+			response["id"] = request["id"];
+			responses.append(response);
+		return(responses);
+
+def makeProvider(heads, **kwargs):
+	provider = MultiEndpointProvider(["http://node" + str(i) for i in range(len(heads))], **kwargs);
+	nodes = [];
+	for i, endpoint in enumerate(provider.endpoints):
+		endpoint.provider = FakeNode("node" + str(i), heads[i]);
+		nodes.append(endpoint.provider);
+	provider.postBatch = lambda endpoint, payload: endpoint.provider.batch(payload);
+	return(provider, nodes);
+
+def answeredBy(response):
+	return(response["result"]);
+
+class TestMultiEndpointProvider:
+
+	def test_fastest_endpoint_serves_reads(self):
+		(provider, nodes) = makeProvider([100, 100, 100]);
+		for (endpoint, latency) in zip(provider.endpoints, [0.3, 0.1, 0.2]):
+			endpoint.latencySec = latency;
+		assert answeredBy(provider.make_request("eth_chainId", [])) == "node1";
+
+	def test_failover_and_cooldown(self):
+		(provider, nodes) = makeProvider([100, 100], cooldownSec=60);
+		nodes[0].error = ConnectionError("down");
+		assert answeredBy(provider.make_request("eth_chainId", [])) == "node1";
+		assert not provider.endpoints[0].isHealthy();
+
+		# the failed node is skipped while it cools down
+		nodes[0].error = None;
+		assert answeredBy(provider.make_request("eth_chainId", [])) == "node1";
+		assert nodes[0].requests == [];
+
+		provider.endpoints[0].downUntil = time.time() - 1;
+		assert provider.endpoints[0].isHealthy();
+
+	def test_repeated_failures_back_off_longer(self):
+		(provider, nodes) = makeProvider([100], cooldownSec=10);
+		endpoint = provider.endpoints[0];
+		endpoint.recordFailure(10);
+		first = endpoint.downUntil - time.time();
+		endpoint.recordFailure(10);
+		second = endpoint.downUntil - time.time();
+		assert second > 1.5 * first;
+
+	def test_node_errors_fail_over(self):
+		(provider, nodes) = makeProvider([100, 100]);
+		nodes[0].answer = lambda method, params: {"jsonrpc":"2.0", "id":0, "error":{"code":429, "message":"rate limited"}};
+		assert answeredBy(provider.make_request("eth_chainId", [])) == "node1";
+
+	def test_all_endpoints_failing_raises(self):
+		(provider, nodes) = makeProvider([100, 100]);
+		for node in nodes:
+			node.error = ConnectionError("down");
+		with pytest.raises(ConnectionError):
+			provider.make_request("eth_chainId", []);
+
+	def test_pinned_methods_stay_on_the_pinned_node(self):
+		(provider, nodes) = makeProvider([100, 100]);
+		provider.endpoints[0].latencySec = 1.0;
+		provider.endpoints[1].latencySec = 0.1;
+		assert answeredBy(provider.make_request("eth_sendRawTransaction", ["0x00"])) == "node0";
+		assert answeredBy(provider.makeBatchRequest([	{"jsonrpc":"2.0", "id":1, "method":"eth_chainId", "params":[]},
+														{"jsonrpc":"2.0", "id":2, "method":"eth_getTransactionByHash", "params":["0x00"]}])[0]) == "node0";
+
+		# the pin only moves when the pinned node fails
+		nodes[0].error = ConnectionError("down");
+		assert answeredBy(provider.make_request("eth_getTransactionCount", ["0x00", "pending"])) == "node1";
+		assert provider.pinned is provider.endpoints[1];
+
+	def test_reads_at_a_block_go_to_a_node_that_has_it(self):
+		(provider, nodes) = makeProvider([100, 105]);
+		provider.endpoints[0].latencySec = 0.1;
+		provider.endpoints[1].latencySec = 1.0;
+
+		# the head is read from the slow, more advanced node
+		provider.endpoints[0].downUntil = time.time() + 60;
+		assert int(provider.make_request("eth_getBlockByNumber", ["latest", False])["result"]["number"], 16) == 105;
+		provider.endpoints[0].downUntil = 0;
+		provider.make_request("eth_blockNumber", []);
+
+		assert provider.endpoints[0].headBlock == 100;
+		assert provider.endpoints[1].headBlock == 105;
+		assert answeredBy(provider.make_request("eth_call", [{"to":"0x00"}, hex(105)])) == "node1";
+		assert answeredBy(provider.make_request("eth_call", [{"to":"0x00"}, hex(100)])) == "node0";
+		assert answeredBy(provider.make_request("eth_call", [{"to":"0x00"}, "latest"])) == "node0";
+		assert answeredBy(provider.makeBatchRequest([{"jsonrpc":"2.0", "id":1, "method":"eth_getLogs", "params":[{"fromBlock":hex(90), "toBlock":hex(105)}]}])[0]) == "node1";
+
+	def test_unknown_block_goes_to_the_most_advanced_node(self):
+		(provider, nodes) = makeProvider([100, 105, 103]);
+		for i, endpoint in enumerate(provider.endpoints):
+			endpoint.headBlock = nodes[i].head;
+		provider.endpoints[1].latencySec = 1.0;
+		assert answeredBy(provider.make_request("eth_getBalance", ["0x00", hex(110)])) == "node1";
+
+	def test_request_blocks(self):
+		assert MultiEndpointProvider.getRequestBlock("eth_call", [{}, "0x10"]) == 16;
+		assert MultiEndpointProvider.getRequestBlock("eth_call", [{}, "latest"]) is None;
+		assert MultiEndpointProvider.getRequestBlock("eth_getStorageAt", ["0x00", "0x0", "0x20"]) == 32;
+		assert MultiEndpointProvider.getRequestBlock("eth_getLogs", [{"fromBlock":"0x1", "toBlock":"latest"}]) == 1;
+		assert MultiEndpointProvider.getRequestBlock("eth_getLogs", [{"blockHash":"0x00"}]) is None;
+		assert MultiEndpointProvider.getRequestBlock("eth_chainId", []) is None;
+
+	def test_close(self):
+		(provider, nodes) = makeProvider([100]);
+		provider.close();
+		with pytest.raises(RuntimeError):
+			provider.executor.submit(len, []);
@@ -0,0 +1,188 @@
+from decimal import Decimal
+
+import eth_abi
+import pytest
+from requests.exceptions import Timeout
+
+from balpy.balpy import balpy
+from balpy.multicallBatch import MulticallBatch, AdaptiveChunkSize, isChunkLimitError
+
+VAULT_ADDRESS = "0xBA12222222228d8Ba445958a75a0704d566BF2C8";
+POOL_ID = "0x5c6ee304399dbdb9c8ef030ab642b10820db8f56000200000000000000000014";
+TOKENS = ["0xba100000625a3754423978a60c9317c58a424e3D", "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"];
+
+def function(name, inputs, outputs):
+	return({"type":"function", "name":name, "stateMutability":"view",
+			"inputs":[{"name":"", "type":t} for t in inputs],
+			"outputs":[{"name":"", "type":t} for t in outputs]});
+
+VAULT_ABI = [function("getPoolTokens", ["bytes32"], ["address[]", "uint256[]", "uint256"])];
+POOL_ABI = [function("getSwapFeePercentage", [], ["uint256"]),
+			function("getPausedState", [], ["bool", "uint256", "uint256"]),
+			function("getNormalizedWeights", [], ["uint256[]"])];
+ERC20_ABI = [function("decimals", [], ["uint8"])];
+
+class FakeMulticall(object):
+
+	# answers tryBlockAndAggregate from canned outputs, keyed by function selector
+	def __init__(self, web3):
+		values = {	"getPoolTokens":[TOKENS, [10**18, 2 * 10**18], 7],
+					"getSwapFeePercentage":[3 * 10**15],
+					"getPausedState":[False, 0, 0],
+					"getNormalizedWeights":[[8 * 10**17, 2 * 10**17]],
+					"decimals":[18]};
+		self.outputs = {};
+		for fn in VAULT_ABI + POOL_ABI + ERC20_ABI:
+			signature = fn["name"] + "(" + ",".join([i["type"] for i in fn["inputs"]]) + ")";
+			outputTypes = [o["type"] for o in fn["outputs"]];
+			self.outputs[bytes(web3.keccak(text=signature)[:4])] = eth_abi.encode_abi(outputTypes, values[fn["name"]]);
+		self.functions = self;
+
+	def tryBlockAndAggregate(self, requireSuccess, chunk):
+		results = [(True, self.outputs[bytes.fromhex(callData[2:10])]) for (address, callData) in chunk];
+		return(FakeCall((100, b"\x00" * 32, results)));
+
+class FakeCall(object):
+
+	def __init__(self, output):
+		self.output = output;
+
+	def call(self, block_identifier="latest"):
+		return(self.output);
+
+@pytest.fixture
+def bal():
+	manualEnv = {"customRPC":"http://127.0.0.1:1", "etherscanApiKey":"unused", "privateKey":"0x" + "11" * 32};
+	bal = balpy("mainnet", verbose=False, manualEnv=manualEnv);
+	bal.abis["Vault"] = VAULT_ABI;
+	bal.deploymentAddresses["Vault"] = VAULT_ADDRESS;
+	bal.balPoolGetAbi = lambda poolType: POOL_ABI;
+	bal.multicallContract = FakeMulticall(bal.web3);
+	return(bal);
+
+class TestNewMulticallBatch:
+
+	def test_batches_are_independent(self, bal):
+		first = bal.newMulticallBatch();
+		second = bal.newMulticallBatch();
+		assert isinstance(first, MulticallBatch);
+		assert not first is second;
+
+		first.addCall(VAULT_ADDRESS, VAULT_ABI, "getPoolTokens", args=[POOL_ID]);
+		assert len(first.calls) == 1;
+		assert len(second.calls) == 0;
+
+	def test_repeated_onchain_data_is_stable(self, bal):
+		pools = {"Weighted":[POOL_ID]};
+		first = bal.getOnchainData(pools);
+		second = bal.getOnchainData(pools);
+		assert first == second;
+		assert list(first.keys()) == [POOL_ID];
+		assert Decimal(first[POOL_ID]["swapFee"]) == Decimal("0.003");
+		assert len(first[POOL_ID]["tokens"]) == 2;
+
+	def test_contracts_are_cached(self, bal):
+		assert bal.balLoadContract("Vault") is bal.balLoadContract("Vault");
+
+	def test_close_stops_the_executor(self, bal):
+		bal.close();
+		with pytest.raises(RuntimeError):
+			bal.multicallExecutor.submit(len, []);
+
+class LimitedMulticall(object):
+
+	# fails chunks larger than maxCalls like a node hitting its gas cap, or every chunk with error
+	def __init__(self, maxCalls=None, error=None):
+		self.maxCalls = maxCalls;
+		self.error = error;
+		self.chunkSizes = [];
+		self.functions = self;
+
+	def tryBlockAndAggregate(self, requireSuccess, chunk):
+		self.chunkSizes.append(len(chunk));
+		if not self.error is None:
+			raise self.error;
+		if len(chunk) > self.maxCalls:
+			raise ValueError({"code":-32000, "message":"out of gas"});
+		return(FakeCall((100, b"\x00" * 32, [(True, b"") for call in chunk])));
+
+def limitedBatch(multicall, numCalls, chunkSize):
+	batch = MulticallBatch(None, multicall, chunkSize=chunkSize, retryDelaySec=0);
+	batch.calls = [(VAULT_ADDRESS, "0x%08x" % i) for i in range(numCalls)];
+	batch.decoders = [["uint256"]] * numCalls;
+	return(batch);
+
+class TestAdaptiveChunkSize:
+
+	def test_grows_on_fast_full_chunks(self):
+		size = AdaptiveChunkSize(initial=100, maximum=1000, targetSeconds=2.0);
+		size.recordSuccess(100, 0.1);
+		assert size.get() == 151;
+
+	def test_partial_chunks_do_not_grow(self):
+		size = AdaptiveChunkSize(initial=100, targetSeconds=2.0);
+		size.recordSuccess(50, 0.1);
+		assert size.get() == 100;
+
+	def test_shrinks_on_slow_chunks(self):
+		size = AdaptiveChunkSize(initial=100, targetSeconds=2.0);
+		size.recordSuccess(100, 4.0);
+		assert size.get() == 50;
+
+	def test_failure_halves_below_the_failed_chunk(self):
+		size = AdaptiveChunkSize(initial=100, minimum=10);
+		size.recordFailure(60);
+		assert size.get() == 30;
+		size.recordFailure(4);
+		assert size.get() == 10;
+
+	def test_bounds(self):
+		size = AdaptiveChunkSize(initial=100, minimum=10, maximum=120, targetSeconds=2.0);
+		size.recordSuccess(100, 0.1);
+		assert size.get() == 120;
+		size.recordSuccess(120, 1000.0);
+		assert size.get() == 10;
+
+class TestBisection:
+
+	def test_limit_errors_are_bisected(self):
+		multicall = LimitedMulticall(maxCalls=3);
+		chunkSize = AdaptiveChunkSize(initial=8, minimum=1, maximum=8);
+		batch = limitedBatch(multicall, 8, chunkSize);
+		(outputData, successes, blockNumber) = batch.execute(block_identifier=100);
+
+		assert successes == [True] * 8;
+		assert blockNumber == 100;
+		assert multicall.chunkSizes == [8, 4, 2, 2, 4, 2, 2];
+		# shrunk below the failing size, then grown back by the fast halves
+		assert chunkSize.get() == 4;
+
+	def test_other_errors_are_raised_at_once(self):
+		multicall = LimitedMulticall(error=ValueError({"code":-32000, "message":"missing trie node"}));
+		chunkSize = AdaptiveChunkSize(initial=8, minimum=1, maximum=8);
+		batch = limitedBatch(multicall, 8, chunkSize);
+		with pytest.raises(ValueError):
+			batch.execute(block_identifier=100);
+
+		assert multicall.chunkSizes == [8];
+		assert chunkSize.get() == 8;
+
+	def test_empty_batch_makes_no_calls(self):
+		# web3 is None: resolving "latest" would fail
+		multicall = LimitedMulticall(maxCalls=10);
+		batch = limitedBatch(multicall, 0, 5);
+		assert batch.execute() == ([], [], None);
+		assert batch.execute(123) == ([], [], 123);
+		assert multicall.chunkSizes == [];
+
+	def test_single_calls_are_retried(self):
+		multicall = LimitedMulticall(maxCalls=0);
+		batch = limitedBatch(multicall, 1, 1);
+		with pytest.raises(ValueError):
+			batch.execute(block_identifier=100);
+		assert multicall.chunkSizes == [1] * (1 + batch.maxRetries);
+
+	def test_timeouts_are_limit_errors(self):
+		assert isChunkLimitError(Timeout("read timed out"));
+		assert isChunkLimitError(ValueError({"code":-32005, "message":"query returned more than 10000 results"}));
+		assert not isChunkLimitError(ConnectionError("connection refused"));
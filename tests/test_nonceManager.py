@@ -0,0 +1,151 @@
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from balpy.nonceManager import NonceManager
+
+ADDRESS = Web3.toChecksumAddress("0x" + "19" * 20);
+
+def txHash(n):
+	return("0x" + "%064x" % n);
+
+def transaction(h):
+	return({	"hash":h, "nonce":"0x0", "blockHash":None, "blockNumber":None, "transactionIndex":None,
+				"from":ADDRESS, "to":ADDRESS, "value":"0x0", "gas":"0x5208", "gasPrice":"0x1", "input":"0x",
+				"v":"0x1b", "r":"0x1", "s":"0x1"});
+
+class FakeNode(JSONBaseProvider):
+
+	# account nonces by block tag and the transactions the node knows about
+	def __init__(self, latest=0, pending=0):
+		super(FakeNode, self).__init__();
+		self.counts = {"latest":latest, "pending":pending};
+		self.known = set();
+		self.pinnedRequests = [];
+
+	def make_request(self, method, params):
+		if method == "eth_getTransactionCount":
+			return({"jsonrpc":"2.0", "id":0, "result":hex(self.counts[params[1]])});
+		if method == "eth_getTransactionByHash":
+			result = transaction(params[0]) if params[0] in self.known else None;
+			return({"jsonrpc":"2.0", "id":0, "result":result});
+		raise AssertionError("unexpected request " + method);
+
+	def makeBatchRequest(self, payload):
+		responses = [];
+		for request in payload:
+			response = self.make_request(request["method"], request["params"]);
+			response["id"] = request["id"];
+			responses.append(response);
+		return(responses);
+
+class PinnedNode(FakeNode):
+
+	# multi-endpoint provider stand-in: the pinned endpoint answers makePinnedRequest
+	def __init__(self, latest=0, pending=0):
+		super(PinnedNode, self).__init__(latest, pending);
+		self.pinned = "first";
+		self.pinnedKnown = set();
+
+	def makePinnedRequest(self, method, params):
+		self.pinnedRequests.append((method, params));
+		result = transaction(params[0]) if params[0] in self.pinnedKnown else None;
+		return({"jsonrpc":"2.0", "id":0, "result":result});
+
+def makeManager(node):
+	return(NonceManager(Web3(node), ADDRESS));
+
+class TestNonceManager:
+
+	def test_allocate_is_sequential_from_the_pending_count(self):
+		manager = makeManager(FakeNode(pending=7));
+		assert [manager.allocate() for i in range(3)] == [7, 8, 9];
+
+	def test_release_refills_gaps(self):
+		manager = makeManager(FakeNode(pending=0));
+		(a, b, c) = [manager.allocate() for i in range(3)];
+		manager.release(b);
+		assert manager.allocate() == b;
+		manager.release(c);
+		assert manager.nextNonce == c;
+		assert manager.allocate() == c;
+
+	def test_release_ignores_unallocated_nonces(self):
+		manager = makeManager(FakeNode(pending=0));
+		manager.allocate();
+		manager.release(5);
+		assert manager.allocate() == 1;
+
+	def test_override_above_the_local_count(self):
+		manager = makeManager(FakeNode(pending=0));
+		manager.allocate();
+		manager.sent(0, txHash(0));
+		manager.sent(4, txHash(4));
+		assert manager.allocate() == 5;
+
+	def test_override_of_a_released_nonce(self):
+		manager = makeManager(FakeNode(pending=0));
+		(a, b) = [manager.allocate() for i in range(2)];
+		manager.release(a);
+		manager.sent(a, txHash(a));
+		assert manager.allocate() == 2;
+
+	def test_resync_keeps_outstanding_allocations(self):
+		node = FakeNode(pending=0);
+		manager = makeManager(node);
+		held = [manager.allocate() for i in range(4)];
+		manager.sent(held[0], txHash(0));
+
+		# the node lost track of everything: nonce 0 must be reissued, 1-3 are still held
+		manager.resync();
+		reissued = [manager.allocate() for i in range(2)];
+		assert reissued[0] == 0;
+		assert reissued[1] == 4;
+		assert len(set(reissued) & set(held[1:])) == 0;
+
+	def test_resync_moves_past_the_chain(self):
+		node = FakeNode(pending=0);
+		manager = makeManager(node);
+		manager.allocate();
+		manager.sent(0, txHash(0));
+		node.counts["pending"] = 10;
+		manager.resync();
+		assert manager.allocate() == 10;
+		assert manager.pending == {};
+
+	def test_check_pending(self):
+		node = FakeNode(latest=0, pending=0);
+		manager = makeManager(node);
+		for nonce in range(3):
+			manager.allocate();
+			manager.sent(nonce, txHash(nonce));
+
+		# 0 is mined, 1 is still in the mempool, 2 was dropped
+		node.counts["latest"] = 1;
+		node.known = set([txHash(1)]);
+		assert manager.checkPending() == [2];
+		assert manager.pending == {1:txHash(1)};
+		assert manager.allocate() == 2;
+
+	def test_dropped_needs_the_node_it_was_sent_to(self):
+		node = PinnedNode(latest=0, pending=0);
+		manager = makeManager(node);
+		for nonce in range(2):
+			manager.allocate();
+			manager.sent(nonce, txHash(nonce));
+
+		# the pinned node still has nonce 0; nonce 1 is gone everywhere
+		node.pinnedKnown = set([txHash(0)]);
+		assert manager.checkPending() == [1];
+		assert [params[0] for (method, params) in node.pinnedRequests] == [txHash(0), txHash(1)];
+
+	def test_failover_is_not_a_drop(self):
+		node = PinnedNode(latest=0, pending=0);
+		manager = makeManager(node);
+		manager.allocate();
+		manager.sent(0, txHash(0));
+
+		# after a failover the new pinned node never saw the transaction
+		node.pinned = "second";
+		assert manager.checkPending() == [];
+		assert node.pinnedRequests == [];
+		assert 0 in manager.pending.keys();
@@ -0,0 +1,141 @@
+import pytest
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from balpy.balpy import balpy
+from balpy.rpcBatch import RpcBatch
+
+VAULT_ADDRESS = "0xBA12222222228d8Ba445958a75a0704d566BF2C8";
+VAULT_ABI = [{"type":"function", "name":"getPoolTokens", "stateMutability":"view", "inputs":[{"name":"", "type":"bytes32"}], "outputs":[]}];
+
+def poolId(n):
+	return("0x" + ("%040x" % n) + "0002" + "%020x" % n);
+
+POOL_A = poolId(1);
+POOL_B = poolId(2);
+POOL_C = poolId(3);
+
+class FakeBlock(object):
+
+	def __init__(self, blockNumber):
+		self.blockNumber = blockNumber;
+
+	def resolveBlock(self, block_identifier):
+		return(self.blockNumber);
+
+class LogsProvider(JSONBaseProvider):
+
+	# answers batched eth_getLogs from a list of logs, filtered by address
+	def __init__(self, logs):
+		super(LogsProvider, self).__init__();
+		self.logs = logs;
+		self.filters = [];
+
+	def makeBatchRequest(self, payload):
+		responses = [];
+		for request in payload:
+			logFilter = request["params"][0];
+			self.filters.append(logFilter);
+			addresses = logFilter["address"];
+			if not isinstance(addresses, list):
+				addresses = [addresses];
+			addresses = [a.lower() for a in addresses];
+			logs = [log for log in self.logs if log["address"].lower() in addresses];
+			responses.append({"jsonrpc":"2.0", "id":request["id"], "result":logs});
+		return(responses);
+
+def log(address, topics):
+	return({	"address":address, "topics":topics, "data":"0x", "blockNumber":"0x65", "blockHash":"0x" + "11" * 32,
+				"transactionHash":"0x" + "22" * 32, "transactionIndex":"0x0", "logIndex":"0x0", "removed":False});
+
+@pytest.fixture
+def bal():
+	manualEnv = {"customRPC":"http://127.0.0.1:1", "etherscanApiKey":"unused", "privateKey":"0x" + "11" * 32};
+	bal = balpy("mainnet", verbose=False, manualEnv=manualEnv);
+	bal.abis["Vault"] = VAULT_ABI;
+	bal.deploymentAddresses["Vault"] = VAULT_ADDRESS;
+
+	bal.reads = [];
+	def getOnchainData(pools, block_identifier=None):
+		bal.reads.append((pools, block_identifier));
+		chainData = {};
+		for poolType in pools.keys():
+			for p in pools[poolType]:
+				chainData[p] = {"poolType":poolType, "block":block_identifier};
+		return(chainData, block_identifier);
+	bal.getOnchainData = getOnchainData;
+	bal.changed = set();
+	bal.getOnchainDataChangedPools = lambda poolIds, fromBlock, toBlock: set(bal.changed);
+	return(bal);
+
+def atBlock(bal, blockNumber):
+	bal.newMulticallBatch = lambda: FakeBlock(blockNumber);
+
+class TestOnchainDataIncremental:
+
+	def test_first_call_reads_everything(self, bal):
+		atBlock(bal, 100);
+		snapshot = bal.getOnchainDataIncremental({"Weighted":[POOL_A, POOL_B]});
+		assert snapshot["blockNumber"] == 100;
+		assert sorted(snapshot["pools"].keys()) == sorted([POOL_A, POOL_B]);
+		assert snapshot["updatedPools"] == sorted([POOL_A, POOL_B]);
+
+	def test_no_new_blocks_returns_snapshot(self, bal):
+		atBlock(bal, 100);
+		snapshot = bal.getOnchainDataIncremental({"Weighted":[POOL_A]});
+		assert bal.getOnchainDataIncremental({"Weighted":[POOL_A]}, snapshot) is snapshot;
+		assert len(bal.reads) == 1;
+
+	def test_no_new_blocks_reads_added_pools(self, bal):
+		atBlock(bal, 100);
+		snapshot = bal.getOnchainDataIncremental({"Weighted":[POOL_A]});
+		atBlock(bal, 99);
+		updated = bal.getOnchainDataIncremental({"Weighted":[POOL_A, POOL_B]}, snapshot);
+
+		assert bal.reads[-1] == ({"Weighted":[POOL_B]}, 100);
+		assert updated["blockNumber"] == 100;
+		assert updated["updatedPools"] == [POOL_B];
+		assert updated["pools"][POOL_A] is snapshot["pools"][POOL_A];
+		assert updated["pools"][POOL_B]["block"] == 100;
+
+	def test_only_changed_pools_are_read(self, bal):
+		atBlock(bal, 100);
+		snapshot = bal.getOnchainDataIncremental({"Weighted":[POOL_A, POOL_B], "Stable":[POOL_C]});
+		snapshot["pools"][POOL_C]["ampIsUpdating"] = True;
+
+		atBlock(bal, 110);
+		bal.changed = set([POOL_A]);
+		updated = bal.getOnchainDataIncremental({"Weighted":[POOL_A, POOL_B], "Stable":[POOL_C]}, snapshot);
+
+		assert updated["blockNumber"] == 110;
+		assert updated["updatedPools"] == sorted([POOL_A, POOL_C]);
+		assert updated["pools"][POOL_A]["block"] == 110;
+		assert updated["pools"][POOL_B]["block"] == 100;
+
+	def test_large_gap_reads_everything(self, bal):
+		atBlock(bal, 100);
+		snapshot = bal.getOnchainDataIncremental({"Weighted":[POOL_A, POOL_B]});
+		atBlock(bal, 101 + bal.onchainDataMaxLogBlockRange);
+		updated = bal.getOnchainDataIncremental({"Weighted":[POOL_A]}, snapshot);
+		assert bal.reads[-1] == ({"Weighted":[POOL_A]}, 101 + bal.onchainDataMaxLogBlockRange);
+		assert list(updated["pools"].keys()) == [POOL_A];
+
+class TestOnchainDataChangedPools:
+
+	def test_pool_logs_are_filtered_by_address(self, bal):
+		del bal.getOnchainDataChangedPools;
+		bal.onchainDataLogAddressChunkSize = 2;
+		poolIds = [POOL_A, POOL_B, POOL_C];
+		addresses = [bal.balPooldIdToAddress(p) for p in poolIds];
+		logs = [	log(VAULT_ADDRESS, [bal.onchainDataVaultTopics[0], POOL_A]),
+					log(addresses[2], [bal.onchainDataPoolTopics[0]]),
+					log("0x" + "99" * 20, [bal.onchainDataPoolTopics[0]])];
+		provider = LogsProvider(logs);
+		bal.newRpcBatch = lambda: RpcBatch(Web3(provider));
+
+		changed = bal.getOnchainDataChangedPools(poolIds, 101, 110);
+
+		assert changed == set([POOL_A, POOL_C]);
+		poolFilters = [f for f in provider.filters if f["topics"] == [bal.onchainDataPoolTopics]];
+		assert [len(f["address"]) for f in poolFilters] == [2, 1];
+		assert sorted(sum([f["address"] for f in poolFilters], [])) == sorted(addresses);
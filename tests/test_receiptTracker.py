@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+from web3.providers.base import JSONBaseProvider
+
+from balpy.receiptTracker import ReceiptTracker
+
+def txHash(n):
+	return("0x" + "%064x" % n);
+
+class FakeChain(JSONBaseProvider):
+
+	# blocks of transaction hashes; a transaction's receipt exists once its block is mined
+	def __init__(self):
+		super(FakeChain, self).__init__();
+		self.lock = threading.Lock();
+		self.blocks = [[]];
+		self.error = None;
+		self.requests = [];
+
+	def mine(self, hashes):
+		with self.lock:
+			self.blocks.append(hashes);
+
+	def answer(self, method, params):
+		with self.lock:
+			self.requests.append(method);
+			if not self.error is None:
+				raise self.error;
+			if method == "eth_blockNumber":
+				return(hex(len(self.blocks) - 1));
+			if method == "eth_getBlockByNumber":
+				number = int(params[0], 16);
+				if number >= len(self.blocks):
+					return(None);
+				return({"number":hex(number), "hash":"0x" + "%064x" % (number + 1), "transactions":self.blocks[number]});
+			if method == "eth_getTransactionReceipt":
+				for number, hashes in enumerate(self.blocks):
+					if params[0] in hashes:
+						return({"transactionHash":params[0], "blockNumber":hex(number), "status":"0x1", "gasUsed":"0x5208", "logs":[]});
+				return(None);
+		raise AssertionError("unexpected request " + method);
+
+	def make_request(self, method, params):
+		return({"jsonrpc":"2.0", "id":0, "result":self.answer(method, params)});
+
+	def makeBatchRequest(self, payload):
+		return([{"jsonrpc":"2.0", "id":r["id"], "result":self.answer(r["method"], r["params"])} for r in payload]);
+
+@pytest.fixture
+def chain():
+	return(FakeChain());
+
+def makeTracker(chain, **kwargs):
+	return(ReceiptTracker(Web3(chain), pollIntervalSec=0.01, **kwargs));
+
+class TestReceiptTracker:
+
+	def test_receipt_from_a_new_block(self, chain):
+		tracker = makeTracker(chain);
+		future = tracker.track(txHash(1));
+		chain.mine([txHash(2)]);
+		chain.mine([txHash(1)]);
+		receipt = future.result(timeout=5);
+		assert receipt["blockNumber"] == 2;
+		assert receipt["status"] == 1;
+
+	def test_mined_before_tracking(self, chain):
+		chain.mine([txHash(1)]);
+		tracker = makeTracker(chain);
+		assert tracker.track(txHash(1)).result(timeout=5)["blockNumber"] == 1;
+
+	def test_hashes_are_normalized(self, chain):
+		# mined only after both calls, so the first future is still pending
+		tracker = makeTracker(chain);
+		future = tracker.track(bytes.fromhex(txHash(10)[2:]));
+		assert tracker.track(txHash(10).upper().replace("0X", "0x")) is future;
+		chain.mine([txHash(10)]);
+		assert future.result(timeout=5)["blockNumber"] == 1;
+
+	def test_far_behind_checks_hashes_directly(self, chain):
+		# polled by hand: no background thread
+		tracker = makeTracker(chain, maxBlocksPerPoll=2);
+		tracker.lastBlock = 0;
+		future = Future();
+		tracker.futures[txHash(1)] = future;
+		for i in range(5):
+			chain.mine([]);
+		chain.mine([txHash(1)]);
+		tracker.poll();
+
+		assert future.result(timeout=0)["blockNumber"] == 6;
+		assert tracker.lastBlock == 6;
+		assert chain.requests.count("eth_getBlockByNumber") == 0;
+
+	def test_timeout(self, chain):
+		tracker = makeTracker(chain);
+		with pytest.raises(TimeExhausted):
+			tracker.track(txHash(1), timeOutSec=0.05).result(timeout=5);
+
+	def test_callback_gets_the_receipt(self, chain):
+		tracker = makeTracker(chain);
+		received = [];
+		done = threading.Event();
+		tracker.track(txHash(1), callback=lambda receipt: (received.append(receipt), done.set()));
+		chain.mine([txHash(1)]);
+		assert done.wait(5);
+		assert [r["transactionHash"] for r in received] == [bytes.fromhex(txHash(1)[2:])];
+
+	def test_poll_errors_are_reported_then_fail_the_futures(self, chain, capsys):
+		chain.error = ConnectionError("node down");
+		tracker = makeTracker(chain, maxPollErrors=3);
+		with pytest.raises(ConnectionError):
+			tracker.track(txHash(1)).result(timeout=5);
+		output = capsys.readouterr().out;
+		assert output.count("Receipt poll failed") == 3;
+		assert "node down" in output;
@@ -0,0 +1,104 @@
+import pytest
+from web3 import Web3
+from web3.middleware import geth_poa_middleware
+from web3.providers.base import JSONBaseProvider
+
+from balpy.rpcBatch import RpcBatch
+
+TX_HASH = "0x" + "ab" * 32;
+
+def block(number, extraData):
+	return({	"number":hex(number),
+				"hash":"0x" + "11" * 32,
+				"parentHash":"0x" + "22" * 32,
+				"timestamp":hex(1600000000 + number),
+				"extraData":extraData,
+				"transactions":[]});
+
+class FakeProvider(JSONBaseProvider):
+
+	# answers batches from a callable, reversing the response order like some nodes do
+	def __init__(self, answer):
+		super(FakeProvider, self).__init__();
+		self.answer = answer;
+		self.payloads = [];
+
+	def makeBatchRequest(self, payload):
+		self.payloads.append(payload);
+		responses = [];
+		for request in payload:
+			response = {"jsonrpc":"2.0", "id":request["id"]};
+			response.update(self.answer(request["method"], request["params"]));
+			responses.append(response);
+		return(list(reversed(responses)));
+
+	def make_request(self, method, params):
+		raise AssertionError("unexpected single request " + method);
+
+def makeWeb3(answer):
+	return(Web3(FakeProvider(answer)));
+
+class TestRpcBatch:
+
+	def test_results_match_requests_out_of_order(self):
+		web3 = makeWeb3(lambda method, params: {"result":hex(int(params[0], 16) * 2)});
+		batch = RpcBatch(web3, maxBatchSize=3);
+		futures = [batch.add("eth_getBalance", ["0x" + "%040x" % (i + 1), "latest"]) for i in range(7)];
+		(results, successes) = batch.execute();
+
+		assert results == [2 * (i + 1) for i in range(7)];
+		assert successes == [True] * 7;
+		assert [f.result() for f in futures] == results;
+		assert [len(p) for p in web3.provider.payloads] == [3, 3, 1];
+
+	def test_errors_only_fail_their_request(self):
+		def answer(method, params):
+			if method == "eth_getTransactionByHash":
+				return({"error":{"code":-32000, "message":"boom"}});
+			if method == "eth_getBlockByNumber":
+				# a POA block read without the POA fix fails formatting
+				return({"result":block(int(params[0], 16), "0x" + "d6" * 97)});
+			return({"result":hex(5)});
+		web3 = makeWeb3(answer);
+		batch = RpcBatch(web3);
+		batch.add("eth_blockNumber", []);
+		failed = batch.add("eth_getTransactionByHash", [TX_HASH]);
+		badBlock = batch.add("eth_getBlockByNumber", [10, False]);
+		(results, successes) = batch.execute();
+
+		assert successes == [True, False, False];
+		assert results == [5, None, None];
+		assert "boom" in str(failed.exception());
+		assert not badBlock.exception() is None;
+
+	def test_missing_response(self):
+		web3 = makeWeb3(lambda method, params: {"result":hex(1)});
+		web3.provider.makeBatchRequest = lambda payload: [{"jsonrpc":"2.0", "id":payload[0]["id"], "result":"0x1"}];
+		batch = RpcBatch(web3);
+		batch.add("eth_blockNumber", []);
+		missing = batch.add("eth_chainId", []);
+		(results, successes) = batch.execute();
+		assert successes == [True, False];
+		assert isinstance(missing.exception(), ValueError);
+
+	def test_poa_block(self):
+		extraData = "0x" + "d6" * 97;
+		web3 = makeWeb3(lambda method, params: {"result":block(int(params[0], 16), extraData)});
+		web3.middleware_onion.inject(geth_poa_middleware, layer=0);
+		batch = RpcBatch(web3);
+		future = batch.add("eth_getBlockByNumber", [12, False]);
+		batch.execute();
+
+		result = future.result();
+		assert result["number"] == 12;
+		assert bytes(result["proofOfAuthorityData"]) == bytes.fromhex(extraData[2:]);
+		assert not "extraData" in result;
+
+	def test_batch_failure_fails_every_request(self):
+		web3 = makeWeb3(None);
+		web3.provider.makeBatchRequest = lambda payload: {"jsonrpc":"2.0", "id":None, "error":{"code":-32600, "message":"batch not supported"}};
+		batch = RpcBatch(web3);
+		futures = [batch.add("eth_blockNumber", []) for i in range(2)];
+		with pytest.raises(ValueError):
+			batch.execute();
+		assert all([not f.exception() is None for f in futures]);
@@ -0,0 +1,172 @@
+import copy
+import json
+import threading
+import time
+
+import pytest
+
+from balpy.graph.subgraphMirror import SubgraphMirror
+
+class FakeGraph(object):
+
+	# pools and tokens with the block they last changed at; iteratePools can be held back with a gate
+	def __init__(self):
+		self.head = 100;
+		self.pools = {};
+		self.tokens = {};
+		self.changeQueries = [];
+		self.fullScans = 0;
+		self.gate = None;
+
+	def addPool(self, n, block, numTokens=2):
+		poolId = "0x%064x" % n;
+		self.pools[poolId] = {	"id":poolId, "address":"0x%040x" % n, "poolType":"Weighted",
+								"strategyType":2, "swapFee":"0.003", "block":block};
+		for i in range(numTokens):
+			self.setToken(poolId, i, "1.0", block);
+		return(poolId);
+
+	def setToken(self, poolId, i, balance, block):
+		tokenId = poolId + "-0x%040x" % i;
+		self.tokens[tokenId] = {	"id":tokenId, "poolId":{"id":poolId}, "symbol":"T" + str(i), "name":"Token",
+									"decimals":18, "address":"0x%040x" % (1000 + i), "balance":balance, "weight":"0.5", "block":block};
+		return(tokenId);
+
+	def removePool(self, poolId):
+		del self.pools[poolId];
+		for tokenId in [t for t in self.tokens.keys() if t.startswith(poolId)]:
+			del self.tokens[tokenId];
+
+	def getIndexedBlock(self, verbose=False):
+		return(self.head);
+
+	def iteratePools(self, batch_size, fields, partitions=1, verbose=False):
+		self.fullScans += 1;
+		if not self.gate is None:
+			self.gate.wait(5);
+		for poolId in sorted(self.pools.keys()):
+			pool = copy.deepcopy(self.pools[poolId]);
+			pool["tokens"] = [copy.deepcopy(self.tokens[t]) for t in sorted(self.tokens.keys()) if t.startswith(poolId)];
+			yield(pool);
+
+	def iterateEntities(self, entity, fields, batch_size=1000, where=None, verbose=False):
+		fromBlock = where["_change_block"]["number_gte"];
+		self.changeQueries.append((entity, fromBlock));
+		entities = self.pools if entity == "pools" else self.tokens;
+		for entityId in sorted(entities.keys()):
+			if entities[entityId]["block"] >= fromBlock:
+				yield(copy.deepcopy(entities[entityId]));
+
+@pytest.fixture
+def graph():
+	return(FakeGraph());
+
+@pytest.fixture
+def mirror(graph, tmp_path):
+	mirror = SubgraphMirror(graph, str(tmp_path / "mirror.sqlite"));
+	yield(mirror);
+	mirror.close();
+
+def balances(mirror, poolId):
+	return([token["balance"] for token in mirror.getPoolTokens(poolId)]);
+
+class TestSubgraphMirror:
+
+	def test_first_sync_downloads_everything(self, graph, mirror):
+		pools = [graph.addPool(n, 50) for n in range(3)];
+		assert mirror.sync() == 100;
+		assert graph.fullScans == 1;
+		assert mirror.getV2PoolIDs()["pools"] == {"Weighted":pools};
+		assert mirror.getV2PoolIDs()["header"]["block"] == 100;
+		assert len(mirror.getPoolTokens(pools[0])) == 2;
+
+	def test_incremental_sync_refetches_a_reorg_margin(self, graph, mirror):
+		poolId = graph.addPool(1, 50);
+		mirror.sync();
+		graph.head = 120;
+		graph.setToken(poolId, 0, "2.0", 110);
+		assert mirror.sync() == 120;
+		assert graph.fullScans == 1;
+		assert graph.changeQueries[-1] == ("poolTokens", 101 - mirror.reorgMarginBlocks);
+		assert balances(mirror, poolId) == ["2.0", "1.0"];
+
+		# the graph node re-indexed a block just below the synced one
+		graph.setToken(poolId, 1, "3.0", 118);
+		graph.head = 125;
+		mirror.sync();
+		assert balances(mirror, poolId) == ["2.0", "3.0"];
+
+	def test_rewound_head(self, graph, mirror):
+		poolId = graph.addPool(1, 50);
+		mirror.sync();
+		graph.head = 90;
+		graph.setToken(poolId, 0, "0.5", 89);
+		assert mirror.sync() == 90;
+		assert graph.changeQueries[-1] == ("poolTokens", 91 - mirror.reorgMarginBlocks);
+		assert balances(mirror, poolId)[0] == "0.5";
+
+	def test_up_to_date(self, graph, mirror):
+		graph.addPool(1, 50);
+		mirror.sync();
+		assert mirror.sync() == 100;
+		assert graph.changeQueries == [];
+
+	def test_forced_full_sync_deletes_removed_entities(self, graph, mirror):
+		keep = graph.addPool(1, 50);
+		gone = graph.addPool(2, 50);
+		mirror.sync();
+		graph.removePool(gone);
+		graph.head = 110;
+		mirror.sync();
+		assert gone in mirror.getV2Pools().keys();
+
+		mirror.sync(full=True);
+		assert list(mirror.getV2Pools().keys()) == [keep];
+		assert mirror.getPoolTokens(gone) == [];
+
+	def test_due_sweep_runs_in_the_background(self, graph, mirror):
+		keep = graph.addPool(1, 50);
+		gone = graph.addPool(2, 50);
+		mirror.sync();
+		graph.removePool(gone);
+		added = graph.addPool(3, 105);
+		graph.head = 110;
+
+		# the last sweep is more than fullSyncIntervalSec old
+		with mirror.lock, mirror.db:
+			mirror.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("fullSyncStamp", json.dumps(time.time() - mirror.fullSyncIntervalSec - 1)));
+		graph.gate = threading.Event();
+
+		# served from local data and caught up while the sweep waits
+		assert mirror.sync() == 110;
+		assert added in mirror.getV2Pools().keys();
+		assert gone in mirror.getV2Pools().keys();
+		assert mirror.fullSyncThread.is_alive();
+		assert mirror.startFullSync() is None;
+
+		graph.gate.set();
+		mirror.fullSyncThread.join(5);
+		assert sorted(mirror.getV2Pools().keys()) == [keep, added];
+		assert not mirror.needsFullSync();
+
+	def test_sweep_makes_the_next_sync_catch_up(self, graph, mirror):
+		poolId = graph.addPool(1, 50);
+		mirror.sync();
+		with mirror.lock, mirror.db:
+			mirror.db.execute("DELETE FROM meta WHERE key = ?", ("fullSyncStamp",));
+		graph.gate = threading.Event();
+		graph.head = 110;
+		mirror.sync();
+		while graph.fullScans < 2:
+			time.sleep(0.01);
+
+		# changes indexed while the sweep ran are fetched again from the sweep's head
+		graph.head = 120;
+		graph.setToken(poolId, 0, "4.0", 115);
+		mirror.sync();
+		graph.gate.set();
+		mirror.fullSyncThread.join(5);
+		assert mirror.getSyncedBlock() == 110;
+		mirror.sync();
+		assert graph.changeQueries[-1] == ("poolTokens", 111 - mirror.reorgMarginBlocks);
+		assert balances(mirror, poolId)[0] == "4.0";
@@ -0,0 +1,195 @@
+import pytest
+from eth_abi import encode_abi
+from web3 import Web3
+from web3.exceptions import BlockNotFound
+from web3.providers.base import JSONBaseProvider
+
+from balpy.multicallBatch import AdaptiveChunkSize
+from balpy.vaultIndexer import VaultIndexer
+
+VAULT_ADDRESS = "0xBA12222222228d8Ba445958a75a0704d566BF2C8";
+TOKENS = ["0xba100000625a3754423978a60c9317c58a424e3D", "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2"];
+
+def event(name, inputs):
+	return({"type":"event", "name":name, "anonymous":False,
+			"inputs":[{"name":n, "type":t, "indexed":i} for (n, t, i) in inputs]});
+
+VAULT_ABI = [
+	event("PoolRegistered", [("poolId", "bytes32", True), ("poolAddress", "address", True), ("specialization", "uint8", False)]),
+	event("TokensRegistered", [("poolId", "bytes32", True), ("tokens", "address[]", False), ("assetManagers", "address[]", False)]),
+	event("Swap", [("poolId", "bytes32", True), ("tokenIn", "address", True), ("tokenOut", "address", True), ("amountIn", "uint256", False), ("amountOut", "uint256", False)])
+];
+
+def toInt(value):
+	return(value if isinstance(value, int) else int(value, 16));
+
+def word(value):
+	return("0x" + bytes(value).rjust(32, b"\x00").hex());
+
+def poolId(n):
+	return("0x" + "%040x" % n + "0002" + "%020x" % n);
+
+class FakeChain(JSONBaseProvider):
+
+	# blocks 0..head with Vault logs; refuses getLogs ranges above maxRange like a real node
+	def __init__(self, head):
+		super(FakeChain, self).__init__();
+		self.head = head;
+		self.hashes = {n:"0x" + "%064x" % (n + 1) for n in range(head + 1)};
+		self.logs = [];
+		self.maxRange = None;
+		self.failures = [];
+		self.ranges = [];
+
+	def addLog(self, blockNumber, name, indexed, types, values):
+		item = [e for e in VAULT_ABI if e["name"] == name][0];
+		signature = name + "(" + ",".join([i["type"] for i in item["inputs"]]) + ")";
+		self.logs.append({	"blockNumber":blockNumber,
+							"topics":[Web3.keccak(text=signature).hex()] + indexed,
+							"data":"0x" + encode_abi(types, values).hex()});
+
+	def reorg(self, fromBlock, salt=0xff):
+		self.hashes.update({n:"0x" + "%02x" % salt + "%062x" % (n + 1) for n in range(fromBlock, self.head + 1)});
+		self.logs = [log for log in self.logs if log["blockNumber"] < fromBlock];
+
+	def getBlock(self, number):
+		if number > self.head:
+			return(None);
+		return({"number":hex(number), "hash":self.hashes[number]});
+
+	def getLogs(self, query):
+		(fromBlock, toBlock) = (toInt(query["fromBlock"]), toInt(query["toBlock"]));
+		self.ranges.append((fromBlock, toBlock));
+		if len(self.failures) > 0:
+			return({"error":{"code":-32000, "message":self.failures.pop(0)}});
+		if not self.maxRange is None and toBlock - fromBlock + 1 > self.maxRange:
+			return({"error":{"code":-32005, "message":"query returned more than 10000 results"}});
+		logs = [];
+		for log in self.logs:
+			if fromBlock <= log["blockNumber"] <= toBlock:
+				index = len([l for l in logs if l["blockNumber"] == hex(log["blockNumber"])]);
+				logs.append({	"address":VAULT_ADDRESS,
+								"blockNumber":hex(log["blockNumber"]),
+								"blockHash":self.hashes[log["blockNumber"]],
+								"transactionHash":"0x" + "%064x" % (log["blockNumber"] * 100 + index),
+								"transactionIndex":"0x0",
+								"logIndex":hex(index),
+								"removed":False,
+								"topics":log["topics"],
+								"data":log["data"]});
+		return({"result":logs});
+
+	def makeBatchRequest(self, payload):
+		responses = [];
+		for request in payload:
+			response = {"jsonrpc":"2.0", "id":request["id"]};
+			if request["method"] == "eth_getLogs":
+				response.update(self.getLogs(request["params"][0]));
+			elif request["method"] == "eth_getBlockByNumber":
+				response["result"] = self.getBlock(toInt(request["params"][0]));
+			else:
+				raise AssertionError("unexpected batched request " + request["method"]);
+			responses.append(response);
+		return(responses);
+
+	def make_request(self, method, params):
+		if method == "eth_getBlockByNumber" and params[0] == "latest":
+			return({"jsonrpc":"2.0", "id":0, "result":self.getBlock(self.head)});
+		raise AssertionError("unexpected single request " + method);
+
+class FakeVault(object):
+	abi = VAULT_ABI;
+	address = VAULT_ADDRESS;
+
+def registerPool(chain, blockNumber, n):
+	pool = "0x" + "%040x" % n;
+	chain.addLog(blockNumber, "PoolRegistered", [poolId(n), word(bytes.fromhex(pool[2:]))], ["uint8"], [2]);
+	chain.addLog(blockNumber, "TokensRegistered", [poolId(n)], ["address[]", "address[]"], [TOKENS, ["0x" + "00" * 20] * 2]);
+
+def swap(chain, blockNumber, n, amountIn):
+	chain.addLog(blockNumber, "Swap", [poolId(n), word(bytes.fromhex(TOKENS[0][2:])), word(bytes.fromhex(TOKENS[1][2:]))],
+					["uint256", "uint256"], [amountIn, amountIn * 2]);
+
+@pytest.fixture
+def chain():
+	chain = FakeChain(30);
+	registerPool(chain, 3, 1);
+	registerPool(chain, 12, 2);
+	swap(chain, 15, 1, 100);
+	swap(chain, 27, 2, 300);
+	return(chain);
+
+def makeIndexer(chain, tmp_path, initial=10, maxRetries=3):
+	rangeSize = AdaptiveChunkSize(initial=initial, minimum=1, maximum=initial, targetSeconds=5.0);
+	return(VaultIndexer(Web3(chain), FakeVault(), str(tmp_path / "vault.sqlite"), rangeSize=rangeSize, maxRetries=maxRetries, retryDelaySec=0));
+
+class TestVaultIndexer:
+
+	def test_sync_decodes_and_queries(self, chain, tmp_path):
+		indexer = makeIndexer(chain, tmp_path);
+		assert indexer.sync() == 30;
+		assert indexer.getLastIndexedBlock() == 30;
+		assert chain.ranges == [(0, 9), (10, 19), (20, 29), (30, 30)];
+
+		pools = indexer.getPools();
+		assert list(pools.keys()) == [poolId(1), poolId(2)];
+		assert pools[poolId(1)] == {	"address":Web3.toChecksumAddress("0x" + "%040x" % 1),
+										"specialization":2,
+										"tokens":[Web3.toChecksumAddress(t) for t in TOKENS],
+										"blockNumber":3};
+
+		swaps = indexer.getEvents("Swap");
+		assert [e["blockNumber"] for e in swaps] == [15, 27];
+		assert swaps[0]["args"] == {	"poolId":poolId(1),
+										"tokenIn":Web3.toChecksumAddress(TOKENS[0]),
+										"tokenOut":Web3.toChecksumAddress(TOKENS[1]),
+										"amountIn":100,
+										"amountOut":200};
+		assert [e["event"] for e in indexer.getEvents(poolId=poolId(2).upper().replace("0X", "0x"))] == ["PoolRegistered", "TokensRegistered", "Swap"];
+		assert [e["blockNumber"] for e in indexer.getEvents(fromBlock=10, toBlock=20)] == [12, 12, 15];
+		indexer.close();
+
+	def test_reorg_rewinds_to_the_last_matching_checkpoint(self, chain, tmp_path):
+		indexer = makeIndexer(chain, tmp_path);
+		indexer.sync(30);
+
+		# block 27 and its swap were reorged out and replaced by another swap
+		chain.reorg(25);
+		swap(chain, 26, 1, 500);
+		chain.ranges = [];
+		assert indexer.sync(30) == 30;
+		assert chain.ranges == [(20, 29), (30, 30)];
+		assert [(e["blockNumber"], e["args"]["amountIn"]) for e in indexer.getEvents("Swap")] == [(15, 100), (26, 500)];
+		assert indexer.getCheckpoints()[0] == (30, chain.hashes[30]);
+		indexer.close();
+
+	def test_range_errors_shrink_the_range(self, chain, tmp_path):
+		chain.maxRange = 4;
+		indexer = makeIndexer(chain, tmp_path, initial=16);
+		assert indexer.sync(30) == 30;
+		assert chain.ranges[:3] == [(0, 15), (0, 7), (0, 3)];
+		assert [e["blockNumber"] for e in indexer.getEvents("Swap")] == [15, 27];
+		indexer.close();
+
+	def test_other_errors_are_retried_without_shrinking(self, chain, tmp_path):
+		chain.failures = ["internal error", "internal error"];
+		indexer = makeIndexer(chain, tmp_path);
+		assert indexer.sync(9) == 9;
+		assert chain.ranges == [(0, 9)] * 3;
+		assert indexer.rangeSize.get() == 10;
+
+		chain.failures = ["internal error"] * 4;
+		with pytest.raises(ValueError):
+			indexer.sync(19);
+		assert indexer.rangeSize.get() == 10;
+		assert indexer.getLastIndexedBlock() == 9;
+		indexer.close();
+
+	def test_missing_block_is_a_clear_error(self, chain, tmp_path):
+		# the node serving the batch is behind the requested block
+		indexer = makeIndexer(chain, tmp_path, maxRetries=1);
+		with pytest.raises(BlockNotFound, match="Block 35"):
+			indexer.sync(35);
+		assert indexer.rangeSize.get() == 10;
+		assert indexer.getLastIndexedBlock() == 29;
+		indexer.close();